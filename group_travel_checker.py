@@ -7,10 +7,37 @@
 
 import sys
 import os
-from datetime import datetime, date
+import time
+import contextlib
+import hashlib
+import io
+import json
+import re
+import importlib.util
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, date, time as dt_time
+import numpy as np
 import pandas as pd
 import warnings
 
+try:
+    import pyarrow  # noqa: F401  可选依赖，用于Parquet列式缓存
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    from scipy import sparse  # 可选依赖，用于同行关系图的稀疏矩阵计算
+    from scipy.sparse.csgraph import connected_components
+
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
 
 def setup_qt_environment():
     """设置Qt环境变量，确保应用能正常启动"""
@@ -114,10 +141,16 @@ warnings.filterwarnings("ignore")
 
 class PersonDetailDialog(QDialog):
 
-    def __init__(self, person_id, all_data, parent=None):
+    def __init__(
+        self, person_id, all_data, parent=None, graph=None, graph_factory=None
+    ):
         super().__init__(parent)
         self.person_id = person_id
         self.all_data = all_data
+        self.graph = graph  # 同行关系图，首次使用时建立（见co_travel_graph）
+        self.graph_factory = (
+            graph_factory  # 建立同行关系图的函数，未提供时按all_data建立
+        )
         self.person_records = None
 
         self.init_ui()
@@ -250,11 +283,15 @@ class PersonDetailDialog(QDialog):
         self.related_btn = QPushButton("🔍 关联分析")
         self.related_btn.clicked.connect(self.show_related_analysis)
 
+        self.expand_btn = QPushButton("🕸️ 关系扩展")
+        self.expand_btn.clicked.connect(self.show_contact_expansion)
+
         close_btn = QPushButton("❌ 关闭")
         close_btn.clicked.connect(self.accept)
 
         button_layout.addWidget(self.export_btn)
         button_layout.addWidget(self.related_btn)
+        button_layout.addWidget(self.expand_btn)
         button_layout.addStretch()
         button_layout.addWidget(close_btn)
 
@@ -381,7 +418,10 @@ class PersonDetailDialog(QDialog):
             return
 
         if "出发日期" in self.person_records.columns:
-            self.person_records = self.person_records.sort_values("出发日期")
+            sort_columns = ["出发日期"]
+            if "出发分钟" in self.person_records.columns:
+                sort_columns.append("出发分钟")
+            self.person_records = self.person_records.sort_values(sort_columns)
 
         self.update_basic_info()
         self.update_stats_info()
@@ -409,9 +449,7 @@ class PersonDetailDialog(QDialog):
 
         # 出行时间范围
         if "出发日期" in self.person_records.columns:
-            dates = pd.to_datetime(
-                self.person_records["出发日期"], errors="coerce"
-            ).dropna()
+            dates = parse_datetime(self.person_records["出发日期"]).dropna()
             if not dates.empty:
                 min_date = dates.min().strftime("%Y-%m-%d")
                 max_date = dates.max().strftime("%Y-%m-%d")
@@ -457,7 +495,7 @@ class PersonDetailDialog(QDialog):
 
         # 状态分布统计
         if "状态类型" in self.person_records.columns:
-            status_counts = self.person_records["状态类型"].value_counts()
+            status_counts = count_values(self.person_records["状态类型"])
             status_parts = [
                 f"{status}({count})" for status, count in status_counts.items()
             ]
@@ -467,7 +505,7 @@ class PersonDetailDialog(QDialog):
 
         # 数据来源统计
         if "数据源" in self.person_records.columns:
-            source_counts = self.person_records["数据源"].value_counts()
+            source_counts = count_values(self.person_records["数据源"])
             source_parts = [
                 f"{source}({count})" for source, count in source_counts.items()
             ]
@@ -510,10 +548,7 @@ class PersonDetailDialog(QDialog):
                 if pd.isna(value):
                     value = ""
                 elif col == "出发日期":
-                    try:
-                        value = pd.to_datetime(value).strftime("%Y-%m-%d")
-                    except:
-                        value = str(value)
+                    value = str(value)[:10]
                 else:
                     value = str(value)
 
@@ -555,13 +590,15 @@ class PersonDetailDialog(QDialog):
         # 按日期分组显示
         if "出发日期" in self.person_records.columns:
             # 转换日期并排序
-            records_with_date = self.person_records.copy()
-            records_with_date["出发日期_dt"] = pd.to_datetime(
-                records_with_date["出发日期"], errors="coerce"
+            records_with_date = self.person_records.assign(
+                出发日期_dt=parse_datetime(self.person_records["出发日期"])
             )
+            sort_columns = ["出发日期_dt"]
+            if "出发分钟" in records_with_date.columns:
+                sort_columns.append("出发分钟")  # 同一天内按出发时间排序
             records_sorted = records_with_date.dropna(
                 subset=["出发日期_dt"]
-            ).sort_values("出发日期_dt")
+            ).sort_values(sort_columns)
 
             current_date = None
             for _, record in records_sorted.iterrows():
@@ -659,22 +696,22 @@ class PersonDetailDialog(QDialog):
                     basic_info.to_excel(writer, sheet_name="基本信息", index=False)
 
                     # 详细记录表
-                    self.person_records.to_excel(
-                        writer, sheet_name="详细记录", index=False
-                    )
+                    self.person_records.drop(
+                        columns=INTERNAL_COLUMNS, errors="ignore"
+                    ).to_excel(writer, sheet_name="详细记录", index=False)
 
                     # 统计汇总表
                     summary_data = []
 
                     # 城市统计
                     if "到站" in self.person_records.columns:
-                        city_counts = self.person_records["到站"].value_counts()
+                        city_counts = count_values(self.person_records["到站"])
                         for city, count in city_counts.items():
                             summary_data.append(["目的地", city, count])
 
                     # 状态统计
                     if "状态类型" in self.person_records.columns:
-                        status_counts = self.person_records["状态类型"].value_counts()
+                        status_counts = count_values(self.person_records["状态类型"])
                         for status, count in status_counts.items():
                             summary_data.append(["状态", status, count])
 
@@ -691,6 +728,23 @@ class PersonDetailDialog(QDialog):
             except Exception as e:
                 QMessageBox.critical(self, "错误", f"导出失败：{str(e)}")
 
+    def co_travel_graph(self):
+        """同行关系图：打开对话框时不建立，首次用到关联分析或关系扩展时建立"""
+        if self.graph is None:
+            if self.graph_factory is not None:
+                self.graph = self.graph_factory()
+            else:
+                self.graph = CoTravelGraph(self.all_data)
+        return self.graph
+
+    def show_contact_expansion(self):
+        """显示关系扩展（k跳同行人员）"""
+        if self.person_records is None or self.person_records.empty:
+            QMessageBox.warning(self, "警告", "没有可分析的数据")
+            return
+        person_id = self.person_records["证件号"].iloc[0]
+        ContactExpansionDialog(self.co_travel_graph(), person_id, self).exec_()
+
     def show_related_analysis(self):
         """显示关联分析"""
         if self.person_records is None or self.person_records.empty:
@@ -740,50 +794,46 @@ class PersonDetailDialog(QDialog):
         html = "<div style='font-family: Arial, sans-serif;'>"
         html += "<h3 style='color: #495057; margin-bottom: 20px;'>🔍 关联分析报告</h3>"
 
-        # 分析同航班人员
+        # 分析同行人员（同一航班车次、同一出发日期）
         if "航班车次" in self.person_records.columns and self.all_data is not None:
-            html += (
-                "<h4 style='color: #007bff; margin-top: 20px;'>✈️ 同航班人员分析</h4>"
-            )
-
-            person_flights = self.person_records["航班车次"].unique()
-            related_people = set()
-
-            for flight in person_flights:
-                if pd.notna(flight) and str(flight).strip():
-                    same_flight_records = self.all_data[
-                        (self.all_data["航班车次"] == flight)
-                        & (self.all_data["证件号"] != self.person_id)
-                    ]
-
-                    if not same_flight_records.empty:
-                        html += f"<p style='margin-left: 15px;'><strong>航班 {flight}:</strong> 发现 {len(same_flight_records)} 名同行人员</p>"
-
-                        # 列出同行人员（最多显示5个）
-                        for _, record in same_flight_records.head(5).iterrows():
-                            name = record.get("姓名", "未知")
-                            id_num = (
-                                str(record.get("证件号", ""))[:6] + "****"
-                            )  # 隐藏部分证件号
-                            html += f"<p style='margin-left: 30px; color: #6c757d;'>• {name} ({id_num})</p>"
+            html += "<h4 style='color: #007bff; margin-top: 20px;'>✈️ 同行人员分析</h4>"
 
-                        if len(same_flight_records) > 5:
-                            html += f"<p style='margin-left: 30px; color: #6c757d;'>... 还有 {len(same_flight_records) - 5} 人</p>"
+            person_id = self.person_records["证件号"].iloc[0]
+            companions = self.co_travel_graph().companions(person_id)
 
-                        related_people.update(same_flight_records["证件号"].astype(str))
-
-            if not related_people:
+            if companions.empty:
+                html += (
+                    "<p style='margin-left: 15px; color: #6c757d;'>未发现同行人员</p>"
+                )
+            else:
+                group_size = len(self.graph.group_of(person_id))
                 html += (
-                    "<p style='margin-left: 15px; color: #6c757d;'>未发现同航班人员</p>"
+                    f"<p style='margin-left: 15px;'>发现 {len(companions)} 名同行人员，"
+                    f"所在同行群组共 {group_size} 人</p>"
                 )
 
+                # 列出同行次数最多的人员（最多显示5个）
+                names = (
+                    self.all_data.loc[
+                        self.all_data["证件号"].isin(companions.index[:5]),
+                        ["证件号", "姓名"],
+                    ]
+                    .drop_duplicates("证件号")
+                    .set_index("证件号")["姓名"]
+                )
+                for id_value, shared in companions.head(5).items():
+                    name = names.get(id_value, "未知")
+                    id_num = str(id_value)[:6] + "****"  # 隐藏部分证件号
+                    html += f"<p style='margin-left: 30px; color: #6c757d;'>• {name} ({id_num})：同行 {shared} 次</p>"
+
+                if len(companions) > 5:
+                    html += f"<p style='margin-left: 30px; color: #6c757d;'>... 还有 {len(companions) - 5} 人</p>"
+
         # 分析出行模式
         html += "<h4 style='color: #28a745; margin-top: 20px;'>📊 出行模式分析</h4>"
 
         if "出发日期" in self.person_records.columns:
-            dates = pd.to_datetime(
-                self.person_records["出发日期"], errors="coerce"
-            ).dropna()
+            dates = parse_datetime(self.person_records["出发日期"]).dropna()
             if len(dates) > 1:
                 # 计算出行间隔
                 date_diffs = dates.diff().dropna()
@@ -804,7 +854,7 @@ class PersonDetailDialog(QDialog):
 
         # 分析目的地偏好
         if "到站" in self.person_records.columns:
-            destination_counts = self.person_records["到站"].value_counts()
+            destination_counts = count_values(self.person_records["到站"])
             if not destination_counts.empty:
                 html += (
                     "<h4 style='color: #dc3545; margin-top: 20px;'>🎯 目的地偏好</h4>"
@@ -851,677 +901,3340 @@ class PersonDetailDialog(QDialog):
         return html
 
 
-class DataPreviewLoader(QThread):
-    progress = Signal(int)
-    message = Signal(str)
-    finished = Signal(pd.DataFrame)
-    error = Signal(str)
-
-    def __init__(self):
-        super().__init__()
-        self.file1_path = ""
-        self.file2_path = ""
-        self.existing_data = None
+class CoTravelDialog(QDialog):
+    """重复同行分析：在全量数据中查找多次共同乘坐同一航班车次（同一天）的人员"""
 
-        # 复用DataProcessor的状态优先级
-        self.status_priority = {
-            "登机": 1,
-            "值机": 2,
-            "进检": 3,
-            "出票": 4,
-            "座变": 5,
-            "改期": 6,
-            "段消": 7,
-            "换开": 8,
-            "证变": 9,
-            "值拉": 10,
-            "票务记录": 11,
-        }
+    MAX_DISPLAY_ROWS = 5000  # 表格最多显示的行数，导出时包含全部结果
 
-    def set_params(self, file1, file2, existing_data=None):
-        """设置参数"""
-        self.file1_path = file1
-        self.file2_path = file2
-        self.existing_data = existing_data
+    def __init__(self, dataset, all_data, parent=None):
+        super().__init__(parent)
+        self.all_data = all_data
+        self.result = {}
+        self.analyzer = CoTravelAnalyzer(dataset)
+        self.analyzer.message.connect(self.on_message)
+        self.analyzer.finished.connect(self.show_result)
+        self.analyzer.error.connect(self.show_error)
 
-    def run(self):
-        try:
-            self.progress.emit(10)
-            self.message.emit("正在预加载数据...")
+        self.setWindowTitle("重复同行分析")
+        self.setModal(True)
+        self.resize(1100, 750)
+
+        layout = QVBoxLayout(self)
+
+        # 参数：最少共同行程数、是否识别团伙
+        param_layout = QHBoxLayout()
+        param_label = QLabel("最少共同行程：")
+        self.min_shared_combo = QComboBox()
+        for count in (2, 3, 5, 10):
+            self.min_shared_combo.addItem(f"{count}次及以上", count)
+        self.min_shared_combo.setFixedWidth(120)
+        self.cliques_cb = QCheckBox("识别同行团伙（三人及以上两两重复同行）")
+        self.run_btn = QPushButton("开始分析")
+        self.run_btn.clicked.connect(self.start_analysis)
+        param_layout.addWidget(param_label)
+        param_layout.addWidget(self.min_shared_combo)
+        param_layout.addSpacing(20)
+        param_layout.addWidget(self.cliques_cb)
+        param_layout.addStretch()
+        param_layout.addWidget(self.run_btn)
+        layout.addLayout(param_layout)
+
+        self.status_label = QLabel(
+            f"分析范围：全部导入数据 {len(all_data)} 条记录（同一航班车次且同一出发日期视为一次共同行程）"
+        )
+        self.status_label.setStyleSheet("color: #666666;")
+        layout.addWidget(self.status_label)
+
+        splitter = QSplitter(Qt.Vertical)
+        self.pairs_table = QTableWidget()
+        self.pairs_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.pairs_table.horizontalHeader().setStretchLastSection(True)
+        splitter.addWidget(self.pairs_table)
+        self.cliques_table = QTableWidget()
+        self.cliques_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.cliques_table.horizontalHeader().setStretchLastSection(True)
+        self.cliques_table.setVisible(False)
+        splitter.addWidget(self.cliques_table)
+        layout.addWidget(splitter)
 
-            all_data = pd.DataFrame()
+        button_layout = QHBoxLayout()
+        self.export_btn = QPushButton("导出结果")
+        self.export_btn.setEnabled(False)
+        self.export_btn.clicked.connect(self.export_result)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        button_layout.addStretch()
+        button_layout.addWidget(self.export_btn)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
 
-            if self.file1_path:
-                self.message.emit("正在预加载票务全库数据...")
-                df1 = self.read_ticket_data(self.file1_path)
-                if not df1.empty:
-                    all_data = pd.concat([all_data, df1], ignore_index=True)
-                self.progress.emit(40)
-
-            if self.file2_path:
-                self.message.emit("正在预加载群体票务数据...")
-                df2 = self.read_mixed_transport_data(self.file2_path)
-                if not df2.empty:
-                    all_data = pd.concat([all_data, df2], ignore_index=True)
-                self.progress.emit(60)
+    def start_analysis(self):
+        self.run_btn.setEnabled(False)
+        self.export_btn.setEnabled(False)
+        self.analyzer.set_params(
+            self.all_data,
+            self.min_shared_combo.currentData(),
+            self.cliques_cb.isChecked(),
+        )
+        self.analyzer.start()
+
+    def on_message(self, message):
+        self.status_label.setText(message)
+
+    def show_result(self, result):
+        self.result = result
+        self.run_btn.setEnabled(True)
+
+        pairs = result["重复同行"]
+        cliques = result.get("同行团伙")
+        summary = f"共发现 {len(pairs)} 对重复同行人员"
+        if cliques is not None:
+            summary += f"，{len(cliques)} 个同行团伙"
+            if self.analyzer.cliques_truncated:
+                summary += (
+                    f"（团伙过多，找到 {CoTravelGraph.MAX_CLIQUES} 个后已停止，"
+                    f"可提高最少共同行程数后重新分析）"
+                )
+        if len(pairs) > self.MAX_DISPLAY_ROWS:
+            summary += f"（表格仅显示前 {self.MAX_DISPLAY_ROWS} 对，导出包含全部）"
+        self.status_label.setText(summary)
+
+        self.fill_table(self.pairs_table, pairs)
+        self.cliques_table.setVisible(cliques is not None)
+        if cliques is not None:
+            self.fill_table(self.cliques_table, cliques)
+        self.export_btn.setEnabled(not pairs.empty)
+
+    def fill_table(self, table, df):
+        """用DataFrame填充表格（最多MAX_DISPLAY_ROWS行），数值列按数值排序"""
+        df = df.head(self.MAX_DISPLAY_ROWS)
+        table.setSortingEnabled(False)
+        table.clear()
+        table.setRowCount(len(df))
+        table.setColumnCount(len(df.columns))
+        table.setHorizontalHeaderLabels([str(col) for col in df.columns])
+        for col_idx, col in enumerate(df.columns):
+            numeric = pd.api.types.is_integer_dtype(df[col])
+            for row_idx, value in enumerate(df[col].tolist()):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, int(value) if numeric else str(value))
+                table.setItem(row_idx, col_idx, item)
+        table.setSortingEnabled(True)
+        table.resizeColumnsToContents()
 
-            if all_data.empty:
-                self.error.emit("没有读取到有效数据")
-                return
+    def show_error(self, error_msg):
+        self.run_btn.setEnabled(True)
+        self.status_label.setText("分析失败")
+        QMessageBox.critical(self, "错误", error_msg)
 
-            self.progress.emit(80)
-            self.message.emit("正在整理数据...")
+    def export_result(self):
+        """导出重复同行人员对（及同行团伙）"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "保存重复同行分析结果",
+            f"重复同行分析_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            "Excel文件 (*.xlsx)",
+        )
+        if not file_path:
+            return
+        try:
+            with pd.ExcelWriter(file_path, engine="openpyxl") as writer:
+                for sheet_name, df in self.result.items():
+                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+            QMessageBox.information(self, "成功", f"结果已导出到：{file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"导出失败：{str(e)}")
 
-            # 去重处理
-            all_data = self.final_dedup(all_data)
+    def reject(self):
+        # 分析进行中时请求线程停止（识别同行团伙会随即中止），等待其结束再关闭
+        self.analyzer.requestInterruption()
+        self.analyzer.wait()
+        super().reject()
 
-            # 如果有现有数据，进行合并
-            if self.existing_data is not None and not self.existing_data.empty:
-                self.message.emit("正在合并历史数据...")
-                all_data = pd.concat([self.existing_data, all_data], ignore_index=True)
-                all_data = self.final_dedup(all_data)
+    def accept(self):
+        self.analyzer.requestInterruption()
+        self.analyzer.wait()
+        super().accept()
 
-            self.progress.emit(100)
-            self.message.emit("数据预加载完成！")
 
-            self.finished.emit(all_data)
+class ContactExpansionDialog(QDialog):
+    """关系扩展：从一名人员出发，按同一天共同乘坐同一航班车次的关系逐层扩展"""
 
-        except Exception as e:
-            self.error.emit(f"预加载出错：{str(e)}")
+    def __init__(self, graph, person_id, parent=None):
+        super().__init__(parent)
+        self.graph = graph
+        self.person_id = person_id
+        self.result = None
 
-    def read_ticket_data(self, file_path):
-        """读取票务全库数据 - 简化版"""
-        try:
-            df = pd.read_excel(file_path)
-            df.columns = df.columns.str.strip()  # 去除空格
-            df["数据源"] = "票务全库"  # 添加数据源
-
-            # 基本数据清理
-            if "姓名" in df.columns:
-                df = df[df["姓名"].notna() & (df["姓名"].astype(str).str.strip() != "")]
-            if "证件号" in df.columns:
-                df = df[
-                    df["证件号"].notna() & (df["证件号"].astype(str).str.strip() != "")
-                ]
-
-            # 处理日期
-            if "出发日期" in df.columns:
-                df["出发日期"] = pd.to_datetime(df["出发日期"], errors="coerce")
+        self.setWindowTitle(f"关系扩展 - {person_id}")
+        self.setModal(True)
+        self.resize(1000, 650)
 
-            return df
-        except Exception as e:
-            raise Exception(f"读取票务数据失败：{str(e)}")
+        layout = QVBoxLayout(self)
 
-    def read_flight_data(self, file_path):
-        """读取航班更新数据 - 简化版"""
-        try:
-            # 尝试读取航班工作表
-            xl_file = pd.ExcelFile(file_path)
-            if "航班" in xl_file.sheet_names:
-                df = pd.read_excel(file_path, sheet_name="航班")
-            else:
-                df = pd.read_excel(file_path)
-
-            df.columns = df.columns.str.strip()
-            df["数据源"] = "航班更新"
-
-            # 添加状态处理
-            if "变更操作" in df.columns:
-                confirmed_operations = ["登机", "值机", "进检"]
-                planned_operations = ["出票", "座变", "改期"]
-                df["状态类型"] = df["变更操作"].apply(
-                    lambda x: (
-                        "已确认"
-                        if x in confirmed_operations
-                        else "待确认" if x in planned_operations else "其他"
-                    )
-                )
+        # 参数：扩展跳数、日期范围、人数上限
+        param_layout = QHBoxLayout()
+        self.hops_combo = QComboBox()
+        for hops in (1, 2, 3, 4):
+            self.hops_combo.addItem(f"{hops}跳", hops)
+        self.hops_combo.setCurrentIndex(1)  # 默认2跳
+        self.start_date_edit = QDateEdit()
+        self.end_date_edit = QDateEdit()
+        for edit in (self.start_date_edit, self.end_date_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd")
+        days = graph.trip_days
+        if len(days):
+            first_day = pd.Timestamp(np.datetime64(int(days.min()), "D"))
+            last_day = pd.Timestamp(np.datetime64(int(days.max()), "D"))
+            self.start_date_edit.setDate(
+                QDate(first_day.year, first_day.month, first_day.day)
+            )
+            self.end_date_edit.setDate(
+                QDate(last_day.year, last_day.month, last_day.day)
+            )
+        self.max_people_combo = QComboBox()
+        for count in (100, 500, 2000, 10000):
+            self.max_people_combo.addItem(f"最多{count}人", count)
+        self.max_people_combo.setCurrentIndex(1)
+        self.run_btn = QPushButton("开始扩展")
+        self.run_btn.clicked.connect(self.run_expansion)
+
+        param_layout.addWidget(QLabel("扩展范围："))
+        param_layout.addWidget(self.hops_combo)
+        param_layout.addSpacing(20)
+        param_layout.addWidget(QLabel("行程日期："))
+        param_layout.addWidget(self.start_date_edit)
+        param_layout.addWidget(QLabel("至"))
+        param_layout.addWidget(self.end_date_edit)
+        param_layout.addSpacing(20)
+        param_layout.addWidget(self.max_people_combo)
+        param_layout.addStretch()
+        param_layout.addWidget(self.run_btn)
+        layout.addLayout(param_layout)
+
+        self.status_label = QLabel("同一航班车次、同一出发日期的人员视为一次同行")
+        self.status_label.setStyleSheet("color: #666666;")
+        layout.addWidget(self.status_label)
 
-            # 映射列名
-            column_mapping = {
-                "航班号": "航班车次",
-                "出发机场名称": "发站",
-                "到达机场名称": "到站",
-                "起飞时间": "出发时间",
-            }
-            for old_col, new_col in column_mapping.items():
-                if old_col in df.columns and new_col not in df.columns:
-                    df[new_col] = df[old_col]
-
-            # 处理日期时间
-            if "起飞时间" in df.columns:
-                df["起飞时间_dt"] = pd.to_datetime(df["起飞时间"], errors="coerce")
-                df["出发日期"] = df["起飞时间_dt"].dt.normalize()
-                df["出发时间"] = df["起飞时间_dt"].dt.strftime("%H:%M")
-            elif "出发日期" not in df.columns:
-                df["出发日期"] = pd.NaT
+        self.result_table = QTableWidget()
+        self.result_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.result_table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.result_table)
 
-            return df
-        except Exception as e:
-            raise Exception(f"读取航班数据失败：{str(e)}")
+        button_layout = QHBoxLayout()
+        self.export_btn = QPushButton("导出结果")
+        self.export_btn.setEnabled(False)
+        self.export_btn.clicked.connect(self.export_result)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        button_layout.addStretch()
+        button_layout.addWidget(self.export_btn)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+    def run_expansion(self):
+        start = time.perf_counter()
+        max_people = self.max_people_combo.currentData()
+        self.result = self.graph.expand(
+            self.person_id,
+            hops=self.hops_combo.currentData(),
+            start_date=self.start_date_edit.date().toPython(),
+            end_date=self.end_date_edit.date().toPython(),
+            max_people=max_people,
+        )
+        elapsed = (time.perf_counter() - start) * 1000
 
-    def merge_data(self, df1, df2):
-        """合并两份数据 - 简化版"""
-        if df1 is None or df1.empty:
-            if df2 is None or df2.empty:
-                return pd.DataFrame()
-            return df2
+        hop_counts = count_values(self.result["跳数"]).sort_index()
+        summary = "，".join(
+            f"第{hop}跳 {count} 人" for hop, count in hop_counts.items() if hop > 0
+        )
+        capped = "（已达人数上限）" if len(self.result) - 1 >= max_people else ""
+        self.status_label.setText(
+            f"共扩展到 {len(self.result) - 1} 人{capped}：{summary or '无同行人员'}，"
+            f"耗时 {elapsed:.1f} 毫秒"
+        )
 
-        if df2 is None or df2.empty:
-            return df1
+        table = self.result_table
+        table.setSortingEnabled(False)
+        table.clear()
+        table.setRowCount(len(self.result))
+        table.setColumnCount(len(self.result.columns))
+        table.setHorizontalHeaderLabels(list(self.result.columns))
+        for col_idx, col in enumerate(self.result.columns):
+            for row_idx, value in enumerate(self.result[col].tolist()):
+                item = QTableWidgetItem()
+                item.setData(
+                    Qt.DisplayRole, int(value) if col == "跳数" else str(value)
+                )
+                table.setItem(row_idx, col_idx, item)
+        table.setSortingEnabled(True)
+        table.resizeColumnsToContents()
+        self.export_btn.setEnabled(len(self.result) > 1)
 
-        # 票务全库添加默认字段
-        if "变更操作" not in df1.columns:
-            df1["变更操作"] = "票务记录"
-        if "状态类型" not in df1.columns:
-            df1["状态类型"] = "待确认"
+    def export_result(self):
+        """导出扩展结果"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "保存关系扩展结果",
+            f"关系扩展_{self.person_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            "Excel文件 (*.xlsx)",
+        )
+        if not file_path:
+            return
+        try:
+            self.result.to_excel(file_path, sheet_name="关系扩展", index=False)
+            QMessageBox.information(self, "成功", f"结果已导出到：{file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"导出失败：{str(e)}")
 
-        # 合并数据
-        all_data = pd.concat([df1, df2], ignore_index=True)
 
-        # 确保人员类型字段存在且有默认值
-        if "人员类型" not in all_data.columns:
-            all_data["人员类型"] = "未知"
-        else:
-            # 填充空值
-            all_data["人员类型"] = all_data["人员类型"].fillna("未知")
-            all_data["人员类型"] = all_data["人员类型"].replace("", "未知")
+EXCEL_ENGINE_PREFERENCE = ["calamine", "openpyxl"]  # 按解析速度从快到慢排列
+_selected_excel_engine = None
 
-        # 基本去重
-        dedup_columns = ["姓名", "证件号", "航班车次", "出发日期"]
-        dedup_cols_exist = [col for col in dedup_columns if col in all_data.columns]
 
-        if dedup_cols_exist:
-            all_data = all_data.drop_duplicates(subset=dedup_cols_exist, keep="first")
+def excel_engine_available(engine):
+    """判断某个Excel解析引擎在当前环境中是否可用"""
+    if engine == "calamine":
+        # pandas 2.2 起才支持calamine引擎
+        pandas_version = tuple(int(part) for part in pd.__version__.split(".")[:2])
+        return (
+            pandas_version >= (2, 2)
+            and importlib.util.find_spec("python_calamine") is not None
+        )
+    return importlib.util.find_spec(engine) is not None
+
+
+def select_excel_engine():
+    """选择已安装的最快引擎，都不可用时返回None（由pandas自动选择）"""
+    global _selected_excel_engine
+    if _selected_excel_engine is None:
+        _selected_excel_engine = next(
+            (
+                engine
+                for engine in EXCEL_ENGINE_PREFERENCE
+                if excel_engine_available(engine)
+            ),
+            "",
+        )
+        print(f"Excel解析引擎：{_selected_excel_engine or 'pandas默认'}")
+    return _selected_excel_engine or None
 
-        return all_data
 
-    def read_mixed_transport_data(self, file_path):
-        """简化版混合交通数据读取"""
-        if not file_path:
-            return pd.DataFrame()
+def benchmark_excel_engines(file_path, repeat=3):
+    """比较各可用引擎解析同一工作簿全部工作表的耗时"""
+    print(f"解析引擎性能对比：{file_path}")
+    results = {}
+    for engine in EXCEL_ENGINE_PREFERENCE:
+        if not excel_engine_available(engine):
+            print(f"  {engine}: 未安装，跳过")
+            continue
 
+        best = None
         try:
-            xl_file = pd.ExcelFile(file_path)
-            all_data = []
-
-            # 读取铁路数据
-            if "铁路" in xl_file.sheet_names:
-                railway_df = pd.read_excel(file_path, sheet_name="铁路")
-                railway_df.columns = railway_df.columns.str.strip()
-
-                # 基本字段映射
-                if "证件编号" in railway_df.columns:
-                    railway_df["证件号"] = railway_df["证件编号"]
-                if "车次" in railway_df.columns:
-                    railway_df["航班车次"] = railway_df["车次"]
-                if "乘车日期" in railway_df.columns:
-                    railway_df["出发日期"] = pd.to_datetime(
-                        railway_df["乘车日期"], errors="coerce"
+            for _ in range(repeat):
+                start = time.perf_counter()
+                with WorkbookReader(file_path, engine=engine) as workbook:
+                    rows = sum(
+                        len(df)
+                        for df in workbook.read_sheets(workbook.sheet_names).values()
                     )
-                if "乘车时间" in railway_df.columns:
-                    railway_df["出发时间"] = railway_df["乘车时间"]
-
-                railway_df["数据源"] = "铁路票务"
-                railway_df["变更操作"] = "票务记录"
-                railway_df["状态类型"] = "待确认"
-                all_data.append(railway_df)
-
-            # 读取航班数据
-            if "航班" in xl_file.sheet_names:
-                flight_df = pd.read_excel(file_path, sheet_name="航班")
-                flight_df.columns = flight_df.columns.str.strip()
-
-                # 基本字段映射
-                if "航班号" in flight_df.columns:
-                    flight_df["航班车次"] = flight_df["航班号"]
-                if "出发机场名称" in flight_df.columns:
-                    flight_df["发站"] = flight_df["出发机场名称"]
-                if "到达机场名称" in flight_df.columns:
-                    flight_df["到站"] = flight_df["到达机场名称"]
-                if "起飞时间" in flight_df.columns:
-                    flight_df["起飞时间_dt"] = pd.to_datetime(
-                        flight_df["起飞时间"], errors="coerce"
-                    )
-                    flight_df["出发日期"] = flight_df["起飞时间_dt"].dt.normalize()
-                    flight_df["出发时间"] = flight_df["起飞时间_dt"].dt.strftime(
-                        "%H:%M"
-                    )
-
-                # 处理状态类型
-                if "变更操作" in flight_df.columns:
-                    confirmed_operations = ["登机", "值机", "进检"]
-                    planned_operations = ["出票", "座变", "改期"]
-                    flight_df["状态类型"] = flight_df["变更操作"].apply(
-                        lambda x: (
-                            "已确认"
-                            if x in confirmed_operations
-                            else "待确认" if x in planned_operations else "其他"
-                        )
-                    )
-
-                flight_df["数据源"] = "航班更新"
-                all_data.append(flight_df)
-
-            # 合并所有数据
-            if all_data:
-                combined_df = pd.concat(all_data, ignore_index=True, sort=False)
-                return combined_df
-            else:
-                return pd.DataFrame()
-
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
         except Exception as e:
-            raise Exception(f"读取混合交通数据失败：{str(e)}")
+            print(f"  {engine}: 解析失败（{str(e)}）")
+            continue
 
-    def final_dedup(self, df):
-        """最终去重"""
-        dedup_columns = ["姓名", "证件号", "航班车次", "出发日期"]
-        dedup_cols_exist = [col for col in dedup_columns if col in df.columns]
+        results[engine] = best
+        print(f"  {engine}: {best:.2f} 秒（{rows} 行，{rows / best:.0f} 行/秒）")
 
-        if dedup_cols_exist and "变更操作" in df.columns:
-            df["优先级"] = df["变更操作"].map(self.status_priority).fillna(99)
-            df = df.sort_values(by=dedup_cols_exist + ["优先级"])
-            df = df.drop_duplicates(subset=dedup_cols_exist, keep="first")
-            df = df.drop(columns=["优先级"])
-        elif dedup_cols_exist:
-            df = df.drop_duplicates(subset=dedup_cols_exist, keep="first")
+    if results:
+        fastest = min(results, key=results.get)
+        print(f"最快引擎：{fastest}")
+    return results
 
-        return df
 
+PARALLEL_WORKERS = min(8, os.cpu_count() or 1)  # 工作表并行解析的进程数
+_process_pool = None
+_process_pool_lock = threading.Lock()
 
-class DataProcessor(QThread):
-    progress = Signal(int)
-    message = Signal(str)
-    finished = Signal(pd.DataFrame)
-    error = Signal(str)
 
-    def __init__(self):
-        super().__init__()
-        self.file1_path = ""
-        self.file2_path = ""
-        self.start_date = None  # 改为开始日期
-        self.end_date = None  # 新增结束日期
-        self.target_city = ""
-        self.min_people_count = 3  # 默认3人及以上
-        self.existing_data = None  # 已存在的数据
-        self.append_mode = False  # 是否为追加模式
-        self.selected_person_types = []  # 新增：选中的人员类型列表
+def get_process_pool():
+    """获取共享的进程池（首次使用时创建，之后各次导入复用）"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # 使用spawn方式启动子进程，避免在已有Qt线程的进程中fork
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PARALLEL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def shutdown_process_pool():
+    """关闭共享进程池"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+# 各数据源读取时需要的列及读取类型：只解析这些列，工作表中的其他列不读入。
+# 编号类列直接按字符串读取，避免先推断为数字（丢失前导零）再转换；
+# 类型为None的列（日期、时间）由引擎推断，之后统一用parse_datetime/parse_minutes处理。
+TICKET_COLUMNS = {
+    "姓名": str,
+    "证件号": str,
+    "航班车次": str,
+    "航班号": str,
+    "车次": str,
+    "发站": str,
+    "到站": str,
+    "出发日期": None,
+    "出发时间": None,
+    "人员类型": str,
+    "方向": str,
+    "交通工具": str,
+    "入库时间": None,
+    "变更操作": str,
+    "状态类型": str,
+}
+RAILWAY_COLUMNS = {
+    "姓名": str,
+    "证件号": str,
+    "证件编号": str,
+    "航班车次": str,
+    "车次": str,
+    "发站": str,
+    "到站": str,
+    "出发日期": None,
+    "乘车日期": None,
+    "出发时间": None,
+    "乘车时间": None,
+    "人员类型": str,
+    "方向": str,
+    "交通工具": str,
+}
+FLIGHT_COLUMNS = {
+    "姓名": str,
+    "证件号": str,
+    "航班车次": str,
+    "航班号": str,
+    "发站": str,
+    "到站": str,
+    "出发机场名称": str,
+    "到达机场名称": str,
+    "出发日期": None,
+    "出发时间": None,
+    "起飞时间": None,
+    "变更操作": str,
+    "人员类型": str,
+    "方向": str,
+    "交通工具": str,
+}
+
+
+STATUS_PRIORITY = {
+    "登机": 1,
+    "值机": 2,
+    "进检": 3,
+    "出票": 4,
+    "座变": 5,
+    "改期": 6,
+    "段消": 7,
+    "换开": 8,
+    "证变": 9,
+    "值拉": 10,
+    "票务记录": 11,
+}  # 变更操作优先级，数字越小越优先，去重时保留优先级最高的记录
+CONFIRMED_OPERATIONS = ["登机", "值机", "进检"]
+PLANNED_OPERATIONS = ["出票", "座变", "改期"]
+DEDUP_COLUMNS = ["姓名", "证件号", "航班车次", "出发日期"]
+
+
+class StatusTable:
+    """变更操作状态表
+
+    由优先级表和确认/计划操作列表编译而成，一次查表同时得到状态类型和优先级。
+    查表按变更操作的编码进行：分类列直接使用已有编码，其余列先factorize，
+    每个唯一值只查一次字典，再用numpy按编码取回各行结果。
+    """
+
+    STATUS_CATEGORIES = ["已确认", "待确认", "其他"]
+    UNKNOWN_PRIORITY = 99  # 不在优先级表中的变更操作（含空值）
+
+    def __init__(self, priorities, confirmed, planned):
+        self.priorities = dict(priorities)
+        self.status_types = {operation: "已确认" for operation in confirmed}
+        self.status_types.update({operation: "待确认" for operation in planned})
+        self.status_dtype = pd.CategoricalDtype(self.STATUS_CATEGORIES)
+
+    def status_code(self, operation):
+        """变更操作对应的状态类型编码（STATUS_CATEGORIES中的位置）"""
+        return self.STATUS_CATEGORIES.index(self.status_types.get(operation, "其他"))
+
+    def lookup(self, operations):
+        """返回 (状态类型, 优先级)，分别为分类Series和int8 Series"""
+        if isinstance(operations.dtype, pd.CategoricalDtype):
+            codes = operations.cat.codes.to_numpy()
+            uniques = operations.cat.categories
+        else:
+            codes, uniques = pd.factorize(operations)
 
-        # 定义状态优先级（数字越小优先级越高）
-        self.status_priority = {
-            "登机": 1,
-            "值机": 2,
-            "进检": 3,
-            "出票": 4,
-            "座变": 5,
-            "改期": 6,
-            "段消": 7,
-            "换开": 8,
-            "证变": 9,
-            "值拉": 10,
-            "票务记录": 11,  # 票务全库的默认状态
-        }
+        # 末尾追加空值（编码-1）对应的结果
+        status_codes = np.array(
+            [self.status_code(op) for op in uniques] + [self.status_code(None)],
+            dtype=np.int8,
+        )
+        priorities = np.array(
+            [self.priorities.get(op, self.UNKNOWN_PRIORITY) for op in uniques]
+            + [self.UNKNOWN_PRIORITY],
+            dtype=np.int8,
+        )
+        status = pd.Categorical.from_codes(status_codes[codes], dtype=self.status_dtype)
+        return (
+            pd.Series(status, index=operations.index),
+            pd.Series(priorities[codes], index=operations.index),
+        )
 
-    def set_params(
-        self,
-        file1,
-        file2,
-        start_date,
-        end_date,
-        target_city,
-        min_people_count,
-        existing_data=None,
-        append_mode=False,
-        selected_person_types=None,
-    ):
-        self.file1_path = file1
-        self.file2_path = file2
-        self.start_date = start_date  # 开始日期
-        self.end_date = end_date  # 结束日期
-        self.target_city = target_city
-        self.min_people_count = min_people_count
-        self.existing_data = existing_data
-        self.append_mode = append_mode
-        self.selected_person_types = selected_person_types or []  # 设置人员类型筛选
 
-    def run(self):
-        """简化的数据处理流程 - 针对两种固定表格格式优化"""
-        try:
-            self.progress.emit(10)
-            self.message.emit("正在读取数据...")
+STATUS_TABLE = StatusTable(STATUS_PRIORITY, CONFIRMED_OPERATIONS, PLANNED_OPERATIONS)
 
-            all_data = pd.DataFrame()
+RECORD_KEY = "记录键"  # 由去重字段计算的64位哈希键
 
-            # 处理票务全库数据（file1）
-            if self.file1_path:
-                self.message.emit("正在处理票务全库数据...")
-                df1 = self.read_ticket_data(self.file1_path)
-                if not df1.empty:
-                    all_data = pd.concat([all_data, df1], ignore_index=True)
-                    print(f"票务全库数据：{len(df1)} 条记录")
-                self.progress.emit(30)
+# 内部列在没有数据时的取值：{列名: (缺省值, 类型)}
+COLUMN_DEFAULTS = {
+    "优先级": (StatusTable.UNKNOWN_PRIORITY, np.int8),
+    "出发分钟": (-1, np.int16),  # 一天内的分钟数，-1表示时间未知
+}
+CITY_CODE_COLUMNS = {"到站": "到站城市码", "发站": "发站城市码"}  # {车站列: 城市编码列}
+# 仅供内部计算使用，导出时不写出
+INTERNAL_COLUMNS = [RECORD_KEY, *COLUMN_DEFAULTS, *CITY_CODE_COLUMNS.values()]
 
-            # 处理群体票务数据（file2）- 包含铁路+航班
-            if self.file2_path:
-                self.message.emit("正在处理群体票务数据（铁路+航班）...")
-                df2 = self.read_mixed_transport_data(self.file2_path)
-                if not df2.empty:
-                    all_data = pd.concat([all_data, df2], ignore_index=True)
-                    print(f"群体票务数据：{len(df2)} 条记录")
-                self.progress.emit(60)
 
-            # 验证数据
-            if all_data.empty:
-                self.error.emit("没有读取到有效数据")
-                return
+def default_column(col, index):
+    """COLUMN_DEFAULTS中的列在没有数据时的取值"""
+    fill, dtype = COLUMN_DEFAULTS[col]
+    return pd.Series(np.full(len(index), fill, dtype=dtype), index=index)
 
-            # 检查必要字段
-            required_fields = ["姓名", "证件号", "航班车次", "出发日期", "到站"]
-            missing_fields = [
-                field for field in required_fields if field not in all_data.columns
-            ]
-            if missing_fields:
-                self.error.emit(f"数据缺少必要字段：{', '.join(missing_fields)}")
-                return
 
-            self.progress.emit(70)
-            self.message.emit("正在去重和整理数据...")
+CITY_CONFIG_PATH = os.path.join(
+    os.path.expanduser("~"), ".group_travel_checker", "cities.json"
+)
 
-            # 统一去重处理
-            all_data = self.final_dedup(all_data)
-            print(f"去重后总数据：{len(all_data)} 条记录")
+# 内置城市关键词：车站名称包含任一关键词即属于该城市
+DEFAULT_CITY_KEYWORDS = {
+    "北京": ["北京", "首都", "大兴"],
+    "福州": ["福州", "长乐"],
+}
 
-            # 如果有历史数据，进行合并
-            if self.existing_data is not None and not self.existing_data.empty:
-                self.message.emit("正在合并历史数据...")
-                all_data = pd.concat([self.existing_data, all_data], ignore_index=True)
-                all_data = self.final_dedup(all_data)
-                print(f"合并历史数据后：{len(all_data)} 条记录")
+# 内置车站别名：按完整名称直接对应城市（如机场三字码）
+DEFAULT_STATION_ALIASES = {
+    "PEK": "北京",
+    "PKX": "北京",
+    "FOC": "福州",
+}
 
-            # 保存合并后的全量数据
-            self.all_data = all_data
 
-            self.progress.emit(80)
-            self.message.emit("正在筛选目标人员...")
+class StationDirectory:
+    """车站→城市对照表
 
-            # 筛选数据
-            filtered_data = self.filter_data(
-                all_data, self.start_date, self.end_date, self.target_city
-            )
+    城市按配置顺序编号为1、2、3…，0表示未识别。车站名称先按别名表精确匹配，
+    再按城市关键词包含匹配（先配置的城市优先）。对照表由内置默认值与用户配置
+    文件（CITY_CONFIG_PATH）合并而成，配置格式为：
 
-            self.progress.emit(90)
-            self.message.emit("正在识别群体出行...")
+        {"城市": {"上海": ["上海", "虹桥", "浦东"]}, "别名": {"SHA": "上海"}}
 
-            # 识别群体出行
-            result = self.identify_groups(filtered_data)
+    在配置文件中增加城市或关键词即可参与筛选，不需要修改代码。
+    """
 
-            self.progress.emit(100)
-            self.message.emit("筛查完成！")
-            self.finished.emit(result)
+    UNKNOWN_CODE = 0
 
+    def __init__(self, keywords, aliases=None):
+        self.keywords = {city: list(words) for city, words in keywords.items()}
+        # 别名不区分大小写，统一按大写存储
+        self.aliases = {
+            str(name).strip().upper(): city for name, city in (aliases or {}).items()
+        }
+        # 只出现在别名表中的城市也分配编码
+        for city in self.aliases.values():
+            self.keywords.setdefault(city, [])
+        self.cities = list(self.keywords)
+        self.codes = {city: code for code, city in enumerate(self.cities, 1)}
+        config = json.dumps([self.keywords, self.aliases], ensure_ascii=False)
+        self.digest = hashlib.sha1(config.encode("utf-8")).hexdigest()[:8]
+
+    @classmethod
+    def load(cls, config_path=CITY_CONFIG_PATH):
+        """内置对照表合并用户配置文件（文件不存在或格式错误时只用内置对照表）"""
+        keywords = {city: list(words) for city, words in DEFAULT_CITY_KEYWORDS.items()}
+        aliases = dict(DEFAULT_STATION_ALIASES)
+        try:
+            if os.path.exists(config_path):
+                with open(config_path, encoding="utf-8") as f:
+                    config = json.load(f)
+                for city, words in config.get("城市", {}).items():
+                    if isinstance(words, str):
+                        words = [words]
+                    merged = keywords.get(city, []) + [str(w) for w in words]
+                    keywords[city] = list(dict.fromkeys(merged))
+                aliases.update(
+                    {str(k): str(v) for k, v in config.get("别名", {}).items()}
+                )
+                print(f"已加载城市配置：{config_path}")
         except Exception as e:
-            self.error.emit(f"处理出错：{str(e)}")
+            print(f"读取城市配置失败，使用内置对照表：{str(e)}")
+        return cls(keywords, aliases)
+
+    def resolve(self, station):
+        """单个车站名称对应的城市编码"""
+        if station is None or (not isinstance(station, str) and pd.isna(station)):
+            return self.UNKNOWN_CODE
+        name = str(station).strip()
+        city = self.aliases.get(name.upper())
+        if city is None:
+            city = next(
+                (
+                    city
+                    for city, words in self.keywords.items()
+                    if any(word and word in name for word in words)
+                ),
+                None,
+            )
+        return self.codes.get(city, self.UNKNOWN_CODE)
 
-    def read_ticket_data(self, file_path):
-        """读取票务全库数据"""
-        if not file_path:
+    def city_codes(self, stations):
+        """车站列 -> 城市编码列（int16），每个不同的车站名称只解析一次"""
+        if isinstance(stations.dtype, pd.CategoricalDtype):
+            codes = stations.cat.codes.to_numpy()
+            uniques = stations.cat.categories
+        else:
+            codes, uniques = pd.factorize(stations)
+
+        # 末尾追加空值（编码-1）对应的结果
+        table = np.array(
+            [self.resolve(station) for station in uniques] + [self.UNKNOWN_CODE],
+            dtype=np.int16,
+        )
+        return pd.Series(table[codes], index=stations.index)
+
+    def code_of(self, city):
+        """城市名称对应的编码，不在对照表中时返回-1（不与任何车站匹配）"""
+        return self.codes.get(city, -1)
+
+
+STATION_DIRECTORY = StationDirectory.load()
+
+
+def city_code_column(data, station_col, index):
+    """data（DataFrame或列字典）中车站列对应的城市编码列，缺列时为未识别"""
+    stations = data.get(station_col)
+    if isinstance(stations, pd.Series):
+        return STATION_DIRECTORY.city_codes(stations)
+    code = (
+        STATION_DIRECTORY.UNKNOWN_CODE
+        if stations is None
+        else STATION_DIRECTORY.resolve(stations)
+    )
+    return pd.Series(np.full(len(index), code, dtype=np.int16), index=index)
+
+
+# 以分类类型存储的低基数列及其固定类别（其余取值按出现顺序追加在后面）。
+# 类别集合在各数据源、各次追加之间保持一致，合并时不会退化为object。
+CATEGORY_COLUMNS = {
+    "变更操作": list(STATUS_PRIORITY) + ["未知"],
+    "状态类型": StatusTable.STATUS_CATEGORIES,
+    "数据源": ["票务全库", "铁路票务", "航班更新"],
+    "交通方式": ["铁路", "航班"],
+    "人员类型": [],
+    "发站": [],
+    "到站": [],
+}
+
+
+class SourceSpec:
+    """数据源标准化规则
+
+    name: 数据源名称，写入"数据源"列
+    columns: 读取时需要的列及类型
+    column_mapping: {源列名: 标准列名}，标准列不存在时由源列复制
+    ensure_columns: 必须存在的列，缺失时补空值
+    text_columns: 去除空值、首尾空格的字符串列
+    required_columns: 为空时删除整行的列
+    constants: 固定写入的列值
+    classify_status: 是否按变更操作划分状态类型
+    departure_datetime: 拆分出发日期和出发时间的日期时间列
+    person_type_default: 人员类型为空时的默认值
+    priority_dedup: 去重时是否按变更操作优先级保留
+    """
+
+    def __init__(
+        self,
+        name,
+        columns,
+        column_mapping=None,
+        ensure_columns=(),
+        text_columns=(),
+        required_columns=(),
+        constants=None,
+        classify_status=False,
+        departure_datetime=None,
+        person_type_default=None,
+        priority_dedup=False,
+    ):
+        self.name = name
+        self.columns = columns
+        self.column_mapping = column_mapping or {}
+        self.ensure_columns = list(ensure_columns)
+        self.text_columns = list(text_columns)
+        self.required_columns = list(required_columns)
+        self.constants = {"数据源": name, **(constants or {})}
+        self.classify_status = classify_status
+        self.departure_datetime = departure_datetime
+        self.person_type_default = person_type_default
+        self.priority_dedup = priority_dedup
+
+
+SOURCE_SPECS = {
+    "票务全库": SourceSpec(
+        "票务全库",
+        TICKET_COLUMNS,
+        column_mapping={"航班号": "航班车次", "车次": "航班车次"},
+        ensure_columns=[
+            "姓名",
+            "证件号",
+            "航班车次",
+            "发站",
+            "到站",
+            "出发日期",
+            "出发时间",
+        ],
+        text_columns=[
+            "姓名",
+            "证件号",
+            "航班车次",
+            "人员类型",
+            "方向",
+            "交通工具",
+            "入库时间",
+        ],
+        required_columns=["姓名", "证件号", "航班车次"],
+    ),
+    "铁路票务": SourceSpec(
+        "铁路票务",
+        RAILWAY_COLUMNS,
+        column_mapping={
+            "证件编号": "证件号",
+            "车次": "航班车次",
+            "乘车日期": "出发日期",
+            "乘车时间": "出发时间",
+        },
+        text_columns=["姓名", "证件号", "航班车次"],
+        constants={"交通方式": "铁路", "变更操作": "票务记录", "状态类型": "待确认"},
+        person_type_default="未知",
+    ),
+    "航班更新": SourceSpec(
+        "航班更新",
+        FLIGHT_COLUMNS,
+        column_mapping={
+            "航班号": "航班车次",
+            "出发机场名称": "发站",
+            "到达机场名称": "到站",
+        },
+        text_columns=["姓名", "证件号", "航班车次"],
+        required_columns=["姓名", "证件号"],
+        constants={"交通方式": "航班"},
+        classify_status=True,
+        departure_datetime="起飞时间",
+        person_type_default="未知",
+        priority_dedup=True,
+    ),
+}
+
+
+def encode_categories(df):
+    """把CATEGORY_COLUMNS中的列编码为分类类型（已是分类类型的列不变）"""
+    updates = {}
+    for col, known in CATEGORY_COLUMNS.items():
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            categories = dict.fromkeys(known)
+            categories.update(dict.fromkeys(pd.unique(df[col].dropna())))
+            updates[col] = df[col].astype(pd.CategoricalDtype(list(categories)))
+    return df.assign(**updates) if updates else df
+
+
+def concat_frames(frames):
+    """合并多个DataFrame（忽略空表）
+
+    分类列先统一为各表类别的并集再合并，避免pd.concat因类别不同退化为object；
+    某个表缺少该列时补为空的分类列。
+    """
+    frames = [df for df in frames if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    updates = [{} for _ in frames]
+    for col, known in CATEGORY_COLUMNS.items():
+        present = [df[col] for df in frames if col in df.columns]
+        if not present:
+            continue
+
+        categories = dict.fromkeys(known)
+        for values in present:
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                categories.update(dict.fromkeys(values.cat.categories))
+            else:
+                categories.update(dict.fromkeys(pd.unique(values.dropna())))
+        dtype = pd.CategoricalDtype(list(categories))
+
+        for df, update in zip(frames, updates):
+            if col not in df.columns:
+                update[col] = pd.Categorical.from_codes(
+                    np.full(len(df), -1), dtype=dtype
+                )
+            elif not (
+                isinstance(df[col].dtype, pd.CategoricalDtype)
+                and df[col].cat.categories.equals(dtype.categories)
+            ):
+                update[col] = df[col].astype(dtype)
+
+    for df, update in zip(frames, updates):
+        for col in COLUMN_DEFAULTS:
+            if col not in df.columns:
+                update[col] = default_column(col, df.index)
+        if RECORD_KEY not in df.columns:
+            update[RECORD_KEY] = record_keys(df, df.index)
+        for station_col, code_col in CITY_CODE_COLUMNS.items():
+            if code_col not in df.columns:
+                update[code_col] = city_code_column(df, station_col, df.index)
+
+    frames = [
+        df.assign(**update) if update else df for df, update in zip(frames, updates)
+    ]
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+
+def count_values(values):
+    """value_counts，分类列只统计实际出现的类别"""
+    counts = values.value_counts()
+    return counts[counts > 0]
+
+
+def record_priority(df):
+    """各行的优先级（int8）：使用优先级列，缺少时由变更操作查表；都没有时返回None"""
+    if "优先级" in df.columns:
+        if df["优先级"].isna().any():
+            fill, dtype = COLUMN_DEFAULTS["优先级"]
+            return df["优先级"].fillna(fill).astype(dtype)
+        return df["优先级"]
+    if "变更操作" in df.columns:
+        return STATUS_TABLE.lookup(df["变更操作"])[1]
+    return None
+
+
+def dedup_records(df, by_priority=False):
+    """按姓名、证件号、航班车次、出发日期去重
+
+    by_priority为True时保留优先级最高（数字最小）的记录，优先级相同时保留
+    首次出现的记录；否则保留首次出现的记录。
+
+    去重按记录键进行：先按记录键分组求最小优先级，只保留达到最小优先级的行，
+    再按记录键保留首次出现的行，全程为整数哈希运算，不做多列排序。
+    记录键出现哈希冲突时改为按字段排序去重。
+    """
+    columns = [col for col in DEDUP_COLUMNS if col in df.columns]
+    if not columns:
+        return df
+
+    if RECORD_KEY in df.columns:
+        keys = df[RECORD_KEY]
+    else:
+        keys = record_keys(df, df.index)
+        df = df.assign(**{RECORD_KEY: keys})
+
+    if key_collisions(df, keys):
+        print("记录键出现哈希冲突，改为按字段去重")
+        return dedup_by_columns(df, columns, by_priority)
+
+    if by_priority:
+        priority = record_priority(df)
+        if priority is not None:
+            best = priority.groupby(keys.to_numpy()).transform("min")
+            is_best = (priority == best).to_numpy()
+            df, keys = df[is_best], keys[is_best]
+
+    return df[~keys.duplicated().to_numpy()]
+
+
+def dedup_by_columns(df, columns, by_priority=False):
+    """按字段排序去重（记录键冲突时使用），规则与dedup_records相同"""
+    if by_priority:
+        priority = record_priority(df)
+        if priority is None:
+            return df.drop_duplicates(subset=columns, keep="first")
+        # 多列排序为稳定排序，同一优先级内保持原有顺序
+        df = df.assign(优先级=priority).sort_values(by=columns + ["优先级"])
+
+    return df.drop_duplicates(subset=columns, keep="first")
+
+
+def map_uniques(values, func, na_result):
+    """按唯一值计算、再按编码广播回各行（factorize → 计算 → 广播）
+
+    func接收由唯一值组成的Series并返回等长结果，空值行取na_result。
+    车站、车次、人员类型等低基数列上，字符串运算只需对几十到几百个
+    唯一值执行一次，而不是对每一行执行。
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # 分类列直接使用已有的编码，无需再做哈希
+        codes = values.cat.codes.to_numpy().copy()
+        uniques = values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    results = pd.Series(func(pd.Series(uniques)))
+    results = pd.concat([results, pd.Series([na_result])], ignore_index=True)
+    codes[codes < 0] = len(uniques)  # 编码-1（空值）取最后一个元素
+    return pd.Series(results.array.take(codes), index=values.index)
+
+
+def clean_text(values):
+    """空值转为空字符串并去除首尾空格，等价于fillna("").astype(str).str.strip()"""
+    return map_uniques(values, lambda uniques: uniques.astype(str).str.strip(), "")
+
+
+def contains_text(values, pattern, case=False):
+    """按唯一值匹配的str.contains，空值不匹配"""
+    return map_uniques(
+        values,
+        lambda uniques: uniques.astype(str).str.contains(pattern, case=case, na=False),
+        False,
+    ).astype(bool)
+
+
+def is_blank(values):
+    """空值或空字符串"""
+    return values.isna().to_numpy() | (values == "").to_numpy()
+
+
+def fill_blank_column(df, col, fallback):
+    """df[col]为空（或没有该列）的行改用fallback中同位置的非空值"""
+    fallback = fallback.reset_index(drop=True)
+    if col not in df.columns:
+        df[col] = fallback.to_numpy()
+        return
+    use = is_blank(df[col]) & ~is_blank(fallback)
+    if use.any():
+        values = df[col].astype(object).to_numpy(copy=True)
+        values[use] = fallback.astype(object).to_numpy()[use]
+        df[col] = values
+
+
+def merge_key_codes(*frames):
+    """按姓名、证件号、航班车次、出发日期（按天）生成各表共用的整数键
+
+    字符串列去除首尾空格、空值视为空字符串，与逐行拼接字符串键等价；
+    返回与各表行对应的整数键Series。
+    """
+    parts = []
+    for df in frames:
+        keys = {
+            col: clean_text(df[col]).astype(object)
+            for col in ["姓名", "证件号", "航班车次"]
+        }
+        keys["出发日期"] = parse_datetime(df["出发日期"]).dt.normalize()
+        parts.append(pd.DataFrame(keys, index=pd.RangeIndex(len(df))))
+    codes = (
+        pd.concat(parts, ignore_index=True)
+        .groupby(list(parts[0].columns), sort=False, dropna=False)
+        .ngroup()
+        .to_numpy()
+    )
+    bounds = np.cumsum([0] + [len(part) for part in parts])
+    return [pd.Series(codes[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+MINUTE_LABELS = np.array(
+    [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60)],
+    dtype=object,
+)  # 一天内每分钟对应的"HH:MM"文本
+
+
+def format_hhmm(minutes):
+    """把分钟数列格式化为"HH:MM"：按分钟数查表，代替逐行strftime；-1为空值"""
+    values = minutes.to_numpy()
+    valid = values >= 0
+    labels = np.full(len(values), np.nan, dtype=object)
+    labels[valid] = MINUTE_LABELS[values[valid].astype(np.int64)]
+    return pd.Series(labels, index=minutes.index)
+
+
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")  # Excel序列日期的起点（1900日期系统）
+EXCEL_SERIAL_RANGE = (1, 2958465)  # 1900-01-01 至 9999-12-31
+COMPACT_DATE_RANGE = (19000101, 99991231)  # YYYYMMDD形式的数字日期
+DATE_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d",
+    "%Y年%m月%d日",
+]  # 文本日期的候选格式
+DATE_SAMPLE_SIZE = 200  # 检测格式时采样的唯一值个数
+TIME_PATTERN = re.compile(r"(\d{1,2})[:：时](\d{2})")
+
+
+def detect_date_format(texts):
+    """采样文本日期的唯一值，返回命中最多的候选格式，无法识别时返回None"""
+    sample = texts[texts != ""].head(DATE_SAMPLE_SIZE)
+    best_format, best_hits = None, 0
+    for fmt in DATE_FORMATS:
+        hits = pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum()
+        if hits > best_hits:
+            best_format, best_hits = fmt, hits
+        if hits == len(sample):
+            break
+    return best_format
+
+
+def _numeric_dates(numbers):
+    """数字日期：Excel序列号（可带小数表示时间）或YYYYMMDD整数"""
+    result = pd.Series(pd.NaT, index=numbers.index, dtype="datetime64[ns]")
+    serial = numbers.between(*EXCEL_SERIAL_RANGE)
+    if serial.any():
+        days = pd.to_timedelta(numbers[serial], unit="D").dt.round("s")
+        result[serial] = EXCEL_EPOCH + days
+    compact = numbers.between(*COMPACT_DATE_RANGE) & (numbers % 1 == 0)
+    if compact.any():
+        result[compact] = pd.to_datetime(
+            numbers[compact].astype(np.int64).astype(str),
+            format="%Y%m%d",
+            errors="coerce",
+        )
+    return result
+
+
+def _value_kind(value):
+    if isinstance(value, (datetime, date, np.datetime64)):
+        return "datetime"
+    if isinstance(value, (bool, np.bool_)):
+        return "other"
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return "number"
+    return "text"
+
+
+def _parse_unique_dates(uniques):
+    """解析一组互不相同的日期值（对象Series），返回datetime64[ns]列
+
+    日期对象直接转换，数字按Excel序列号处理，文本先采样检测格式再按显式格式
+    解析；个别不符合该格式的文本逐个推断。
+    """
+    result = pd.Series(pd.NaT, index=uniques.index, dtype="datetime64[ns]")
+    kinds = uniques.map(_value_kind)
+
+    is_datetime = kinds == "datetime"
+    if is_datetime.any():
+        result[is_datetime] = pd.to_datetime(
+            uniques[is_datetime].tolist(), errors="coerce"
+        )
+
+    texts = uniques[kinds == "text"].astype(str).str.strip()
+    numbers = pd.to_numeric(uniques[kinds == "number"], errors="coerce")
+    numeric_texts = pd.to_numeric(texts, errors="coerce")
+    numbers = pd.concat([numbers, numeric_texts.dropna()]).astype(float)
+    if not numbers.empty:
+        result[numbers.index] = _numeric_dates(numbers)
+
+    texts = texts[numeric_texts.isna() & (texts != "")]
+    if texts.empty:
+        return result
+
+    # 检测到的格式优先，其余候选格式依次处理剩下的文本
+    formats = dict.fromkeys([detect_date_format(texts)] + DATE_FORMATS)
+    for fmt in formats:
+        if fmt is None or texts.empty:
+            continue
+        parsed = pd.to_datetime(texts, format=fmt, errors="coerce")
+        hit = parsed.notna()
+        result[texts.index[hit]] = parsed[hit]
+        texts = texts[~hit]
+    if not texts.empty:
+        result[texts.index] = texts.map(
+            lambda text: pd.to_datetime(text, errors="coerce")
+        )
+    return result
+
+
+def parse_datetime(values):
+    """把日期列解析为datetime64（已是日期类型时原样返回）
+
+    每个唯一值只解析一次，再按编码广播回各行。大量重复的日期、Excel序列号与
+    文本混杂的列也不需要逐行推断格式。
+    """
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values
+    codes, uniques = pd.factorize(values)
+    parsed = _parse_unique_dates(pd.Series(np.asarray(uniques, dtype=object)))
+    parsed = np.append(
+        parsed.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns")
+    )  # 编码-1（空值）取最后一个元素
+    return pd.Series(parsed[codes], index=values.index)
+
+
+def _unique_minutes(value):
+    """单个时间值 -> 一天内的分钟数，无法识别时返回-1"""
+    if isinstance(value, (datetime, dt_time)):
+        return value.hour * 60 + value.minute
+    if isinstance(value, (bool, np.bool_)):
+        return -1
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        if 0 <= value < 1:  # Excel时间：一天的比例
+            return int(round(value * 1440)) % 1440
+        if value % 1 == 0 and 0 <= value < 2400 and value % 100 < 60:  # HHMM
+            return int(value // 100 * 60 + value % 100)
+        return -1
+
+    text = str(value).strip()
+    match = TIME_PATTERN.search(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        return hour * 60 + minute if hour < 24 and minute < 60 else -1
+    try:
+        return _unique_minutes(float(text))
+    except ValueError:
+        return -1
+
+
+def parse_minutes(values):
+    """把时间列解析为一天内的分钟数（int16，-1表示未知）
+
+    支持datetime、time对象、"HH:MM"文本、Excel时间小数和HHMM数字，
+    每个唯一值只解析一次。
+    """
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        minutes = (values.dt.hour * 60 + values.dt.minute).fillna(-1)
+        return minutes.astype(np.int16)
+    codes, uniques = pd.factorize(values)
+    table = np.array([_unique_minutes(value) for value in uniques] + [-1])
+    return pd.Series(table.astype(np.int16)[codes], index=values.index)
+
+
+KEY_MULTIPLIER = np.uint64(0x100000001B3)  # 组合各字段哈希时使用的乘数（FNV质数）
+
+
+def _hash_text(values):
+    """字符串列逐行的64位哈希：去除首尾空格、空值按空字符串计算，每个唯一值只哈希一次"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        uniques = values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    texts = pd.Series(np.asarray(uniques, dtype=object)).astype(str).str.strip()
+    texts = np.append(texts.to_numpy(dtype=object), "")  # 编码-1（空值）取最后一个元素
+    return pd.util.hash_array(texts, categorize=False)[codes]
+
+
+def record_keys(data, index, by_day=False):
+    """按姓名、证件号、航班车次、出发日期计算每行的64位记录键（int64）
+
+    data为DataFrame或 {列名: Series} 字典，缺少的字段按空值计算。字符串字段
+    与去重时一样去除首尾空格，出发日期按纳秒时间戳计算；by_day为True时只取
+    日期部分（合并票务与航班数据时使用）。
+    """
+    key = np.zeros(len(index), dtype=np.uint64)
+    for col in DEDUP_COLUMNS:
+        values = data[col] if col in data else None
+        if not isinstance(values, pd.Series):
+            values = pd.Series(values, index=index, dtype=object)
+        if col == "出发日期":
+            dates = parse_datetime(values)
+            if by_day:
+                dates = dates.dt.normalize()
+            stamps = dates.to_numpy(dtype="datetime64[ns]").view(np.int64)
+            hashes = pd.util.hash_array(stamps, categorize=False)
+        else:
+            hashes = _hash_text(values)
+        key = key * KEY_MULTIPLIER ^ hashes
+    return pd.Series(key.view(np.int64), index=index)
+
+
+def key_collisions(df, keys, by_day=False):
+    """返回记录键相同但去重字段不同的键（64位哈希冲突），正常情况下为空列表
+
+    只有记录键重复的行才可能受冲突影响，因此只核对这些行的字段值。
+    """
+    duplicated = keys.duplicated(keep=False).to_numpy()
+    if not duplicated.any():
+        return []
+
+    columns = [col for col in DEDUP_COLUMNS if col in df.columns]
+    subset = df[duplicated][columns]
+    if by_day and "出发日期" in subset.columns:
+        subset = subset.assign(
+            出发日期=parse_datetime(subset["出发日期"]).dt.normalize()
+        )
+    distinct = subset.assign(**{RECORD_KEY: keys.to_numpy()[duplicated]})
+    distinct = distinct.drop_duplicates()[RECORD_KEY]
+    return distinct[distinct.duplicated()].unique().tolist()
+
+
+def normalize_source(df, spec, verbose=True):
+    """按数据源规则标准化一个工作表（或流式读取的一个数据块）
+
+    各列在字典中逐列向量化处理，最后只构造一次DataFrame；必填字段为空的行
+    累积到同一个掩码中一次性过滤，然后按规则去重。
+    """
+    df.columns = df.columns.astype(str).str.strip()
+    index = df.index
+    data = dict(df.items())  # 列名 -> Series，逐列替换，不复制整表
+
+    # 列映射和缺失列
+    for source, target in spec.column_mapping.items():
+        if source in data and target not in data:
+            data[target] = data[source]
+    for col in spec.ensure_columns:
+        if col not in data:
+            data[col] = pd.Series(None, index=index, dtype=object)
+    data.update(spec.constants)
+
+    # 字符串清洗，同时标记必填字段为空的行
+    keep = np.ones(len(index), dtype=bool)
+    for col in spec.text_columns:
+        if col not in data:
+            continue
+        data[col] = clean_text(data[col])
+        if col in spec.required_columns:
+            blank = (data[col] == "").to_numpy()
+            if verbose and blank.any():
+                print(f"{spec.name}：删除{col}为空的记录：{int(blank.sum())}条")
+            keep &= ~blank
+
+    if spec.person_type_default is not None:
+        default = spec.person_type_default
+        if "人员类型" in data:
+            data["人员类型"] = data["人员类型"].fillna(default).replace("", default)
+        else:
+            data["人员类型"] = default
+
+    # 状态类型和优先级：按变更操作一次查表
+    if spec.classify_status and "变更操作" not in data:
+        data["变更操作"] = "未知"
+    if "变更操作" in data:
+        operations = data["变更操作"]
+        if not isinstance(operations, pd.Series):  # 常量列
+            operations = pd.Series(operations, index=index)
+        status, data["优先级"] = STATUS_TABLE.lookup(operations)
+        if spec.classify_status:
+            data["状态类型"] = status
+    else:
+        data["优先级"] = default_column("优先级", index)
+
+    # 日期时间：出发日期为datetime64，出发分钟为一天内的分钟数，出发时间为"HH:MM"
+    if spec.departure_datetime and spec.departure_datetime in data:
+        departure = parse_datetime(data[spec.departure_datetime])
+        data[f"{spec.departure_datetime}_dt"] = departure
+        data["出发日期"] = departure.dt.normalize()
+        data["出发分钟"] = parse_minutes(departure)
+        data["出发时间"] = format_hhmm(data["出发分钟"])
+    else:
+        if isinstance(data.get("出发日期"), pd.Series):
+            data["出发日期"] = parse_datetime(data["出发日期"])
+        else:
+            data["出发日期"] = pd.Series(pd.NaT, index=index, dtype="datetime64[ns]")
+        if isinstance(data.get("出发时间"), pd.Series):
+            raw_time = data["出发时间"]
+            data["出发分钟"] = parse_minutes(raw_time)
+            # 无法识别的时间保留原值
+            data["出发时间"] = format_hhmm(data["出发分钟"]).where(
+                data["出发分钟"] >= 0, raw_time
+            )
+        else:
+            data["出发分钟"] = default_column("出发分钟", index)
+
+    # 车站所属城市编码：每个不同的车站名称只查一次对照表
+    for station_col, code_col in CITY_CODE_COLUMNS.items():
+        data[code_col] = city_code_column(data, station_col, index)
+
+    data[RECORD_KEY] = record_keys(data, index)
+
+    df = pd.DataFrame(data, index=index)
+    if not keep.all():
+        df = df[keep]
+
+    before_count = len(df)
+    df = dedup_records(df, by_priority=spec.priority_dedup)
+    if verbose:
+        if before_count > len(df):
+            print(f"{spec.name}数据去重：{before_count} 条 -> {len(df)} 条")
+        print(f"{spec.name}数据处理完成：{len(df)} 条记录")
+    return encode_categories(df)
+
+
+def row_content_hashes(df, spec_name):
+    """原始行内容的64位哈希（uint64），列按列名排序后计算并区分数据源"""
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+    columns = sorted(df.columns, key=str)
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    salt = pd.util.hash_array(np.array([spec_name], dtype=object))[0]
+    return hashes * KEY_MULTIPLIER ^ salt
+
+
+def split_known_rows(df, spec_name, known_rows=None):
+    """计算原始行哈希并去掉已合并过的行
+
+    返回 (新增或变化的行, 全部行的哈希, 跳过的行数)。
+    """
+    hashes = row_content_hashes(df, spec_name)
+    if known_rows is None or not len(known_rows) or df.empty:
+        return df, hashes, 0
+    fresh = ~np.isin(hashes, known_rows)
+    return df[fresh], hashes, int(len(df) - fresh.sum())
+
+
+class RowDelta:
+    """一个源文件的行级增量信息
+
+    known_rows: 已合并过的原始行哈希，读取时内容相同的行直接跳过，不再标准化
+    row_hashes: 本次读取到的全部原始行哈希
+    unchanged: 跳过的行数；skipped: 整个文件与已导入的文件内容相同而未读取
+    """
+
+    def __init__(self, known_rows=None):
+        self.known_rows = known_rows
+        self.parts = []
+        self.unchanged = 0
+        self.skipped = False
+
+    def record(self, hashes, unchanged):
+        self.parts.append(hashes)
+        self.unchanged += unchanged
+
+    @property
+    def row_hashes(self):
+        if not self.parts:
+            return np.empty(0, dtype=np.uint64)
+        return np.concatenate(self.parts)
+
+
+def _load_sheet_job(spec_name, file_path, sheet_name, known_rows=None):
+    """进程池任务：按数据源规则读取并标准化单个工作表
+
+    返回 (DataFrame, 原始行哈希, 跳过的行数)，工作表不存在时返回None。
+    known_rows中的行（已合并过的相同内容）不再标准化。
+    """
+    spec = SOURCE_SPECS[spec_name]
+    with WorkbookReader(file_path) as workbook:
+        if isinstance(sheet_name, str) and sheet_name not in workbook.sheet_names:
+            return None
+        df = workbook.read_projected(sheet_name, spec.columns)
+    workbook.report()
+    df, hashes, unchanged = split_known_rows(df, spec_name, known_rows)
+    if df.empty:
+        return pd.DataFrame(), hashes, unchanged
+    return normalize_source(df, spec), hashes, unchanged
+
+
+def load_sheets_parallel(file_path, sheet_specs, delta=None):
+    """把同一工作簿的各个工作表分发到进程池中并行解析、标准化
+
+    sheet_specs为 {工作表名或序号: 数据源名称}，返回 {工作表名或序号: DataFrame}，
+    不存在的工作表不出现在结果中。进程池不可用时在当前进程依次处理。
+    传入delta（RowDelta）时跳过其中已合并过的行，并记录本次读取的行哈希。
+    """
+    known_rows = delta.known_rows if delta is not None else None
+    jobs = [
+        (spec_name, file_path, sheet_name, known_rows)
+        for sheet_name, spec_name in sheet_specs.items()
+    ]
+
+    results = None
+    if PARALLEL_WORKERS > 1:
+        try:
+            pool = get_process_pool()
+            futures = [pool.submit(_load_sheet_job, *job) for job in jobs]
+            results = [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            print(f"进程池不可用，改为在当前进程读取：{str(e)}")
+            shutdown_process_pool()
+
+    if results is None:
+        results = [_load_sheet_job(*job) for job in jobs]
+
+    frames = {}
+    for sheet_name, result in zip(sheet_specs, results):
+        if result is None:
+            continue
+        df, hashes, unchanged = result
+        if delta is not None:
+            delta.record(hashes, unchanged)
+        frames[sheet_name] = df
+    return frames
+
+
+STREAMING_THRESHOLD_BYTES = 100 * 1024 * 1024  # 超过该大小的工作簿使用流式读取
+STREAMING_CHUNK_SIZE = 50000  # 流式读取时每块的行数
+
+
+def read_sheet_streaming(file_path, spec, sheet_name=0, delta=None):
+    """流式读取单个工作表
+
+    只读取spec中的列，每块读取后立即按spec标准化（块内去重）；跨块只保留
+    64位记录键，峰值内存与块大小及去重键集合成正比，而不是与原始
+    工作表大小成正比。跨块保留首次出现的记录，不按优先级比较。
+    传入delta（RowDelta）时跳过其中已合并过的行，并记录本次读取的行哈希。
+    """
+    known_rows = delta.known_rows if delta is not None else None
+    seen_keys = set()
+    chunks = []
+    raw_count = 0
+
+    # 逐行迭代依赖openpyxl只读模式
+    with WorkbookReader(file_path, engine="openpyxl") as workbook:
+        for chunk in workbook.iter_chunks(sheet_name, column_dtypes=spec.columns):
+            raw_count += len(chunk)
+            chunk, hashes, unchanged = split_known_rows(chunk, spec.name, known_rows)
+            if delta is not None:
+                delta.record(hashes, unchanged)
+            if chunk.empty:
+                continue
+            chunk = normalize_source(chunk, spec, verbose=False)
+
+            if not chunk.empty:
+                hashes = chunk[RECORD_KEY].to_numpy()
+                is_new = np.fromiter(
+                    (key not in seen_keys for key in hashes.tolist()),
+                    dtype=bool,
+                    count=len(hashes),
+                )
+                chunk = chunk[is_new]
+                seen_keys.update(hashes[is_new].tolist())
+
+            if not chunk.empty:
+                chunks.append(chunk)
+    workbook.report()
+
+    if not chunks:
+        return pd.DataFrame()
+
+    df = concat_frames(chunks)
+    print(f"流式读取完成：原始 {raw_count} 条 -> 保留 {len(df)} 条")
+    return df
+
+
+def read_ticket_workbook(file_path, delta=None):
+    """读取票务全库工作簿（单工作表）"""
+    try:
+        if os.path.getsize(file_path) >= STREAMING_THRESHOLD_BYTES:
+            # 大文件按块读取，每块走相同的标准化流程并在读取过程中去重
+            print("票务全库文件较大，使用流式读取模式")
+            return read_sheet_streaming(
+                file_path, SOURCE_SPECS["票务全库"], delta=delta
+            )
+
+        return load_sheets_parallel(file_path, {0: "票务全库"}, delta)[0]
+    except Exception as e:
+        raise Exception(f"读取票务全库数据失败：{str(e)}")
+
+
+def read_group_workbook(file_path, delta=None):
+    """读取群体票务工作簿（铁路+航班两个工作表）"""
+    try:
+        # 铁路和航班两个工作表分别在子进程中解析、标准化，最后再合并
+        sheets = load_sheets_parallel(
+            file_path, {"铁路": "铁路票务", "航班": "航班更新"}, delta
+        )
+        print(f"读取到工作表: {list(sheets)}")
+        all_transport_data = [
+            sheets[name] for name in ["铁路", "航班"] if name in sheets
+        ]
+        if not all_transport_data:
             return pd.DataFrame()
 
+        combined_df = concat_frames(all_transport_data)
+
+        # 最终统计
+        print(f"\n=== 混合交通数据处理完成 ===")
+        print(f"总记录数: {len(combined_df)}")
+        for col in ["交通方式", "状态类型"]:
+            if col in combined_df.columns:
+                print(f"{col}分布：")
+                for value, count in count_values(combined_df[col]).items():
+                    print(f"  {value}: {count} 条")
+
+        return combined_df
+    except Exception as e:
+        raise Exception(f"读取混合交通数据失败：{str(e)}")
+
+
+class WorkbookReader:
+    """Excel工作簿读取器
+
+    只打开一次工作簿（压缩包和共享字符串表只解析一次），
+    所需的各个工作表都从同一个句柄中解析，并记录每个工作表的解析耗时。
+    未指定引擎时使用select_excel_engine选出的最快引擎。
+    """
+
+    def __init__(self, file_path, engine=None):
+        self.file_path = file_path
+        self.engine = engine or select_excel_engine()
+        self.timings = {}  # 工作表名 -> 解析耗时（秒）
+        self._excel_file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        if self._excel_file is None:
+            start = time.perf_counter()
+            try:
+                self._excel_file = pd.ExcelFile(self.file_path, engine=self.engine)
+            except Exception as e:
+                if self.engine is None:
+                    raise
+                # 指定引擎无法打开时（如openpyxl不支持xls），交给pandas自动选择
+                print(f"引擎 {self.engine} 无法打开文件，改用pandas默认引擎：{str(e)}")
+                self.engine = None
+                self._excel_file = pd.ExcelFile(self.file_path)
+            self.timings["打开工作簿"] = time.perf_counter() - start
+        return self._excel_file
+
+    def close(self):
+        if self._excel_file is not None:
+            self._excel_file.close()
+            self._excel_file = None
+
+    @property
+    def sheet_names(self):
+        return self.open().sheet_names
+
+    def read_sheet(self, sheet_name=0, **kwargs):
+        """从已打开的句柄解析单个工作表"""
+        start = time.perf_counter()
+        df = self.open().parse(sheet_name, **kwargs)
+        name = sheet_name if isinstance(sheet_name, str) else self.sheet_names[0]
+        self.timings[name] = time.perf_counter() - start
+        return df
+
+    def read_projected(self, sheet_name=0, column_dtypes=None):
+        """只保留column_dtypes中的列，并按指定类型读取
+
+        列名匹配时忽略表头两侧空格，工作表中没有的列跳过。不需要的列在
+        转换为DataFrame之前就被丢弃，不做类型推断，也不占用内存。
+        """
+        if not column_dtypes:
+            return self.read_sheet(sheet_name)
+
+        dtype = {name: kind for name, kind in column_dtypes.items() if kind is not None}
+        return self.read_sheet(
+            sheet_name,
+            usecols=lambda col: str(col).strip() in column_dtypes,
+            dtype=dtype,
+        )
+
+    def read_sheets(self, sheet_names, **kwargs):
+        """解析多个工作表，返回 {工作表名: DataFrame}，不存在的工作表跳过"""
+        sheets = {}
+        for sheet_name in sheet_names:
+            if sheet_name in self.sheet_names:
+                sheets[sheet_name] = self.read_sheet(sheet_name, **kwargs)
+        return sheets
+
+    def iter_chunks(self, sheet_name=0, chunk_size=None, column_dtypes=None):
+        """按块逐行读取工作表，每次只在内存中保留一个块
+
+        xlsx文件通过openpyxl只读模式逐行迭代；其他格式无法流式读取，
+        退化为整表解析后分块返回。指定column_dtypes时只保留其中的列，
+        并把字符串类型的列转换为字符串。
+        """
+        chunk_size = chunk_size or STREAMING_CHUNK_SIZE
+        excel_file = self.open()
+        start = time.perf_counter()
+
+        if excel_file.engine != "openpyxl":
+            df = self.read_projected(sheet_name, column_dtypes)
+            for begin in range(0, len(df), chunk_size):
+                yield df.iloc[begin : begin + chunk_size]
+            return
+
+        if isinstance(sheet_name, str):
+            worksheet = excel_file.book[sheet_name]
+        else:
+            worksheet = excel_file.book.worksheets[sheet_name]
+
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        columns = [
+            str(col) if col is not None else f"Unnamed: {i}"
+            for i, col in enumerate(header)
+        ]
+        column_count = len(columns)
+
+        # 列投影：只保留所需列的单元格
+        keep = list(range(column_count))
+        if column_dtypes:
+            wanted = [
+                i for i, col in enumerate(columns) if col.strip() in column_dtypes
+            ]
+            if wanted:
+                keep = wanted
+        columns = [columns[i] for i in keep]
+        str_columns = [
+            col for col in columns if (column_dtypes or {}).get(col.strip()) is str
+        ]
+
+        def to_frame(buffer):
+            df = pd.DataFrame(buffer, columns=columns)
+            for col in str_columns:
+                values = df[col]
+                df[col] = values.map(str).where(values.notna())
+            return df
+
+        buffer = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue  # 跳过空行
+            if len(row) != column_count:
+                row = (tuple(row) + (None,) * column_count)[:column_count]
+            buffer.append([row[i] for i in keep])
+            if len(buffer) >= chunk_size:
+                yield to_frame(buffer)
+                buffer = []
+
+        if buffer:
+            yield to_frame(buffer)
+
+        self.timings[f"{worksheet.title}（流式）"] = time.perf_counter() - start
+
+    def report(self):
+        """打印各工作表的解析耗时"""
+        file_name = os.path.basename(self.file_path)
+        for name, seconds in self.timings.items():
+            print(f"[{file_name}] {name}：{seconds:.2f} 秒")
+
+
+TICKET_HEADER_COLUMNS = {"姓名", "证件号", "航班车次", "出发日期"}  # 票务全库表头特征
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+
+
+def detect_workbook_type(file_path):
+    """根据工作表名和表头识别工作簿类型
+
+    含"铁路"或"航班"工作表的为"群体票务"，首个工作表表头含票务全库
+    关键字段的为"票务全库"，都不符合时返回None。
+    """
+    with WorkbookReader(file_path) as workbook:
+        if {"铁路", "航班"} & set(workbook.sheet_names):
+            return "群体票务"
+        header = workbook.read_sheet(0, nrows=0)
+
+    columns = set(header.columns.astype(str).str.strip())
+    if TICKET_HEADER_COLUMNS <= columns:
+        return "票务全库"
+    return None
+
+
+def list_excel_files(folder):
+    """列出文件夹中的Excel文件（跳过Office临时文件），按文件名排序"""
+    return [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.lower().endswith(EXCEL_EXTENSIONS) and not name.startswith("~$")
+    ]
+
+
+class ColumnarCache:
+    """标准化数据的本地列式缓存
+
+    以源文件内容指纹为键，把各读取器标准化、去重后的结果保存为Parquet文件
+    （未安装pyarrow时退化为pickle），重启程序后再次打开同一文件可直接加载。
+    源文件修改后内容指纹随之改变，旧条目不会再被命中，无需单独失效；
+    缓存总大小超过上限时按最近访问时间淘汰旧条目。
+    """
+
+    CACHE_VERSION = 9  # 标准化逻辑变化时递增，使旧缓存失效
+
+    def __init__(self, cache_dir=None, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir or os.path.join(
+            os.path.expanduser("~"), ".group_travel_checker", "cache"
+        )
+        self.max_bytes = max_bytes
+        self.extension = ".parquet" if HAS_PYARROW else ".pkl"
+        self._fingerprints = {}  # (路径, 大小, 修改时间) -> 内容指纹
+
+    def content_fingerprint(self, file_path):
+        """计算文件内容指纹（同一会话内按路径、大小、修改时间复用）"""
+        stat = os.stat(file_path)
+        stat_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if stat_key not in self._fingerprints:
+            digest = hashlib.sha1()
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            self._fingerprints[stat_key] = digest.hexdigest()
+        return self._fingerprints[stat_key]
+
+    def _entry_path(self, fingerprint, tag, extension):
+        return os.path.join(
+            self.cache_dir,
+            f"{fingerprint}_{tag}_v{self.CACHE_VERSION}{extension}",
+        )
+
+    def load(self, file_path, tag):
+        """读取缓存，未命中或缓存损坏时返回None"""
+        try:
+            fingerprint = self.content_fingerprint(file_path)
+            parquet_path = self._entry_path(fingerprint, tag, ".parquet")
+            pickle_path = self._entry_path(fingerprint, tag, ".pkl")
+
+            if HAS_PYARROW and os.path.exists(parquet_path):
+                entry_path = parquet_path
+                df = pd.read_parquet(entry_path)
+            elif os.path.exists(pickle_path):
+                entry_path = pickle_path
+                df = pd.read_pickle(entry_path)
+            else:
+                return None
+
+            os.utime(entry_path)  # 更新访问时间，供淘汰策略使用
+            print(f"命中本地缓存：{os.path.basename(file_path)}（{len(df)} 条）")
+            return df
+        except Exception as e:
+            print(f"读取本地缓存失败，将重新解析：{str(e)}")
+            return None
+
+    def save(self, file_path, tag, df):
+        """写入缓存，失败时仅打印提示不影响正常流程"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fingerprint = self.content_fingerprint(file_path)
+            entry_path = self._entry_path(fingerprint, tag, self.extension)
+            temp_path = entry_path + ".tmp"
+
+            if self.extension == ".parquet":
+                try:
+                    df.to_parquet(temp_path, index=False)
+                except Exception:
+                    # 混合类型的列无法写入Parquet时改用pickle
+                    entry_path = self._entry_path(fingerprint, tag, ".pkl")
+                    df.to_pickle(temp_path)
+            else:
+                df.to_pickle(temp_path)
+
+            os.replace(temp_path, entry_path)
+            self.evict()
+        except Exception as e:
+            print(f"写入本地缓存失败：{str(e)}")
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith((".parquet", ".pkl"))
+        ]
+
+    def clear(self):
+        """清空全部缓存，返回删除的条目数"""
+        entries = self._entries()
+        for entry_path in entries:
+            os.remove(entry_path)
+        self._fingerprints.clear()
+        return len(entries)
+
+    def evict(self):
+        """缓存总大小超过上限时，按最近访问时间从旧到新删除"""
+        entries = [
+            (os.path.getmtime(path), os.path.getsize(path), path)
+            for path in self._entries()
+        ]
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+            print(f"淘汰本地缓存：{os.path.basename(path)}")
+
+
+class DedupIndex:
+    """全量数据的去重索引：记录键 -> (行号, 优先级)
+
+    与全量数据一起保存。追加数据时只对新增的行查索引：记录键不存在的行
+    追加到末尾，已存在且优先级更高（数字更小）的行原位替换旧记录，其余丢弃。
+    规则与把已有数据和新数据合并后整体去重相同（优先级相同时保留已有记录），
+    但开销只与新增数据量有关，不再对全量数据重新排序、去重。
+    """
+
+    def __init__(self, data):
+        self.last_append = {}
+        self.rebuild(data)
+
+    def rebuild(self, data):
+        """以data（整体去重后）替换全量数据并重建索引"""
+        keys = data[RECORD_KEY] if RECORD_KEY in data.columns else None
+        if keys is None or not keys.is_unique:
+            data = dedup_records(data, by_priority=True)
+            keys = data[RECORD_KEY]
+        self._data = data
+        self._pending = []  # 尚未并入_data的新增行，读取data时一次合并
+        self.positions = dict(zip(keys.tolist(), range(len(data))))
+        self.priorities = self._priorities(data)
+
+    @property
+    def data(self):
+        """全量数据（合并尚未并入的新增行）"""
+        if self._pending:
+            self._data = concat_frames([self._data, *self._pending])
+            self._pending = []
+        return self._data
+
+    @staticmethod
+    def _priorities(df):
+        priority = record_priority(df)
+        if priority is None:
+            return default_column("优先级", df.index).to_numpy()
+        return priority.to_numpy(dtype=np.int8, copy=True)
+
+    def append(self, new_data):
+        """把新数据合并到全量数据中，返回合并后的全量数据
+
+        替换行按行号逐列原位写入，新增行先暂存，读取data时再一次合并，
+        不复制、重排已有数据。记录键相同但去重字段不一致（哈希冲突）时，
+        改为合并后整体去重并重建索引。
+        """
+        new = concat_frames([new_data])
+        if new.empty:
+            self.last_append = {"新增": 0, "替换": 0, "重复": 0}
+            return self.data
+
+        new = dedup_records(new, by_priority=True)
+        keys = new[RECORD_KEY].to_numpy()
+        priorities = self._priorities(new)
+        positions = np.fromiter(
+            (self.positions.get(key, -1) for key in keys.tolist()),
+            dtype=np.int64,
+            count=len(keys),
+        )
+        exists = positions >= 0
+
+        if exists.any() and self._has_collision(new[exists], positions[exists]):
+            print("记录键出现哈希冲突，改为整体去重")
+            self.rebuild(concat_frames([self.data, new_data]))
+            self.last_append = {}
+            return self.data
+
+        replace = exists & (priorities < self.priorities[np.maximum(positions, 0)])
+        replace_rows = np.flatnonzero(replace)
+        added_rows = np.flatnonzero(~exists)
+        self.last_append = {
+            "新增": len(added_rows),
+            "替换": len(replace_rows),
+            "重复": len(new) - len(added_rows) - len(replace_rows),
+        }
+
+        if len(replace_rows):
+            self._replace(positions[replace_rows], new.take(replace_rows))
+            self.priorities[positions[replace_rows]] = priorities[replace_rows]
+        if len(added_rows):
+            base = len(self.priorities)
+            self._pending.append(new.take(added_rows))
+            self.positions.update(
+                zip(keys[added_rows].tolist(), range(base, base + len(added_rows)))
+            )
+            self.priorities = np.concatenate([self.priorities, priorities[added_rows]])
+        return self.data
+
+    def _replace(self, positions, rows):
+        """按行号逐列原位写入替换行
+
+        替换行先与全量数据的一行一起合并以统一列和类型（分类列取类别并集），
+        类型变化的列整列转换，其余列只写入取值有变化的位置（字符串列为不可变
+        的Arrow数组，写入时整列重建，取值未变的列跳过）。
+        """
+        # 分类列先按全量数据编码，保证第一行带有全部已有类别
+        self._data = data = encode_categories(self.data)
+        aligned = concat_frames([data.iloc[:1], rows]).iloc[1:]
+        for col in aligned.columns:
+            values = aligned[col]
+            if col not in data.columns:
+                data[col] = values.iloc[:0].reindex(range(len(data)))
+            if data[col].dtype != values.dtype:
+                data[col] = data[col].astype(values.dtype)
+            column = data.columns.get_loc(col)
+            old_values = data.iloc[positions, column].astype(object).to_numpy()
+            new_values = values.astype(object).to_numpy()
+            changed = ~(
+                (old_values == new_values) | (pd.isna(old_values) & pd.isna(new_values))
+            )
+            if changed.any():
+                data.iloc[positions[changed], column] = values.to_numpy()[changed]
+
+    def _has_collision(self, new_rows, positions):
+        """记录键命中的已有记录与新记录的去重字段是否不一致"""
+        columns = [
+            col
+            for col in DEDUP_COLUMNS
+            if col in new_rows.columns and col in self.data.columns
+        ]
+        old_rows = self.data[columns].take(positions).reset_index(drop=True)
+        new_rows = new_rows[columns].reset_index(drop=True)
+        for col in columns:
+            old_values = old_rows[col].astype(object)
+            new_values = new_rows[col].astype(object)
+            same = (old_values == new_values) | (old_values.isna() & new_values.isna())
+            if not same.all():
+                return True
+        return False
+
+
+def date_days(values):
+    """日期列转为int64天数（自1970-01-01起），空值为int64最小值"""
+    days = parse_datetime(values).to_numpy(dtype="datetime64[D]")
+    return days.view(np.int64)
+
+
+def day_number(value):
+    """单个日期转为int64天数"""
+    return np.datetime64(value, "D").astype(np.int64)
+
+
+class DateIndex:
+    """按出发日期（int64天数）排序的行号索引
+
+    建立时对天数做一次稳定排序；查询日期窗口时在排好序的天数上二分查找，
+    得到行号排列中连续的一段，只取窗口内的行，不再对全量数据逐行比较日期。
+    """
+
+    def __init__(self, data):
+        self.data = data
+        days = date_days(data["出发日期"])
+        self.order = np.argsort(days, kind="stable")
+        self.days = days[self.order]
+
+    def window(self, start_date, end_date):
+        """返回出发日期在[start_date, end_date]内的行，保持原有行顺序"""
+        lo = np.searchsorted(self.days, day_number(start_date), side="left")
+        hi = np.searchsorted(self.days, day_number(end_date), side="right")
+        return self.data.take(np.sort(self.order[lo:hi]))
+
+
+class LoadedDataset:
+    """已加载数据集
+
+    按文件路径、大小和修改时间缓存各源文件标准化后的数据，
+    并保存合并去重后的全量数据，供预加载线程和筛查线程共用。
+
+    同时记录全量数据已包含的工作簿内容指纹和原始行哈希：追加导入时内容
+    相同的文件整个跳过，部分重叠的文件只标准化、合并新增或变化的行。
+    """
+
+    def __init__(self, disk_cache=None):
+        self.source_frames = {}  # 文件绝对路径 -> (文件指纹, DataFrame)
+        self.source_rows = {}  # 文件绝对路径 -> 最近一次读取到的原始行哈希
+        self.merged_data = None
+        self.merged_sources = ()  # 生成merged_data时各源文件的指纹
+        self.merged_rows = np.empty(0, dtype=np.uint64)  # merged_data已包含的原始行
+        self.merged_workbooks = {}  # merged_data已包含的工作簿：内容指纹 -> 行数
+        self.last_deltas = {}  # 最近一次增量读取：文件绝对路径 -> RowDelta
+        self.dedup_index = None  # merged_data的去重索引，首次追加时建立
+        self.date_index = None  # merged_data的出发日期索引，首次筛查时建立
+        self.co_travel = None  # merged_data的同行关系图，首次查看关联分析时建立
+        self.disk_cache = disk_cache if disk_cache is not None else ColumnarCache()
+
+    @staticmethod
+    def fingerprint(file_path):
+        """文件指纹：绝对路径 + 文件大小 + 修改时间"""
+        stat = os.stat(file_path)
+        return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+    def get_source(self, file_path):
+        """获取已缓存的源文件数据，文件变化后返回None"""
+        entry = self.source_frames.get(os.path.abspath(file_path))
+        if entry is None:
+            return None
+
+        cached_fingerprint, df = entry
+        try:
+            if cached_fingerprint != self.fingerprint(file_path):
+                return None
+        except OSError:
+            return None
+        return df
+
+    def put_source(self, file_path, df):
+        """缓存源文件标准化后的数据"""
+        self.source_frames[os.path.abspath(file_path)] = (
+            self.fingerprint(file_path),
+            df,
+        )
+
+    def load_source(self, file_path, reader, known_rows=None):
+        """读取源文件：依次尝试内存缓存、本地列式缓存，都未命中时调用reader解析
+
+        known_rows不为None时为增量读取（见load_delta）。
+        """
+        if known_rows is not None:
+            return self.load_delta(file_path, reader, known_rows)
+
+        df = self.get_source(file_path)
+        if df is not None:
+            print(f"复用已加载数据：{os.path.basename(file_path)}（{len(df)} 条）")
+            return df
+
+        # 本地缓存按读取器和城市对照表区分，不同读取器的标准化结果互不混用，
+        # 修改城市配置后重新计算城市编码
+        tag = getattr(reader, "__qualname__", "source")
+        tag = f"{tag}_{STATION_DIRECTORY.digest}"
+        path = os.path.abspath(file_path)
+        df = self.disk_cache.load(file_path, tag)
+        rows = (
+            self.disk_cache.load(file_path, f"{tag}_rows") if df is not None else None
+        )
+        if df is None or rows is None:
+            delta = RowDelta()
+            df = reader(file_path, delta)
+            self.disk_cache.save(file_path, tag, df)
+            self.disk_cache.save(
+                file_path, f"{tag}_rows", pd.DataFrame({"行哈希": delta.row_hashes})
+            )
+            self.source_rows[path] = delta.row_hashes
+        else:
+            self.source_rows[path] = rows["行哈希"].to_numpy(dtype=np.uint64)
+
+        self.put_source(file_path, df)
+        return df
+
+    def load_delta(self, file_path, reader, known_rows):
+        """增量读取源文件
+
+        内容与全量数据中已有工作簿相同的文件直接跳过（返回None）；其余文件跳过
+        known_rows中已合并过的原始行，只返回新增或变化的行。结果只是文件的一部分，
+        因此不写入缓存。
+        """
+        path = os.path.abspath(file_path)
+        delta = RowDelta(known_rows)
+        self.last_deltas[path] = delta
+        self.source_rows.pop(path, None)
+
+        digest = self.disk_cache.content_fingerprint(file_path)
+        if digest in self.merged_workbooks:
+            delta.skipped = True
+            delta.unchanged = self.merged_workbooks[digest]
+            print(f"文件内容与已导入的文件相同，跳过：{os.path.basename(file_path)}")
+            return None
+
+        df = reader(file_path, delta)
+        self.source_rows[path] = delta.row_hashes
+        print(
+            f"增量读取：{os.path.basename(file_path)} 跳过未变化的 {delta.unchanged} 行，"
+            f"处理 {len(delta.row_hashes) - delta.unchanged} 行"
+        )
+        return df
+
+    def load_sources(self, sources, on_loaded=None, known_rows=None):
+        """同时读取多个源文件
+
+        sources为 [(文件路径, reader)]，返回与之顺序一致的DataFrame列表，
+        路径为空的位置返回None。各文件的工作表任务共用同一个进程池。
+        每读完一个文件调用一次on_loaded(已完成数, 总数)。
+        known_rows不为None时增量读取（见load_delta）。
+        """
+        pending = [
+            (i, path, reader) for i, (path, reader) in enumerate(sources) if path
+        ]
+        self.last_deltas = {}
+        frames = [None] * len(sources)
+        if len(pending) > 1:
+            max_workers = min(len(pending), max(2, PARALLEL_WORKERS))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(self.load_source, path, reader, known_rows): i
+                    for i, path, reader in pending
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    frames[futures[future]] = future.result()
+                    if on_loaded is not None:
+                        on_loaded(done, len(pending))
+        else:
+            for done, (i, path, reader) in enumerate(pending, 1):
+                frames[i] = self.load_source(path, reader, known_rows)
+                if on_loaded is not None:
+                    on_loaded(done, len(pending))
+
+        return frames
+
+    def date_window(self, data, start_date, end_date):
+        """取出发日期在[start_date, end_date]内的行
+
+        data为当前全量数据时复用（或建立并保存）其出发日期索引。
+        """
+        index = self.date_index
+        if index is None or index.data is not data:
+            index = DateIndex(data)
+            if data is self.merged_data:
+                self.date_index = index
+        return index.window(start_date, end_date)
+
+    def co_travel_graph(self, data):
+        """data的同行关系图，data为当前全量数据时复用（或建立并保存）"""
+        graph = self.co_travel
+        if graph is None or graph.data is not data:
+            graph = CoTravelGraph(data)
+            if data is self.merged_data:
+                self.co_travel = graph
+        return graph
+
+    def incremental_rows(self, existing_data):
+        """existing_data为当前全量数据且已记录其原始行哈希时返回这些哈希，否则None"""
+        if (
+            existing_data is not None
+            and existing_data is self.merged_data
+            and (len(self.merged_rows) or self.merged_workbooks)
+        ):
+            return self.merged_rows
+        return None
+
+    def set_merged(self, merged_data, file_paths, appended=False):
+        """保存合并去重后的全量数据及其对应的源文件指纹
+
+        同时记录全量数据包含的工作簿和原始行；appended为True表示这些文件是追加到
+        原有全量数据中的，记录在原有基础上累加。
+        """
+        self.merged_data = merged_data
+        if self.dedup_index is not None and self.dedup_index.data is not merged_data:
+            self.dedup_index = None
+        if self.date_index is not None and self.date_index.data is not merged_data:
+            self.date_index = None
+        if self.co_travel is not None and self.co_travel.data is not merged_data:
+            self.co_travel = None
+        self.merged_sources = tuple(
+            self.fingerprint(path) for path in file_paths if path
+        )
+
+        rows = [self.merged_rows] if appended else []
+        workbooks = dict(self.merged_workbooks) if appended else {}
+        for path in file_paths:
+            hashes = self.source_rows.get(os.path.abspath(path)) if path else None
+            if hashes is None:
+                continue
+            rows.append(hashes)
+            workbooks[self.disk_cache.content_fingerprint(path)] = len(hashes)
+        self.merged_rows = (
+            np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype=np.uint64)
+        )
+        self.merged_workbooks = workbooks
+
+    def delta_report(self):
+        """最近一次增量导入的统计：新增、变化、未变化的行数和内容相同而跳过的文件
+
+        变化指与已有记录去重字段相同、内容不同的行（其中优先级更高的替换了旧记录）。
+        """
+        stats = self.dedup_index.last_append if self.dedup_index is not None else {}
+        return {
+            "新增": stats.get("新增", 0),
+            "变化": stats.get("替换", 0) + stats.get("重复", 0),
+            "未变化": sum(delta.unchanged for delta in self.last_deltas.values()),
+            "跳过文件": [
+                path for path, delta in self.last_deltas.items() if delta.skipped
+            ],
+        }
+
+    def append_records(self, existing_data, new_data):
+        """把新数据去重后追加到已有数据中，返回合并后的全量数据
+
+        existing_data为当前全量数据时复用已有的去重索引，否则先为其建立索引。
+        """
+        index = self.dedup_index
+        if index is None or index.data is not existing_data:
+            index = DedupIndex(existing_data)
+        merged = index.append(new_data)
+        self.dedup_index = index
+        if index.last_append.get("替换"):
+            # 替换行是原位写入的，之前为这份数据建立的日期索引、同行关系图不再可用
+            self.date_index = None
+            self.co_travel = None
+
+        stats = index.last_append
+        if stats:
+            print(
+                f"追加数据：新增 {stats['新增']} 条，替换 {stats['替换']} 条，"
+                f"重复 {stats['重复']} 条"
+            )
+        return merged
+
+    def is_current(self, file_paths):
+        """全量数据是否由当前这些文件生成且文件均未变化"""
+        if self.merged_data is None or self.merged_data.empty:
+            return False
         try:
-            df = pd.read_excel(file_path)
-            # 标准化列名
-            df.columns = df.columns.str.strip()
-
-            # 添加数据源标记
-            df["数据源"] = "票务全库"
-
-            # 确保必要的列存在
-            required_cols = [
-                "姓名",
-                "证件号",
-                "航班车次",
-                "发站",
-                "到站",
-                "出发日期",
-                "出发时间",
+            current = tuple(self.fingerprint(path) for path in file_paths if path)
+        except OSError:
+            return False
+        return current == self.merged_sources
+
+    def clear(self):
+        """清空所有缓存"""
+        self.source_frames.clear()
+        self.source_rows.clear()
+        self.merged_data = None
+        self.merged_sources = ()
+        self.merged_rows = np.empty(0, dtype=np.uint64)
+        self.merged_workbooks = {}
+        self.last_deltas = {}
+        self.dedup_index = None
+        self.date_index = None
+        self.co_travel = None
+
+
+def print_delta_report(report):
+    """打印增量导入统计"""
+    print(
+        f"增量导入：新增 {report['新增']} 条，变化 {report['变化']} 条，"
+        f"未变化 {report['未变化']} 条"
+    )
+    for path in report["跳过文件"]:
+        print(f"  内容未变化的文件：{os.path.basename(path)}")
+
+
+GROUP_ID = "分组编号"
+GROUP_SIZE = "群体人数"
+TRIP_COLUMNS = ["出发日期", "航班车次", "目标城市"]  # 判定同一趟行程的字段
+
+
+def count_distinct(group_codes, values, n_groups):
+    """每组中values的不同取值个数
+
+    group_codes为0..n_groups-1的组编码，-1表示不属于任何组；values为空的行不计数。
+    """
+    value_codes, uniques = pd.factorize(values)
+    valid = (group_codes >= 0) & (value_codes >= 0)
+    width = max(len(uniques), 1)
+    pairs = pd.unique(group_codes[valid].astype(np.int64) * width + value_codes[valid])
+    return np.bincount(pairs // width, minlength=n_groups)
+
+
+def trip_groups(df, min_people, by_departure=False):
+    """按同一趟行程识别群体
+
+    行程由出发日期、航班车次、目标城市确定（by_departure时再区分发站），一次
+    groupby得到各行所属行程，统计每趟行程的不同证件号个数，只保留人数达到
+    min_people的行程。返回 (分组编号, 群体人数)，均为与df各行对齐的int32数组；
+    分组编号按出发日期、航班车次顺序从1编号，0表示不属于任何群体。
+    """
+    group_ids = np.zeros(len(df), dtype=np.int32)
+    group_sizes = np.zeros(len(df), dtype=np.int32)
+    columns = TRIP_COLUMNS + (["发站"] if by_departure else [])
+    columns = [col for col in columns if col in df.columns]
+    if df.empty or not columns:
+        return group_ids, group_sizes
+
+    trips = (
+        df.groupby(columns, sort=True, observed=True, dropna=True)
+        .ngroup()
+        .fillna(-1)
+        .to_numpy(dtype=np.int64)
+    )
+    n_trips = int(trips.max()) + 1
+    sizes = count_distinct(trips, df["证件号"], n_trips)
+
+    # 达到人数阈值的行程按原顺序重新编号为1..n，其余为0
+    kept = sizes >= min_people
+    trip_ids = np.where(kept, np.cumsum(kept), 0)
+    rows = np.flatnonzero(trips >= 0)
+    group_ids[rows] = trip_ids[trips[rows]]
+    group_sizes[rows] = np.where(kept[trips[rows]], sizes[trips[rows]], 0)
+    return group_ids, group_sizes
+
+
+CLUSTER_ID = "聚集编号"
+CLUSTER_SIZE = "聚集人数"
+COMMUNITY_ID = "群体编号"  # 同行关系图上的社区编号
+
+
+def arrival_clusters(df, window_minutes, min_people, city_column="到站城市码"):
+    """跨航班车次的到达聚集识别
+
+    每条记录视为一次到达事件，时间为出发日期+出发时间（日期或时间未知的记录
+    不参与）。同一城市的事件按时间排序后，以每个事件为起点取window_minutes
+    分钟的窗口，统计窗口内的不同证件号个数；人数达到min_people的窗口相互重叠
+    时合并为一个聚集。返回 (聚集编号, 聚集人数)，均为与df各行对齐的int32数组，
+    聚集编号按城市、时间顺序从1编号，0表示不属于任何聚集。
+
+    排序之后全部为向量化计算（O(n log n)），可直接用于全量数据：窗口终点由
+    二分查找得到；同一人在窗口内的重复事件按"上一次出现的位置"换算成一段
+    窗口起点区间，用差分数组一次扣除。
+    """
+    n = len(df)
+    cluster_ids = np.zeros(n, dtype=np.int32)
+    cluster_sizes = np.zeros(n, dtype=np.int32)
+    if n == 0:
+        return cluster_ids, cluster_sizes
+
+    days = date_days(df["出发日期"])
+    minutes = (
+        df["出发分钟"].to_numpy(dtype=np.int64)
+        if "出发分钟" in df.columns
+        else parse_minutes(df["出发时间"]).to_numpy(dtype=np.int64)
+    )
+    persons, _ = pd.factorize(df["证件号"])
+    rows = np.flatnonzero(
+        (days != np.iinfo(np.int64).min) & (minutes >= 0) & (persons >= 0)
+    )
+    if not len(rows):
+        return cluster_ids, cluster_sizes
+
+    if city_column in df.columns:
+        cities = df[city_column].to_numpy(dtype=np.int64)[rows]
+    else:
+        cities = np.zeros(len(rows), dtype=np.int64)
+    times = days[rows] * 1440 + minutes[rows]
+
+    # 按（城市, 时间）排序，组合为一个有序键：不同城市的键相差远大于窗口长度
+    order = np.lexsort((times, cities))
+    rows, cities, persons = rows[order], cities[order], persons[rows[order]]
+    keys = (cities << 40) + (times[order] - times.min())
+    m = len(rows)
+    positions = np.arange(m)
+
+    # 以每个事件为起点的窗口内最后一个事件
+    ends = np.searchsorted(keys, keys + window_minutes, side="right") - 1
+
+    # 同一人在同一城市的上一个事件位置（-1表示首次出现）
+    by_person = np.lexsort((positions, persons, cities))
+    repeated = (persons[by_person[1:]] == persons[by_person[:-1]]) & (
+        cities[by_person[1:]] == cities[by_person[:-1]]
+    )
+    previous = np.full(m, -1, dtype=np.int64)
+    previous[by_person[1:][repeated]] = by_person[:-1][repeated]
+
+    # 重复事件j（上一次出现在p）对起点落在[first_j, p]的窗口重复计数一次，
+    # first_j为窗口能覆盖到j的最早起点
+    dup = np.flatnonzero(previous >= 0)
+    last_seen = previous[dup]
+    first = np.searchsorted(keys, keys[dup] - window_minutes, side="left")
+    valid = first <= last_seen
+    diff = np.bincount(first[valid], minlength=m + 1) - np.bincount(
+        last_seen[valid] + 1, minlength=m + 1
+    )
+    distinct = ends - positions + 1 - np.cumsum(diff)[:m]
+
+    # 达标窗口按起点顺序合并：与前一个达标窗口不重叠时开始新的聚集
+    # （同一城市内窗口终点随起点单调不减，不同城市的窗口不会重叠）
+    starts = np.flatnonzero(distinct >= min_people)
+    if not len(starts):
+        return cluster_ids, cluster_sizes
+    new_cluster = np.ones(len(starts), dtype=bool)
+    new_cluster[1:] = starts[1:] > ends[starts[:-1]]
+    span_starts = starts[new_cluster]
+    span_ends = ends[starts[np.r_[new_cluster[1:], True]]]
+
+    labels = np.searchsorted(span_starts, positions, side="right") - 1
+    inside = (labels >= 0) & (positions <= span_ends[np.maximum(labels, 0)])
+    labels = np.where(inside, labels, -1)
+    sizes = count_distinct(labels, persons, len(span_starts))
+
+    cluster_ids[rows] = labels + 1
+    cluster_sizes[rows] = np.where(inside, sizes[np.maximum(labels, 0)], 0)
+    return cluster_ids, cluster_sizes
+
+
+def gather_neighbors(offsets, neighbors, nodes):
+    """CSR邻接中nodes各自的全部邻居
+
+    邻接为 (offsets, neighbors)：节点v的邻居为neighbors[offsets[v]:offsets[v + 1]]。
+    返回 (所属位置, 邻居)，所属位置为邻居对应的nodes下标。
+    """
+    counts = offsets[nodes + 1] - offsets[nodes]
+    owners = np.repeat(np.arange(len(nodes)), counts)
+    steps = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, neighbors[offsets[nodes][owners] + steps]
+
+
+def csr_adjacency(sources, targets, n_sources):
+    """由边列表 (sources[i] -> targets[i]) 建立CSR邻接，各节点的邻居按编号升序"""
+    order = np.lexsort((targets, sources))
+    offsets = np.zeros(n_sources + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n_sources), out=offsets[1:])
+    return offsets, targets[order]
+
+
+def label_propagation(persons, trips, n_persons, n_trips, max_iterations=30, seed=0):
+    """同行关系图上的加权标签传播社区发现
+
+    图由"人员×行程"关联给出（persons[i]乘坐trips[i]，每个组合只出现一次），
+    两人之间的边权为共同行程数除以两人行程数的几何平均（余弦相似度）。每个
+    人员初始为独立标签，每轮统计各人员邻居标签的权重和，改用得分最高的标签
+    （得分相同取编号小的），且只有得分严格高于当前标签时才改变；每轮随机只
+    更新一半人员，避免同步更新来回振荡。没有人员可以改进或达到max_iterations
+    时停止。返回各人员的标签。
+
+    人员v的标签l得分为 Σ_{v的行程t} Σ_{t中标签为l的u} 1/√(d_u)（再乘以同一行
+    内不影响比较的1/√(d_v)，d为行程数），即先按行程汇总各标签的权重、再按
+    人员汇总，不需要展开人员对；v自身的贡献为√(d_v)，从当前标签中扣除。
+    关联只建立一次；每轮只重新计算与上一轮改变标签的人员同行过的人员（以及
+    可以改进但未被选中更新的人员），其余人员的得分不变。安装了scipy时得分为
+    稀疏矩阵乘法，否则排序后分段求和。
+    """
+    labels = np.arange(n_persons, dtype=np.int64)
+    if not len(persons):
+        return labels
+
+    degrees = np.bincount(persons, minlength=n_persons).astype(np.float64)
+    weights = 1.0 / np.sqrt(degrees[persons])
+    person_offsets, person_trips = csr_adjacency(persons, trips, n_persons)
+    trip_offsets, trip_persons = csr_adjacency(trips, persons, n_trips)
+    if HAS_SCIPY:
+        incidence = sparse.csr_matrix(
+            (np.ones(len(persons)), (persons, trips)), shape=(n_persons, n_trips)
+        )
+        members = sparse.csr_matrix(
+            (weights, (trips, persons)), shape=(n_trips, n_persons)
+        )
+    rng = np.random.default_rng(seed)
+    active = np.flatnonzero(degrees)
+    for _ in range(max_iterations):
+        # 活跃人员各（人员, 标签）的得分：每个人员一段，段内标签无序
+        if HAS_SCIPY:
+            by_label = sparse.csr_matrix(
+                (members.data.copy(), labels[members.indices], members.indptr.copy()),
+                shape=(n_trips, n_persons),
+            )
+            by_label.sum_duplicates()
+            scores = incidence[active] @ by_label
+            offsets, candidates, values = scores.indptr, scores.indices, scores.data
+        else:
+            # 行程内按标签汇总
+            keys, inverse = np.unique(
+                trips.astype(np.int64) * n_persons + labels[persons],
+                return_inverse=True,
+            )
+            trip_weights = np.bincount(inverse.ravel(), weights=weights)
+            label_offsets = np.r_[
+                0, np.cumsum(np.bincount(keys // n_persons, minlength=n_trips))
             ]
-            # 保留的可选列（如果存在的话）
-            optional_cols = ["人员类型", "方向", "交通工具", "入库时间"]
-
-            for col in required_cols:
-                if col not in df.columns:
-                    if "航班号" in df.columns and col == "航班车次":
-                        df["航班车次"] = df["航班号"]
-                    elif "车次" in df.columns and col == "航班车次":
-                        df["航班车次"] = df["车次"]
-                    else:
-                        df[col] = None
-
-            # 处理可选列：如果存在就保留，不存在就不添加
-            for col in optional_cols:
-                if col in df.columns:
-                    # 清理空值，但保留列
-                    df[col] = df[col].fillna("").astype(str).str.strip()
-                    print(f"保留可选字段：{col}，共有 {df[col].nunique()} 种不同值")
-
-            # 如果存在人员类型字段，打印统计信息
-            if "人员类型" in df.columns:
-                person_type_counts = df["人员类型"].value_counts()
-                print("票务数据中的人员类型分布：")
-                for ptype, count in person_type_counts.items():
-                    if ptype and ptype.strip():  # 只显示非空值
-                        print(f"  {ptype}: {count} 条")
-
-            # 数据验证
-            # 1. 检查必填字段
-            critical_cols = ["姓名", "证件号", "航班车次"]
-            for col in critical_cols:
-                if col in df.columns:
-                    # 删除该列为空的记录
-                    before_count = len(df)
-                    df = df[df[col].notna() & (df[col].astype(str).str.strip() != "")]
-                    after_count = len(df)
-                    if before_count > after_count:
-                        print(f"删除{col}为空的记录：{before_count - after_count}条")
-
-            # 2. 处理姓名和航班车次的空值
-            if "姓名" in df.columns:
-                df["姓名"] = df["姓名"].fillna("").astype(str).str.strip()
-            if "航班车次" in df.columns:
-                df["航班车次"] = df["航班车次"].fillna("").astype(str).str.strip()
-            if "证件号" in df.columns:
-                df["证件号"] = df["证件号"].fillna("").astype(str).str.strip()
-
-            # 处理日期格式 - 统一使用pandas datetime
-            if "出发日期" in df.columns:
-                df["出发日期"] = pd.to_datetime(df["出发日期"], errors="coerce")
+            # 活跃人员的每个行程展开为该行程的各标签，再按（人员, 标签）汇总
+            owner_index, own_trips = gather_neighbors(
+                person_offsets, person_trips, active
+            )
+            link_index, entries = gather_neighbors(
+                label_offsets, np.arange(len(keys)), own_trips
+            )
+            keys = owner_index[link_index] * n_persons + keys[entries] % n_persons
+            order = np.argsort(keys, kind="stable")
+            keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            values = np.add.reduceat(trip_weights[entries[order]], starts)
+            keys = keys[starts]
+            candidates = keys % n_persons
+            offsets = np.r_[
+                0, np.cumsum(np.bincount(keys // n_persons, minlength=len(active)))
+            ]
+        counts = np.diff(offsets)
+        owners = np.repeat(active, counts)
+        own = candidates == labels[owners]
+        values[own] -= np.sqrt(degrees[owners[own]])
+
+        # 每个人员得分最高的标签中编号最小的
+        starts = offsets[:-1]
+        top_scores = np.maximum.reduceat(values, starts)
+        tied = values >= np.repeat(top_scores, counts)
+        best_labels = np.minimum.reduceat(np.where(tied, candidates, n_persons), starts)
+
+        # 当前标签的得分（邻居中没有该标签时为0）
+        current_scores = np.zeros(n_persons)
+        current_scores[owners[own]] = values[own]
+
+        improvable = (best_labels != labels[active]) & (
+            top_scores > current_scores[active]
+        )
+        if not improvable.any():
+            break
+        update = improvable & (rng.random(len(active)) < 0.5)
+        changed = active[update]
+        labels[changed] = best_labels[update]
+
+        # 下一轮的活跃人员：与改变标签的人员同行过的人员，以及本轮未被选中的
+        _, touched = gather_neighbors(person_offsets, person_trips, changed)
+        _, fellows = gather_neighbors(trip_offsets, trip_persons, np.unique(touched))
+        marked = np.zeros(n_persons, dtype=bool)
+        marked[fellows] = True
+        marked[active[improvable & ~update]] = True
+        active = np.flatnonzero(marked)
+    return labels
+
+
+def maximal_cliques(first, second, min_size=3, max_cliques=None, should_stop=None):
+    """无向图（边为first[i]-second[i]）中人数不少于min_size的全部极大团
+
+    使用带枢轴的Bron–Kerbosch算法（非递归），成员按编号升序排列。稠密图上
+    极大团的数量可能呈指数增长：找到max_cliques个团，或should_stop()返回True
+    （每处理256个搜索状态检查一次）时提前停止。返回 (团列表, 是否提前停止)。
+    """
+    adjacency = {}
+    for a, b in zip(first.tolist(), second.tolist()):
+        adjacency.setdefault(a, set()).add(b)
+        adjacency.setdefault(b, set()).add(a)
+
+    cliques = []
+    stack = [(set(), set(adjacency), set())]
+    steps = 0
+    while stack:
+        steps += 1
+        if max_cliques is not None and len(cliques) >= max_cliques:
+            return sorted(cliques), True
+        if should_stop is not None and steps % 256 == 0 and should_stop():
+            return sorted(cliques), True
+        clique, candidates, excluded = stack.pop()
+        if not candidates:
+            if not excluded and len(clique) >= min_size:
+                cliques.append(sorted(clique))
+            continue
+        if len(clique) + len(candidates) < min_size:
+            continue
+        pivot = max(
+            candidates | excluded, key=lambda node: len(adjacency[node] & candidates)
+        )
+        for node in list(candidates - adjacency[pivot]):
+            neighbors = adjacency[node]
+            stack.append(
+                ({*clique, node}, candidates & neighbors, excluded & neighbors)
+            )
+            candidates.remove(node)
+            excluded.add(node)
+    return sorted(cliques), False
+
+
+class CoTravelGraph:
+    """同行关系图
+
+    人员（证件号）为节点，同一行程（航班车次+出发日期）中的两人之间有一条边，
+    边权为两人共同乘坐的行程数。底层为"人员×行程"的关联矩阵B（每个人员、
+    行程组合只记一次），人员×人员的同行次数即B·Bᵀ；连通分量即真实的同行群组。
+
+    安装了scipy时用稀疏矩阵乘法和csgraph计算，否则退化为numpy/pandas实现，
+    结果相同。
+    """
+
+    BLOCK_SIZE = 20000  # 计算同行人员对时每块的人员数
+    COMMUNITY_MAX_TRIP_SIZE = 100  # 发现同行群体时忽略人数超过此值的行程
+    MAX_CLIQUES = 10000  # 识别同行团伙时最多找出的团伙数
+
+    def __init__(self, data):
+        self.data = data
+        persons, self.person_ids = pd.factorize(data["证件号"])
+        flights, _ = pd.factorize(data["航班车次"])
+        days = date_days(data["出发日期"])
+        valid = (persons >= 0) & (flights >= 0) & (days != np.iinfo(np.int64).min)
+
+        # 行程编码：航班车次编码与天数组合后再编码为0..n_trips-1
+        day_offsets = days[valid] - days[valid].min() if valid.any() else days[valid]
+        trip_keys = flights[valid].astype(np.int64) * (
+            int(day_offsets.max(initial=0)) + 1
+        )
+        trips, _ = pd.factorize(trip_keys + day_offsets)
+
+        # 同一人员在同一行程的多条记录只算一次
+        n_trips = int(trips.max(initial=-1)) + 1
+        pairs = pd.unique(persons[valid].astype(np.int64) * max(n_trips, 1) + trips)
+        self.persons = (pairs // max(n_trips, 1)).astype(np.int32)
+        self.trips = (pairs % max(n_trips, 1)).astype(np.int32)
+        self.n_persons = len(self.person_ids)
+        self.n_trips = n_trips
+        # 每个人员、行程首次出现的行位置（编码按首次出现顺序分配）
+        codes, first_rows = np.unique(persons, return_index=True)
+        self._person_rows = first_rows[codes >= 0]
+        _, first_rows = np.unique(trips, return_index=True)
+        self._trip_rows = np.flatnonzero(valid)[first_rows]
+        self.trip_days = days[self._trip_rows]  # 各行程的出发日期（int64天数）
+        self._co_occurrence = {}  # min_shared -> 上三角CSR
+        self._components = None
+        self._communities = None
+        self._person_trips = None
+        self._trip_persons = None
+        self.cliques_truncated = False  # 最近一次repeat_cliques是否提前停止
+
+    @property
+    def incidence(self):
+        """人员×行程关联矩阵（scipy CSR，值为1）"""
+        return sparse.csr_matrix(
+            (np.ones(len(self.persons), dtype=np.int32), (self.persons, self.trips)),
+            shape=(self.n_persons, self.n_trips),
+        )
+
+    def co_occurrence(self, min_shared=1):
+        """人员×人员同行次数的上三角稀疏矩阵（scipy CSR，int32，只含a < b的元素）
+
+        只保留共同行程数不少于min_shared的人员对。按人员分块相乘（每块只与编号
+        不小于块起点的人员相乘），每块先筛选再保留，不同时持有全部人员对；
+        结果按min_shared缓存。需要scipy。
+        """
+        if min_shared not in self._co_occurrence:
+            self._co_occurrence[min_shared] = self._pair_matrix(
+                self.incidence, min_shared
+            )
+        return self._co_occurrence[min_shared]
+
+    def _pair_matrix(self, incidence, min_shared=1):
+        """由人员×行程关联矩阵分块计算同行次数的上三角CSR（见co_occurrence）"""
+        n = incidence.shape[0]
+        indptr = [np.zeros(1, dtype=np.int64)]
+        indices, data = [], []
+        for start in range(0, n, self.BLOCK_SIZE):
+            block = incidence[start : start + self.BLOCK_SIZE] @ incidence[start:].T
+            # 块内第i行对应人员start+i、第j列对应人员start+j，严格上三角即a < b
+            rows = np.repeat(np.arange(block.shape[0]), np.diff(block.indptr))
+            keep = (block.indices > rows) & (block.data >= min_shared)
+            counts = np.bincount(rows[keep], minlength=block.shape[0])
+            indptr.append(np.cumsum(counts) + indptr[-1][-1])
+            indices.append(block.indices[keep].astype(np.int32) + start)
+            data.append(block.data[keep].astype(np.int32))
+        return sparse.csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0, dtype=np.int32),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                np.concatenate(indptr),
+            ),
+            shape=(n, n),
+        )
+
+    def pairs(self, min_shared=1):
+        """共同行程数不少于min_shared的人员对：返回 (人员a, 人员b, 共同行程数)
+        三个int32数组，a < b
+
+        安装了scipy时由co_occurrence的稀疏矩阵取出，否则按人员分块做自连接，
+        每块先筛选再保留。
+        """
+        if HAS_SCIPY:
+            matrix = self.co_occurrence(min_shared)
+            first = np.repeat(
+                np.arange(self.n_persons, dtype=np.int32), np.diff(matrix.indptr)
+            )
+            return first, matrix.indices, matrix.data
+        return self._join_pairs(self.persons, self.trips, min_shared)
+
+    def _join_pairs(self, persons, trips, min_shared=1):
+        """不依赖scipy的同行人员对：按人员分块与"行程-人员"表自连接后计数"""
+        links = pd.DataFrame({"行程": trips, "人员b": persons})
+        parts = []
+        for start in range(0, self.n_persons, self.BLOCK_SIZE):
+            in_block = (persons >= start) & (persons < start + self.BLOCK_SIZE)
+            block = pd.DataFrame({"行程": trips[in_block], "人员a": persons[in_block]})
+            joined = block.merge(links, on="行程")
+            joined = joined[joined["人员a"] < joined["人员b"]]
+            counts = joined.groupby(["人员a", "人员b"]).size()
+            parts.append(counts[counts >= min_shared])
+        counts = pd.concat(parts) if parts else pd.Series(dtype=np.int64)
+        return (
+            counts.index.get_level_values(0).to_numpy(dtype=np.int32),
+            counts.index.get_level_values(1).to_numpy(dtype=np.int32),
+            counts.to_numpy(dtype=np.int32),
+        )
+
+    def edges(self, min_shared=1):
+        """共同行程数不少于min_shared的人员对（按共同行程数降序）"""
+        first, second, shared = self.pairs(min_shared)
+        edges = pd.DataFrame(
+            {
+                "证件号A": self.person_ids.take(first),
+                "证件号B": self.person_ids.take(second),
+                "共同行程数": shared,
+            }
+        )
+        return edges.sort_values("共同行程数", ascending=False, ignore_index=True)
+
+    def components(self):
+        """各人员所属的同行群组编号（int32数组，按person_ids顺序）"""
+        if self._components is None:
+            if HAS_SCIPY:
+                # 人员、行程共同作为节点的二部图，与同行关系图的连通分量相同
+                incidence = self.incidence
+                graph = sparse.bmat([[None, incidence], [incidence.T, None]])
+                _, labels = connected_components(graph, directed=False)
+                labels = labels[: self.n_persons]
+            else:
+                labels = self._propagate_min_labels()
+            _, labels = np.unique(labels, return_inverse=True)
+            self._components = labels.astype(np.int32)
+        return self._components
+
+    def _propagate_min_labels(self):
+        """不依赖scipy的连通分量：人员与行程之间反复传播最小标签直到不变"""
+        labels = np.arange(self.n_persons, dtype=np.int64)
+        while True:
+            trip_labels = np.full(self.n_trips, self.n_persons, dtype=np.int64)
+            np.minimum.at(trip_labels, self.trips, labels[self.persons])
+            updated = labels.copy()
+            np.minimum.at(updated, self.persons, trip_labels[self.trips])
+            # 指针跳跃：标签指向的人员已有更小的标签时直接采用
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                return labels
+            labels = updated
+
+    def person_trips(self):
+        """人员 -> 行程的CSR邻接：人员p的行程为trips[offsets[p]:offsets[p + 1]]
+
+        每个人员的行程按编码升序排列。
+        """
+        if self._person_trips is None:
+            self._person_trips = csr_adjacency(self.persons, self.trips, self.n_persons)
+        return self._person_trips
+
+    def trip_persons(self):
+        """行程 -> 人员的CSR邻接，与person_trips互为反向索引"""
+        if self._trip_persons is None:
+            self._trip_persons = csr_adjacency(self.trips, self.persons, self.n_trips)
+        return self._trip_persons
+
+    def trip_labels(self, codes):
+        """行程编码对应的说明文字（航班车次 出发日期）"""
+        rows = self.data.iloc[self._trip_rows[codes]]
+        dates = parse_datetime(rows["出发日期"]).dt.strftime("%Y-%m-%d")
+        return (rows["航班车次"].astype(str) + " " + dates).to_numpy()
+
+    def person_names(self, codes):
+        """人员编码对应的姓名（取该证件号第一条记录的姓名）"""
+        if "姓名" not in self.data.columns:
+            return np.full(len(codes), "", dtype=object)
+        names = self.data["姓名"].take(self._person_rows[codes])
+        return names.to_numpy(dtype=object)
+
+    def repeat_pairs(self, min_shared=2):
+        """共同乘坐不少于min_shared个不同行程的人员对
+
+        返回DataFrame：证件号A、姓名A、证件号B、姓名B、共同行程数、共同行程
+        （按共同行程数降序）。各对的共同行程由A的行程中B也乘坐过的行程得到，
+        一次展开全部人员对后向量化筛选，排序后按人员对分段拼接说明文字。
+        """
+        first, second, shared = self.pairs(min_shared)
+
+        # 展开每对人员中A的全部行程，保留B也乘坐过的
+        offsets, person_trips = self.person_trips()
+        pair_index, trips = gather_neighbors(offsets, person_trips, first)
+        # 在按（人员, 行程）排好序的组合键上二分查找B是否乘坐过该行程
+        width = max(self.n_trips, 1)
+        owners = np.repeat(np.arange(self.n_persons, dtype=np.int64), np.diff(offsets))
+        memberships = owners * width + person_trips
+        wanted = second[pair_index].astype(np.int64) * width + trips
+        found = np.searchsorted(memberships, wanted)
+        both = memberships[np.minimum(found, len(memberships) - 1)] == wanted
+
+        # 共同行程按（人员对, 说明文字）排序后按人员对分段拼接：只对涉及的行程
+        # 生成一次说明文字，排序在整数编码上完成
+        shared_trips, trip_codes = np.unique(trips[both], return_inverse=True)
+        trip_codes = trip_codes.ravel()
+        trip_texts = self.trip_labels(shared_trips)
+        text_order = np.argsort(trip_texts, kind="stable")
+        text_ranks = np.empty(len(trip_texts), dtype=np.int64)
+        text_ranks[text_order] = np.arange(len(trip_texts))
+        pair_owners = pair_index[both]
+        order = np.lexsort((text_ranks[trip_codes], pair_owners))
+        texts = trip_texts[trip_codes[order]].tolist()
+        bounds = np.searchsorted(pair_owners[order], np.arange(len(first) + 1))
+        labels = [
+            "；".join(texts[lo:hi])
+            for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+        ]
+        pairs = pd.DataFrame(
+            {
+                "证件号A": self.person_ids.take(first),
+                "姓名A": self.person_names(first),
+                "证件号B": self.person_ids.take(second),
+                "姓名B": self.person_names(second),
+                "共同行程数": shared,
+                "共同行程": labels,
+            }
+        )
+        return pairs.sort_values(
+            ["共同行程数", "证件号A"], ascending=[False, True], ignore_index=True
+        )
+
+    def repeat_cliques(self, min_shared=2, min_size=3, should_stop=None):
+        """两两之间都共同乘坐不少于min_shared个行程、人数不少于min_size的团伙
+
+        在共同行程数达到阈值的人员对构成的图上求极大团。返回DataFrame：
+        团伙编号、人数、最少共同行程数、成员证件号、成员姓名（按人数降序）。
+        团伙数达到MAX_CLIQUES或should_stop()返回True时停止搜索，只返回已找到的，
+        并把cliques_truncated置为True。
+        """
+        first, second, shared = self.pairs(min_shared)
+        weights = dict(zip(zip(first.tolist(), second.tolist()), shared.tolist()))
+        cliques, self.cliques_truncated = maximal_cliques(
+            first, second, min_size, self.MAX_CLIQUES, should_stop
+        )
+        members = np.array(
+            [code for clique in cliques for code in clique], dtype=np.int64
+        )
+        ids = self.person_ids.take(members).astype(str).tolist()
+        names = [str(name) for name in self.person_names(members)]
+        rows = []
+        start = 0
+        for clique in cliques:
+            end = start + len(clique)
+            rows.append(
+                {
+                    "人数": len(clique),
+                    "最少共同行程数": min(
+                        weights[(a, b)]
+                        for i, a in enumerate(clique)
+                        for b in clique[i + 1 :]
+                    ),
+                    "成员证件号": "、".join(ids[start:end]),
+                    "成员姓名": "、".join(names[start:end]),
+                }
+            )
+            start = end
+        result = pd.DataFrame(
+            rows, columns=["人数", "最少共同行程数", "成员证件号", "成员姓名"]
+        )
+        result = result.sort_values(
+            ["人数", "最少共同行程数"], ascending=False, ignore_index=True
+        )
+        result.insert(0, "团伙编号", np.arange(1, len(result) + 1))
+        return result
+
+    def expand(self, person_id, hops=2, start_date=None, end_date=None, max_people=500):
+        """从某人出发按同行关系逐层扩展k跳
+
+        每一跳由当前一层人员经"人员→行程"索引取出行程（只取出发日期在
+        [start_date, end_date]内的），再经"行程→人员"索引取出同行人员，去掉已访问
+        的即为下一层；不扫描原始数据。发现的人员（不含起点）达到max_people时停止。
+
+        返回DataFrame：跳数、证件号、姓名、经由行程、上一跳证件号、路径，起点为第0跳；
+        经由行程为与上一跳人员共同乘坐的行程（取最先发现的一条）。
+        """
+        columns = ["跳数", "证件号", "姓名", "经由行程", "上一跳证件号", "路径"]
+        code = self.person_ids.get_indexer([person_id])[0]
+        if code < 0:
+            return pd.DataFrame(columns=columns)
+
+        person_offsets, person_trips = self.person_trips()
+        trip_offsets, trip_persons = self.trip_persons()
+        in_window = np.ones(self.n_trips, dtype=bool)
+        if start_date is not None:
+            in_window &= self.trip_days >= day_number(start_date)
+        if end_date is not None:
+            in_window &= self.trip_days <= day_number(end_date)
+
+        hop = np.full(self.n_persons, -1, dtype=np.int32)
+        parent = np.full(self.n_persons, -1, dtype=np.int64)
+        via = np.full(self.n_persons, -1, dtype=np.int64)
+        hop[code] = 0
+        frontier = np.array([code], dtype=np.int64)
+        found = [frontier]
+        remaining = max_people
+        for step in range(1, hops + 1):
+            if not len(frontier) or remaining <= 0:
+                break
+            owners, trips = gather_neighbors(person_offsets, person_trips, frontier)
+            keep = in_window[trips]
+            owners, trips = owners[keep], trips[keep]
+            trip_index, people = gather_neighbors(trip_offsets, trip_persons, trips)
+
+            # 未访问过的人员按发现顺序取前remaining个
+            new = hop[people] < 0
+            people, trip_index = people[new], trip_index[new]
+            people, first = np.unique(people, return_index=True)
+            order = np.argsort(first, kind="stable")[:remaining]
+            people, first = people[order], first[order]
+
+            hop[people] = step
+            via[people] = trips[trip_index[first]]
+            parent[people] = frontier[owners[trip_index[first]]]
+            found.append(people)
+            frontier = people
+            remaining -= len(people)
+
+        nodes = np.concatenate(found)
+        names = self.person_names(nodes)
+        ids = self.person_ids.take(nodes)
+        name_of = dict(zip(nodes.tolist(), map(str, names)))
+        via_nodes = nodes[via[nodes] >= 0]
+        labels = dict(
+            zip(via_nodes.tolist(), self.trip_labels(via[via_nodes]).tolist())
+        )
+
+        paths = []
+        for node in nodes.tolist():
+            parts = [name_of[node]]
+            while parent[node] >= 0:
+                parts.append(f" →（{labels[node]}）→ ")
+                node = int(parent[node])
+                parts.append(name_of[node])
+            paths.append("".join(reversed(parts)))
+
+        parents = parent[nodes]
+        return pd.DataFrame(
+            {
+                "跳数": hop[nodes],
+                "证件号": ids,
+                "姓名": names,
+                "经由行程": [labels.get(node, "") for node in nodes.tolist()],
+                "上一跳证件号": np.where(
+                    parents >= 0,
+                    self.person_ids.take(np.maximum(parents, 0)).astype(str),
+                    "",
+                ),
+                "路径": paths,
+            },
+            columns=columns,
+        )
+
+    def communities(self):
+        """各人员所属的同行群体编号（int32数组，按person_ids顺序）
+
+        连通分量会被乘坐大量行程的"枢纽"人员串成一个巨大分量，这里改在同行关系图
+        上做标签传播：边权为共同行程数除以两人行程数的几何平均（余弦相似度），
+        枢纽人员与每个人的边权都很小，不会把不同群体连成一片。人数超过
+        COMMUNITY_MAX_TRIP_SIZE的行程不参与计算。群体按人数从多到少从1编号，
+        只有一人的为0。
+        """
+        if self._communities is None:
+            # 大批乘客同乘一个行程不能说明彼此结伴，且计算量随行程人数平方增长
+            trip_sizes = np.bincount(self.trips, minlength=self.n_trips)
+            small = trip_sizes[self.trips] <= self.COMMUNITY_MAX_TRIP_SIZE
+            labels = label_propagation(
+                self.persons[small], self.trips[small], self.n_persons, self.n_trips
+            )
+
+            _, labels, sizes = np.unique(
+                labels, return_inverse=True, return_counts=True
+            )
+            labels = labels.ravel()
+            ranks = np.empty(len(sizes), dtype=np.int32)
+            ranks[np.argsort(-sizes, kind="stable")] = np.arange(1, len(sizes) + 1)
+            ranks[sizes < 2] = 0
+            self._communities = ranks[labels]
+        return self._communities
+
+    def community_of(self, person_ids):
+        """证件号序列对应的同行群体编号，不在图中的为0"""
+        codes = self.person_ids.get_indexer(person_ids)
+        return np.where(codes >= 0, self.communities()[np.maximum(codes, 0)], 0)
+
+    def group_of(self, person_id):
+        """某人所在同行群组的全部证件号，不在图中时返回空Index"""
+        code = self.person_ids.get_indexer([person_id])[0]
+        if code < 0:
+            return self.person_ids[:0]
+        labels = self.components()
+        return self.person_ids[labels == labels[code]]
+
+    def companions(self, person_id):
+        """与某人同行过的人员及共同行程数（按共同行程数降序）
+
+        只取该人员所在的行程计数，不需要计算全部人员对。
+        """
+        code = self.person_ids.get_indexer([person_id])[0]
+        if code < 0:
+            return pd.Series(dtype=np.int64, name="共同行程数")
+        own_trips = self.trips[self.persons == code]
+        fellow = self.persons[np.isin(self.trips, own_trips)]
+        counts = np.bincount(fellow, minlength=self.n_persons)
+        counts[code] = 0
+        found = np.flatnonzero(counts)
+        companions = pd.Series(
+            counts[found], index=self.person_ids.take(found), name="共同行程数"
+        )
+        return companions.sort_values(ascending=False, kind="stable")
+
+
+class DataPreviewLoader(QThread):
+    progress = Signal(int)
+    message = Signal(str)
+    finished = Signal(pd.DataFrame)
+    error = Signal(str)
+
+    def __init__(self, dataset=None):
+        super().__init__()
+        self.file1_path = ""
+        self.file2_path = ""
+        self.existing_data = None
+        self.dataset = dataset if dataset is not None else LoadedDataset()
+
+    def set_params(self, file1, file2, existing_data=None):
+        """设置参数"""
+        self.file1_path = file1
+        self.file2_path = file2
+        self.existing_data = existing_data
+
+    def run(self):
+        try:
+            self.progress.emit(10)
+            self.message.emit("正在预加载数据...")
+
+            all_data = pd.DataFrame()
+
+            # 票务全库与群体票务的各个工作表并行解析；追加到已有数据时只处理
+            # 新增或变化的行
+            self.message.emit("正在预加载票务全库和群体票务数据...")
+            known_rows = self.dataset.incremental_rows(self.existing_data)
+            df1, df2 = self.dataset.load_sources(
+                [
+                    (self.file1_path, read_ticket_workbook),
+                    (self.file2_path, read_group_workbook),
+                ],
+                known_rows=known_rows,
+            )
+
+            if df1 is not None and not df1.empty:
+                all_data = concat_frames([all_data, df1])
+            self.progress.emit(40)
+
+            if df2 is not None and not df2.empty:
+                all_data = concat_frames([all_data, df2])
+            self.progress.emit(60)
+
+            if all_data.empty and known_rows is None:
+                self.error.emit("没有读取到有效数据")
+                return
+
+            self.progress.emit(80)
+            self.message.emit("正在整理数据...")
 
             # 去重处理
-            original_count = len(df)
-            # 基于关键字段去重：姓名、证件号、航班车次、出发日期
-            dedup_columns = ["姓名", "证件号", "航班车次", "出发日期"]
-            # 确保去重列都存在
-            dedup_cols_exist = [col for col in dedup_columns if col in df.columns]
-
-            if dedup_cols_exist:
-                df = df.drop_duplicates(subset=dedup_cols_exist, keep="first")
-                after_count = len(df)
-                if original_count > after_count:
-                    print(
-                        f"票务全库数据去重：{original_count} 条 -> {after_count} 条（删除 {original_count - after_count} 条重复）"
-                    )
-                else:
-                    print(f"票务全库数据无重复记录：{original_count} 条")
+            all_data = self.final_dedup(all_data)
+
+            # 如果有现有数据，按去重索引只处理新增部分
+            appended = self.existing_data is not None and not self.existing_data.empty
+            if appended:
+                self.message.emit("正在合并历史数据...")
+                all_data = self.dataset.append_records(self.existing_data, all_data)
+            if known_rows is not None:
+                print_delta_report(self.dataset.delta_report())
+
+            # 保存到共享数据集，筛查时直接复用
+            self.dataset.set_merged(
+                all_data,
+                [self.file1_path, self.file2_path],
+                appended=appended and self.existing_data is self.dataset.merged_data,
+            )
+
+            self.progress.emit(100)
+            self.message.emit("数据预加载完成！")
+
+            self.finished.emit(all_data)
 
-            return df
         except Exception as e:
-            raise Exception(f"读取票务全库数据失败：{str(e)}")
+            self.error.emit(f"预加载出错：{str(e)}")
 
-    def read_flight_data(self, file_path):
-        """读取航班更新数据"""
-        if not file_path:
-            return pd.DataFrame()
+    def final_dedup(self, df):
+        """最终去重"""
+        return dedup_records(df, by_priority=True)
+
+
+class BulkImportLoader(DataPreviewLoader):
+    """批量导入线程
+
+    一次导入文件夹或多个工作簿：按表头和工作表识别每个文件的类型，
+    各文件并行读取，全部读完后统一去重一次，并统计导入吞吐量。
+    """
+
+    def __init__(self, dataset=None):
+        super().__init__(dataset)
+        self.file_paths = []
+        self.import_stats = {}
+
+    def set_params(self, file_paths, existing_data=None):
+        """设置参数"""
+        self.file_paths = list(file_paths)
+        self.existing_data = existing_data
+
+    def run(self):
+        try:
+            start_time = time.perf_counter()
+            self.import_stats = {}
+            self.progress.emit(5)
+            self.message.emit(f"正在识别 {len(self.file_paths)} 个文件的类型...")
+
+            readers = {
+                "票务全库": read_ticket_workbook,
+                "群体票务": read_group_workbook,
+            }
+            file_types = {}
+            skipped = []
+            with ThreadPoolExecutor(max_workers=max(2, PARALLEL_WORKERS)) as executor:
+                futures = {
+                    executor.submit(detect_workbook_type, path): path
+                    for path in self.file_paths
+                }
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        file_type = future.result()
+                    except Exception as e:
+                        print(f"无法打开文件 {os.path.basename(path)}：{str(e)}")
+                        file_type = None
+                    if file_type is None:
+                        skipped.append(path)
+                    else:
+                        file_types[path] = file_type
+
+            sources = [
+                (path, readers[file_types[path]])
+                for path in self.file_paths
+                if path in file_types
+            ]
+            if not sources:
+                self.error.emit("所选文件中没有可识别的票务数据")
+                return
+
+            for path in skipped:
+                print(f"跳过无法识别的文件：{os.path.basename(path)}")
+
+            self.progress.emit(10)
+            self.message.emit(f"正在并行读取 {len(sources)} 个文件...")
+
+            def on_loaded(done, total):
+                self.progress.emit(10 + int(70 * done / total))
+                self.message.emit(f"已读取 {done}/{total} 个文件...")
+
+            # 追加到已有数据时，内容相同的文件整个跳过，其余文件只处理新增或变化的行
+            known_rows = self.dataset.incremental_rows(self.existing_data)
+            frames = self.dataset.load_sources(sources, on_loaded, known_rows)
+            frames = [df for df in frames if df is not None and not df.empty]
+            read_count = sum(len(df) for df in frames)
+
+            if not frames and known_rows is None:
+                self.error.emit("没有读取到有效数据")
+                return
+
+            # 所有文件读完后统一去重一次；已有数据按去重索引只处理新增部分
+            self.progress.emit(85)
+            self.message.emit("正在合并去重...")
+            appended = self.existing_data is not None and not self.existing_data.empty
+            if appended:
+                all_data = self.dataset.append_records(
+                    self.existing_data, concat_frames(frames)
+                )
+            else:
+                all_data = self.final_dedup(concat_frames(frames))
+            if known_rows is not None:
+                self.import_stats["增量"] = self.dataset.delta_report()
+                print_delta_report(self.import_stats["增量"])
+
+            loaded_paths = [path for path, _ in sources]
+            self.dataset.set_merged(
+                all_data,
+                loaded_paths,
+                appended=appended and self.existing_data is self.dataset.merged_data,
+            )
+
+            elapsed = time.perf_counter() - start_time
+            self.import_stats = {
+                **self.import_stats,
+                "文件类型": {path: file_types[path] for path in loaded_paths},
+                "跳过文件": skipped,
+                "读取记录数": read_count,
+                "去重后记录数": len(all_data),
+                "耗时": elapsed,
+                "每秒记录数": read_count / elapsed if elapsed > 0 else 0,
+            }
+            print(
+                f"批量导入完成：{len(loaded_paths)} 个文件，读取 {read_count} 条，"
+                f"去重后 {len(all_data)} 条，耗时 {elapsed:.2f} 秒，"
+                f"{self.import_stats['每秒记录数']:.0f} 条/秒"
+            )
+
+            self.progress.emit(100)
+            self.message.emit("批量导入完成！")
+            self.finished.emit(all_data)
+
+        except Exception as e:
+            self.error.emit(f"批量导入出错：{str(e)}")
+
+
+class DataProcessor(QThread):
+    progress = Signal(int)
+    message = Signal(str)
+    finished = Signal(pd.DataFrame)
+    error = Signal(str)
+
+    def __init__(self, dataset=None):
+        super().__init__()
+        self.file1_path = ""
+        self.file2_path = ""
+        self.dataset = dataset if dataset is not None else LoadedDataset()
+        self.start_date = None  # 改为开始日期
+        self.end_date = None  # 新增结束日期
+        self.target_city = ""
+        self.min_people_count = 3  # 默认3人及以上
+        self.existing_data = None  # 已存在的数据
+        self.append_mode = False  # 是否为追加模式
+        self.selected_person_types = []  # 新增：选中的人员类型列表
+        self.group_by_departure = False  # 群体识别时是否区分发站
+        self.cluster_window_hours = 0  # 到达聚集的时间窗口（小时），0表示不检测
+        self.cluster_min_people = 5  # 到达聚集的最少人数
+        self.detect_communities = False  # 是否在全量数据上标注同行群体编号
+
+        # 状态表（状态类型、优先级），与各数据源去重规则共用
+        self.status_table = STATUS_TABLE
+
+    def set_params(
+        self,
+        file1,
+        file2,
+        start_date,
+        end_date,
+        target_city,
+        min_people_count,
+        existing_data=None,
+        append_mode=False,
+        selected_person_types=None,
+        group_by_departure=False,
+        cluster_window_hours=0,
+        cluster_min_people=5,
+        detect_communities=False,
+    ):
+        self.file1_path = file1
+        self.file2_path = file2
+        self.start_date = start_date  # 开始日期
+        self.end_date = end_date  # 结束日期
+        self.target_city = target_city
+        self.min_people_count = min_people_count
+        self.existing_data = existing_data
+        self.append_mode = append_mode
+        self.selected_person_types = selected_person_types or []  # 设置人员类型筛选
+        self.group_by_departure = group_by_departure
+        self.cluster_window_hours = cluster_window_hours
+        self.cluster_min_people = cluster_min_people
+        self.detect_communities = detect_communities
 
+    def run(self):
+        """简化的数据处理流程 - 针对两种固定表格格式优化"""
         try:
-            # 尝试读取航班工作表
-            xl_file = pd.ExcelFile(file_path)
-            if "航班" in xl_file.sheet_names:
-                df = pd.read_excel(file_path, sheet_name="航班")
+            self.progress.emit(10)
+            self.message.emit("正在读取数据...")
+
+            source_paths = [self.file1_path, self.file2_path]
+            if any(source_paths):
+                reuse_loaded = self.dataset.is_current(source_paths)
             else:
-                # 如果没有航班工作表，读取第一个工作表
-                df = pd.read_excel(file_path)
-
-            # 标准化列名
-            df.columns = df.columns.str.strip()
-
-            # 保留变更操作信息，不再过滤
-            if "变更操作" in df.columns:
-                # 统计各种变更操作的数量
-                operation_counts = df["变更操作"].value_counts()
-                print("航班数据变更操作统计：")
-                for op, count in operation_counts.items():
-                    print(f"  {op}: {count} 条")
-
-                # 添加状态类型标记
-                confirmed_operations = ["登机", "值机", "进检"]
-                planned_operations = ["出票", "座变", "改期"]
-
-                df["状态类型"] = df["变更操作"].apply(
-                    lambda x: (
-                        "已确认"
-                        if x in confirmed_operations
-                        else "待确认" if x in planned_operations else "其他"
-                    )
+                # 未单独选择文件（如批量导入后），直接使用已导入的全量数据
+                reuse_loaded = (
+                    self.dataset.merged_data is not None
+                    and not self.dataset.merged_data.empty
                 )
 
-                # 统计状态类型
-                status_counts = df["状态类型"].value_counts()
-                print("\n状态类型统计：")
-                for status, count in status_counts.items():
-                    print(f"  {status}: {count} 条")
+            if reuse_loaded:
+                # 源文件未变化，直接使用预加载阶段已标准化、去重的全量数据
+                self.message.emit("正在使用已加载数据...")
+                all_data = self.dataset.merged_data
+                print(f"复用已加载的全量数据：{len(all_data)} 条记录")
+                self.progress.emit(70)
             else:
-                df["变更操作"] = "未知"
-                df["状态类型"] = "其他"
-
-            # 添加数据源标记
-            df["数据源"] = "航班更新"
-
-            # 数据验证（与票务数据处理一致）
-            # 1. 检查必填字段
-            critical_cols = ["姓名", "证件号"]
-            for col in critical_cols:
-                if col in df.columns:
-                    # 删除该列为空的记录
-                    before_count = len(df)
-                    df = df[df[col].notna() & (df[col].astype(str).str.strip() != "")]
-                    after_count = len(df)
-                    if before_count > after_count:
-                        print(
-                            f"航班数据：删除{col}为空的记录：{before_count - after_count}条"
-                        )
+                all_data = pd.DataFrame()
+
+                # 票务全库（file1）与群体票务（file2，铁路+航班）的各个工作表并行处理
+                self.message.emit("正在处理票务全库和群体票务数据（铁路+航班）...")
+                # 追加到已有数据时只处理新增或变化的行
+                known_rows = self.dataset.incremental_rows(self.existing_data)
+                df1, df2 = self.dataset.load_sources(
+                    [
+                        (self.file1_path, read_ticket_workbook),
+                        (self.file2_path, read_group_workbook),
+                    ],
+                    known_rows=known_rows,
+                )
 
-            # 映射列名
-            column_mapping = {
-                "航班号": "航班车次",
-                "出发机场名称": "发站",
-                "到达机场名称": "到站",
-                "起飞时间": "出发时间",
-            }
+                if df1 is not None and not df1.empty:
+                    all_data = concat_frames([all_data, df1])
+                    print(f"票务全库数据：{len(df1)} 条记录")
+                self.progress.emit(30)
 
-            for old_col, new_col in column_mapping.items():
-                if old_col in df.columns and new_col not in df.columns:
-                    df[new_col] = df[old_col]
-
-            # 保留的可选列（如果存在的话）
-            optional_cols = ["人员类型", "方向", "交通工具"]
-            for col in optional_cols:
-                if col in df.columns:
-                    # 清理空值，但保留列
-                    df[col] = df[col].fillna("").astype(str).str.strip()
-                    print(
-                        f"航班数据保留可选字段：{col}，共有 {df[col].nunique()} 种不同值"
-                    )
+                if df2 is not None and not df2.empty:
+                    all_data = concat_frames([all_data, df2])
+                    print(f"群体票务数据：{len(df2)} 条记录")
+                self.progress.emit(60)
+
+                # 验证数据
+                if all_data.empty and known_rows is None:
+                    self.error.emit("没有读取到有效数据")
+                    return
 
-            # 如果存在人员类型字段，打印统计信息
-            if "人员类型" in df.columns:
-                person_type_counts = df["人员类型"].value_counts()
-                print("航班数据中的人员类型分布：")
-                for ptype, count in person_type_counts.items():
-                    if ptype and ptype.strip():  # 只显示非空值
-                        print(f"  {ptype}: {count} 条")
-
-            # 2. 处理姓名、证件号和航班车次的空值
-            if "姓名" in df.columns:
-                df["姓名"] = df["姓名"].fillna("").astype(str).str.strip()
-            if "证件号" in df.columns:
-                df["证件号"] = df["证件号"].fillna("").astype(str).str.strip()
-            if "航班车次" in df.columns:
-                df["航班车次"] = df["航班车次"].fillna("").astype(str).str.strip()
-
-            # 处理日期时间
-            if "起飞时间" in df.columns:
-                # 将起飞时间转换为datetime
-                df["起飞时间_dt"] = pd.to_datetime(df["起飞时间"], errors="coerce")
-                # 提取日期部分 - 保持为datetime类型，不转换为date
-                df["出发日期"] = df["起飞时间_dt"].dt.normalize()
-                # 提取时间部分
-                df["出发时间"] = df["起飞时间_dt"].dt.strftime("%H:%M")
-            elif "出发日期" not in df.columns:
-                # 如果没有出发日期列，尝试从其他列获取
-                df["出发日期"] = pd.NaT
+                self.progress.emit(70)
+                self.message.emit("正在去重和整理数据...")
+
+                # 统一去重处理
+                all_data = self.final_dedup(all_data)
+                print(f"去重后总数据：{len(all_data)} 条记录")
+
+                # 如果有历史数据，按去重索引只处理新增部分
+                appended = (
+                    self.existing_data is not None and not self.existing_data.empty
+                )
+                if appended:
+                    self.message.emit("正在合并历史数据...")
+                    all_data = self.dataset.append_records(self.existing_data, all_data)
+                    print(f"合并历史数据后：{len(all_data)} 条记录")
+                if known_rows is not None:
+                    print_delta_report(self.dataset.delta_report())
+
+            # 检查必要字段
+            required_fields = ["姓名", "证件号", "航班车次", "出发日期", "到站"]
+            missing_fields = [
+                field for field in required_fields if field not in all_data.columns
+            ]
+            if missing_fields:
+                self.error.emit(f"数据缺少必要字段：{', '.join(missing_fields)}")
+                return
+
+            if not reuse_loaded:
+                self.dataset.set_merged(
+                    all_data,
+                    source_paths,
+                    appended=appended
+                    and self.existing_data is self.dataset.merged_data,
+                )
+
+            # 保存合并后的全量数据
+            self.all_data = all_data
+
+            self.progress.emit(80)
+            self.message.emit("正在筛选目标人员...")
+
+            # 筛选数据
+            filtered_data = self.filter_data(
+                all_data, self.start_date, self.end_date, self.target_city
+            )
+
+            self.progress.emit(90)
+            self.message.emit("正在识别群体出行...")
+
+            # 识别群体出行
+            result = self.identify_groups(filtered_data)
+
+            self.progress.emit(100)
+            self.message.emit("筛查完成！")
+            self.finished.emit(result)
 
-            # 添加优先级列
-            if "变更操作" in df.columns:
-                df["优先级"] = (
-                    df["变更操作"].map(self.status_priority).fillna(99)
-                )  # 未知状态设为99
-            else:
-                df["优先级"] = 99
-
-            # 按优先级去重处理
-            original_count = len(df)
-
-            # 基于关键字段去重：姓名、证件号、航班车次、出发日期
-            dedup_columns = ["姓名", "证件号", "航班车次", "出发日期"]
-            # 确保去重列都存在
-            dedup_cols_exist = [col for col in dedup_columns if col in df.columns]
-
-            if dedup_cols_exist and "优先级" in df.columns:
-                # 出发日期已经在前面处理过，这里不需要再次转换
-                # 先按关键字段和优先级排序，确保优先级高的排在前面
-                df = df.sort_values(by=dedup_cols_exist + ["优先级"])
-                # 保留每组中优先级最高（数字最小）的记录
-                df = df.drop_duplicates(subset=dedup_cols_exist, keep="first")
-                # 删除临时的优先级列
-                df = df.drop(columns=["优先级"])
-
-                after_count = len(df)
-                if original_count > after_count:
-                    print(
-                        f"航班数据按优先级去重：{original_count} 条 -> {after_count} 条（删除 {original_count - after_count} 条重复）"
-                    )
-                    # 统计保留的状态分布
-                    if "变更操作" in df.columns:
-                        print("保留记录的状态分布：")
-                        status_counts = df["变更操作"].value_counts()
-                        for status, count in status_counts.items():
-                            print(f"  {status}: {count} 条")
-                else:
-                    print(f"航班数据无重复记录：{original_count} 条")
-            elif dedup_cols_exist:
-                # 如果没有优先级信息，保持原有的去重逻辑
-                df = df.drop_duplicates(subset=dedup_cols_exist, keep="first")
-                after_count = len(df)
-                if original_count > after_count:
-                    print(
-                        f"航班数据去重：{original_count} 条 -> {after_count} 条（删除 {original_count - after_count} 条重复）"
-                    )
-                else:
-                    print(f"航班数据无重复记录：{original_count} 条")
+        except Exception as e:
+            self.error.emit(f"处理出错：{str(e)}")
 
-            print(f"\n航班数据处理完成，共 {len(df)} 条记录（全部保留）")
+    def read_flight_data(self, file_path):
+        """读取单独的航班更新数据文件（"航班"工作表，没有时读取第一个工作表）"""
+        if not file_path:
+            return pd.DataFrame()
 
-            return df
+        try:
+            spec = SOURCE_SPECS["航班更新"]
+            with WorkbookReader(file_path) as workbook:
+                sheet_name = "航班" if "航班" in workbook.sheet_names else 0
+                df = workbook.read_projected(sheet_name, spec.columns)
+            workbook.report()
+            return normalize_source(df, spec)
         except Exception as e:
             raise Exception(f"读取航班更新数据失败：{str(e)}")
 
@@ -1545,9 +4258,9 @@ class DataProcessor(QThread):
         # 以下是两个文件都存在的情况
         # 票务全库添加默认字段
         if "变更操作" not in df1.columns:
-            df1["变更操作"] = "票务记录"
+            df1 = df1.assign(变更操作="票务记录")
         if "状态类型" not in df1.columns:
-            df1["状态类型"] = "待确认"
+            df1 = df1.assign(状态类型="待确认")
 
         # 选择需要的列
         cols = [
@@ -1568,106 +4281,75 @@ class DataProcessor(QThread):
         df1_cols = [col for col in cols if col in df1.columns]
         df2_cols = [col for col in cols if col in df2.columns]
 
-        df1_subset = df1[df1_cols].copy()
-        df2_subset = df2[df2_cols].copy()
-
-        # 安全地转换字符串，处理空值
-        def safe_str(val):
-            """安全地将值转换为字符串，空值转为空字符串"""
-            if pd.isna(val):
-                return ""
-            return str(val).strip()
-
-        # 创建用于识别交集的键（包含日期维度）
-        df1_subset["合并键"] = (
-            df1_subset["姓名"].apply(safe_str)
-            + "_"
-            + df1_subset["证件号"].apply(safe_str)
-            + "_"
-            + df1_subset["航班车次"].apply(safe_str)
-            + "_"
-            + df1_subset["出发日期"].dt.strftime("%Y-%m-%d").fillna("")
-        )
-        df2_subset["合并键"] = (
-            df2_subset["姓名"].apply(safe_str)
-            + "_"
-            + df2_subset["证件号"].apply(safe_str)
-            + "_"
-            + df2_subset["航班车次"].apply(safe_str)
-            + "_"
-            + df2_subset["出发日期"].dt.strftime("%Y-%m-%d").fillna("")
-        )
-
-        # 识别交集
-        intersection_keys = set(df1_subset["合并键"]) & set(df2_subset["合并键"])
+        df1_subset = df1[df1_cols].reset_index(drop=True)
+        df2_subset = df2[df2_cols].reset_index(drop=True)
+
+        # 合并键为按天计算的64位记录键，按整数做哈希连接；出现哈希冲突时
+        # 改为对字段统一编码
+        key1 = record_keys(df1_subset, df1_subset.index, by_day=True)
+        key2 = record_keys(df2_subset, df2_subset.index, by_day=True)
+        if key_collisions(
+            pd.concat([df1_subset, df2_subset], ignore_index=True),
+            pd.concat([key1, key2], ignore_index=True),
+            by_day=True,
+        ):
+            print("合并键出现哈希冲突，改为按字段编码")
+            key1, key2 = merge_key_codes(df1_subset, df2_subset)
+
+        # 每个键在各表中首次出现的行，交集键两侧各取这一行
+        first1 = pd.Series(np.arange(len(key1)), index=key1)
+        first1 = first1[~first1.index.duplicated()]
+        first2 = pd.Series(np.arange(len(key2)), index=key2)
+        first2 = first2[~first2.index.duplicated()]
+        intersection_keys = first1.index.intersection(first2.index)
 
         print(f"票务全库记录数: {len(df1_subset)}")
         print(f"航班更新记录数: {len(df2_subset)}")
         print(f"交集记录数: {len(intersection_keys)}")
 
         # 处理交集：优先使用已确认状态的记录
-        result_list = []
-
-        # 处理交集记录
-        for key in intersection_keys:
-            df1_record = df1_subset[df1_subset["合并键"] == key].iloc[0]
-            df2_record = df2_subset[df2_subset["合并键"] == key].iloc[0]
-
-            # 如果航班表显示"已确认"状态，使用航班表数据
-            if df2_record.get("状态类型") == "已确认":
-                # 使用航班数据，但如果航班数据的人员类型为空，优先使用票务数据的人员类型
-                if (
-                    pd.isna(df2_record.get("人员类型"))
-                    or df2_record.get("人员类型") == ""
-                ):
-                    if (
-                        not pd.isna(df1_record.get("人员类型"))
-                        and df1_record.get("人员类型") != ""
-                    ):
-                        df2_record["人员类型"] = df1_record.get("人员类型")
-                result_list.append(df2_record)
-            else:
-                # 否则保留票务全库的记录，但更新变更操作信息
-                df1_record["变更操作"] = df2_record.get(
-                    "变更操作", df1_record.get("变更操作", "票务记录")
-                )
-                df1_record["状态类型"] = df2_record.get(
-                    "状态类型", df1_record.get("状态类型", "待确认")
-                )
-                # 人员类型优先使用票务数据，如果为空则使用航班数据
-                if (
-                    pd.isna(df1_record.get("人员类型"))
-                    or df1_record.get("人员类型") == ""
-                ):
-                    if (
-                        not pd.isna(df2_record.get("人员类型"))
-                        and df2_record.get("人员类型") != ""
-                    ):
-                        df1_record["人员类型"] = df2_record.get("人员类型")
-                result_list.append(df1_record)
-
-        # 添加两表独有的记录
-        df1_unique = df1_subset[~df1_subset["合并键"].isin(intersection_keys)]
-        df2_unique = df2_subset[~df2_subset["合并键"].isin(intersection_keys)]
+        rows1 = first1[intersection_keys].to_numpy()
+        rows2 = first2[intersection_keys].to_numpy()
+        matched1 = df1_subset.iloc[rows1].reset_index(drop=True)
+        matched2 = df2_subset.iloc[rows2].reset_index(drop=True)
+        if "状态类型" in matched2.columns:
+            confirmed = (matched2["状态类型"] == "已确认").to_numpy()
+        else:
+            confirmed = np.zeros(len(matched2), dtype=bool)
+
+        # 航班表显示"已确认"的，使用航班表数据；人员类型为空时取票务数据的人员类型
+        from_flight = matched2[confirmed].copy()
+        ticket_types = matched1["人员类型"] if "人员类型" in matched1 else None
+        if ticket_types is not None:
+            fill_blank_column(from_flight, "人员类型", ticket_types[confirmed])
+
+        # 否则保留票务全库的记录，变更操作、状态类型取航班数据；
+        # 人员类型优先使用票务数据，为空时使用航班数据
+        from_ticket = matched1[~confirmed].copy()
+        for col in ["变更操作", "状态类型"]:
+            if col in matched2.columns:
+                from_ticket[col] = matched2[col][~confirmed].to_numpy()
+        if "人员类型" in matched2.columns:
+            fill_blank_column(from_ticket, "人员类型", matched2["人员类型"][~confirmed])
+
+        # 添加两表独有的记录（同一键在交集中的重复行一并舍弃）
+        df1_unique = df1_subset[~key1.isin(intersection_keys)]
+        df2_unique = df2_subset[~key2.isin(intersection_keys)]
 
         print(f"票务全库独有记录: {len(df1_unique)}")
         print(f"航班更新独有记录: {len(df2_unique)}")
 
         # 合并所有数据
-        all_data = pd.concat(
-            [pd.DataFrame(result_list), df1_unique, df2_unique], ignore_index=True
-        )
-
-        # 删除合并键列
-        all_data = all_data.drop(columns=["合并键"])
+        all_data = concat_frames([from_flight, from_ticket, df1_unique, df2_unique])
 
         # 确保人员类型字段存在且有默认值
         if "人员类型" not in all_data.columns:
             all_data["人员类型"] = "未知"
         else:
-            # 填充空值
-            all_data["人员类型"] = all_data["人员类型"].fillna("未知")
-            all_data["人员类型"] = all_data["人员类型"].replace("", "未知")
+            # 填充空值（按唯一值处理，分类列同样适用）
+            all_data["人员类型"] = map_uniques(
+                all_data["人员类型"], lambda types: types.replace("", "未知"), "未知"
+            )
 
         print(f"合并后总记录数: {len(all_data)}")
 
@@ -1680,9 +4362,7 @@ class DataProcessor(QThread):
             before_final_dedup = len(all_data)
 
             # 添加优先级列
-            all_data["优先级"] = (
-                all_data["变更操作"].map(self.status_priority).fillna(99)
-            )
+            all_data["优先级"] = self.status_table.lookup(all_data["变更操作"])[1]
 
             # 按关键字段和优先级排序
             all_data = all_data.sort_values(by=dedup_cols_exist + ["优先级"])
@@ -1709,7 +4389,7 @@ class DataProcessor(QThread):
 
         # 统计合并后的状态分布
         if "状态类型" in all_data.columns:
-            status_dist = all_data["状态类型"].value_counts()
+            status_dist = count_values(all_data["状态类型"])
             print("\n合并后状态分布：")
             for status, count in status_dist.items():
                 print(f"  {status}: {count} 条")
@@ -1748,15 +4428,16 @@ class DataProcessor(QThread):
         if "人员类型" not in result.columns:
             result["人员类型"] = "未知"
         else:
-            # 填充空值
-            result["人员类型"] = result["人员类型"].fillna("未知")
-            result["人员类型"] = result["人员类型"].replace("", "未知")
+            # 填充空值（按唯一值处理，分类列同样适用）
+            result["人员类型"] = map_uniques(
+                result["人员类型"], lambda types: types.replace("", "未知"), "未知"
+            )
 
         print(f"{source_type}记录数: {len(result)}")
 
         # 统计状态分布
         if "状态类型" in result.columns:
-            status_dist = result["状态类型"].value_counts()
+            status_dist = count_values(result["状态类型"])
             print(f"\n{source_type}状态分布：")
             for status, count in status_dist.items():
                 print(f"  {status}: {count} 条")
@@ -1764,33 +4445,8 @@ class DataProcessor(QThread):
         return result
 
     def final_dedup(self, df):
-        """最终去重，用于追加数据后的去重"""
-        # 基于关键字段进行最终去重
-        dedup_columns = ["姓名", "证件号", "航班车次", "出发日期"]
-        dedup_cols_exist = [col for col in dedup_columns if col in df.columns]
-
-        if dedup_cols_exist and "变更操作" in df.columns:
-            before_dedup = len(df)
-
-            # 添加优先级列
-            df["优先级"] = df["变更操作"].map(self.status_priority).fillna(99)
-
-            # 按关键字段和优先级排序
-            df = df.sort_values(by=dedup_cols_exist + ["优先级"])
-
-            # 保留每组中优先级最高的记录
-            df = df.drop_duplicates(subset=dedup_cols_exist, keep="first")
-
-            # 删除临时的优先级列
-            df = df.drop(columns=["优先级"])
-
-            after_dedup = len(df)
-            if before_dedup > after_dedup:
-                print(
-                    f"追加数据去重：{before_dedup} 条 -> {after_dedup} 条（删除 {before_dedup - after_dedup} 条重复）"
-                )
-
-        return df
+        """最终去重"""
+        return dedup_records(df, by_priority=True)
 
     def filter_data(self, df, start_date, end_date, target_city):
         """根据日期和城市筛选数据"""
@@ -1804,32 +4460,18 @@ class DataProcessor(QThread):
 
         print(f"筛选前数据量: {len(df)}")
 
-        # 创建日期筛选条件
-        if start_date == end_date:
-            # 单日期筛选（保持向后兼容）
-            date_filter = df["出发日期"].dt.date == start_date
-        else:
-            # 日期区间筛选
-            date_filter = (df["出发日期"].dt.date >= start_date) & (
-                df["出发日期"].dt.date <= end_date
-            )
-
-        df_filtered = df[date_filter]
+        # 日期筛选：在出发日期索引上二分查找，只取日期窗口内的行
+        # （单日期时窗口的起止为同一天）
+        df_filtered = self.dataset.date_window(df, start_date, end_date)
 
         print(f"日期筛选后数据量: {len(df_filtered)}")
 
-        # 筛选目标城市
-        if target_city == "北京":
-            city_keywords = ["北京", "首都", "大兴"]
-        else:  # 福州
-            city_keywords = ["福州", "长乐"]
-
-        # 创建城市筛选条件
-        city_filter = (
-            df_filtered["到站"]
-            .astype(str)
-            .str.contains("|".join(city_keywords), case=False, na=False)
-        )
+        # 筛选目标城市：按导入时计算的到站城市编码做整数比较
+        if "到站城市码" in df_filtered.columns:
+            city_codes = df_filtered["到站城市码"]
+        else:
+            city_codes = city_code_column(df_filtered, "到站", df_filtered.index)
+        city_filter = city_codes.to_numpy() == STATION_DIRECTORY.code_of(target_city)
         result = df_filtered[city_filter]
 
         print(f"城市筛选后数据量: {len(result)}")
@@ -1846,7 +4488,7 @@ class DataProcessor(QThread):
 
             # 显示筛选后的人员类型分布
             if len(result) > 0:
-                person_type_dist = result["人员类型"].value_counts()
+                person_type_dist = count_values(result["人员类型"])
                 print("筛选后人员类型分布：")
                 for ptype, count in person_type_dist.items():
                     print(f"  {ptype}: {count} 条")
@@ -1860,270 +4502,116 @@ class DataProcessor(QThread):
         return result
 
     def identify_groups(self, df):
-        """简化的人员筛选（不再分群体，只要总人数达到阈值就全部筛出）"""
+        """识别群体出行
+
+        同一趟行程（航班车次+出发日期+目标城市）人数达到阈值的为群体；开启到达
+        聚集检测时，时间窗口内乘坐不同航班车次到达的人数达到阈值的也一并筛出。
+        """
         if df.empty:
             return pd.DataFrame()
 
-        # 新逻辑：不再分组，只统计总人数是否达到阈值
-        total_people = len(df)
-
-        # 如果总人数达到最少人数要求，返回所有数据
-        if total_people >= self.min_people_count:
-            result = df.copy()
-            # 移除分组相关字段，不再需要
-            # result["分组键"] = "全部人员"  # 可选：保留一个统一的标识
-            # result["群体人数"] = total_people  # 移除群体人数概念
-        else:
-            # 如果总人数不足，返回空结果
-            result = pd.DataFrame()
-
-        # 确保姓名列是字符串类型
-        if not result.empty and "姓名" in result.columns:
-            result["姓名"] = result["姓名"].astype(str)
-
-        # 排序 - 按出发日期和姓名排序
-        if not result.empty:
-            result = result.sort_values(["出发日期", "姓名"])
+        group_ids, group_sizes = trip_groups(
+            df, self.min_people_count, by_departure=self.group_by_departure
+        )
+        columns = {GROUP_ID: group_ids, GROUP_SIZE: group_sizes}
+        keep = group_ids > 0
+        print(f"识别出 {len(np.unique(group_ids[keep]))} 个群体")
 
-        return result
+        if self.cluster_window_hours > 0:
+            cluster_ids, cluster_sizes = arrival_clusters(
+                df, self.cluster_window_hours * 60, self.cluster_min_people
+            )
+            columns.update({CLUSTER_ID: cluster_ids, CLUSTER_SIZE: cluster_sizes})
+            keep |= cluster_ids > 0
+            print(
+                f"识别出 {cluster_ids.max()} 个到达聚集"
+                f"（{self.cluster_window_hours}小时内{self.cluster_min_people}人及以上）"
+            )
 
-    def read_mixed_transport_data(self, file_path):
-        """读取包含多种交通方式的数据文件（铁路+航班）"""
-        if not file_path:
+        if not keep.any():
+            print(f"未发现{self.min_people_count}人及以上的群体")
             return pd.DataFrame()
 
-        try:
-            # 检查文件中的工作表
-            xl_file = pd.ExcelFile(file_path)
-            print(f"发现工作表: {xl_file.sheet_names}")
-
-            all_transport_data = []
-
-            # 处理铁路数据
-            if "铁路" in xl_file.sheet_names:
-                print("正在处理铁路数据...")
-                railway_df = pd.read_excel(file_path, sheet_name="铁路")
-                railway_df.columns = railway_df.columns.str.strip()
-
-                # 铁路数据字段映射
-                railway_mapping = {
-                    "证件编号": "证件号",
-                    "车次": "航班车次",
-                    "乘车日期": "出发日期",
-                    "乘车时间": "出发时间",
-                }
-
-                for old_col, new_col in railway_mapping.items():
-                    if (
-                        old_col in railway_df.columns
-                        and new_col not in railway_df.columns
-                    ):
-                        railway_df[new_col] = railway_df[old_col]
-
-                # 添加数据源和交通方式标记
-                railway_df["数据源"] = "铁路票务"
-                railway_df["交通方式"] = "铁路"
-                railway_df["变更操作"] = "票务记录"
-                railway_df["状态类型"] = "待确认"
-
-                # 数据清理
-                if "姓名" in railway_df.columns:
-                    railway_df["姓名"] = (
-                        railway_df["姓名"].fillna("").astype(str).str.strip()
-                    )
-                if "证件号" in railway_df.columns:
-                    railway_df["证件号"] = (
-                        railway_df["证件号"].fillna("").astype(str).str.strip()
-                    )
-                if "航班车次" in railway_df.columns:
-                    railway_df["航班车次"] = (
-                        railway_df["航班车次"].fillna("").astype(str).str.strip()
-                    )
-
-                # 处理日期
-                if "出发日期" in railway_df.columns:
-                    railway_df["出发日期"] = pd.to_datetime(
-                        railway_df["出发日期"], errors="coerce"
-                    )
-
-                # 去重
-                dedup_columns = ["姓名", "证件号", "航班车次", "出发日期"]
-                dedup_cols_exist = [
-                    col for col in dedup_columns if col in railway_df.columns
-                ]
-                if dedup_cols_exist:
-                    original_count = len(railway_df)
-                    railway_df = railway_df.drop_duplicates(
-                        subset=dedup_cols_exist, keep="first"
-                    )
-                    print(f"铁路数据去重：{original_count} -> {len(railway_df)} 条")
-
-                # 统计人员类型
-                if "人员类型" in railway_df.columns:
-                    type_counts = railway_df["人员类型"].value_counts()
-                    print("铁路数据人员类型分布：")
-                    for ptype, count in type_counts.items():
-                        if ptype and str(ptype).strip():
-                            print(f"  {ptype}: {count} 条")
-
-                all_transport_data.append(railway_df)
-                print(f"铁路数据处理完成：{len(railway_df)} 条记录")
-
-            # 处理航班数据
-            if "航班" in xl_file.sheet_names:
-                print("正在处理航班数据...")
-                flight_df = pd.read_excel(file_path, sheet_name="航班")
-                flight_df.columns = flight_df.columns.str.strip()
-
-                # 航班数据字段映射（与原有逻辑保持一致）
-                flight_mapping = {
-                    "航班号": "航班车次",
-                    "出发机场名称": "发站",
-                    "到达机场名称": "到站",
-                    "起飞时间": "出发时间",
-                }
-
-                for old_col, new_col in flight_mapping.items():
-                    if (
-                        old_col in flight_df.columns
-                        and new_col not in flight_df.columns
-                    ):
-                        flight_df[new_col] = flight_df[old_col]
-
-                # 添加数据源和交通方式标记
-                flight_df["数据源"] = "航班更新"
-                flight_df["交通方式"] = "航班"
-
-                # 处理变更操作和状态类型（与原有逻辑保持一致）
-                if "变更操作" in flight_df.columns:
-                    confirmed_operations = ["登机", "值机", "进检"]
-                    planned_operations = ["出票", "座变", "改期"]
-
-                    flight_df["状态类型"] = flight_df["变更操作"].apply(
-                        lambda x: (
-                            "已确认"
-                            if x in confirmed_operations
-                            else "待确认" if x in planned_operations else "其他"
-                        )
-                    )
+        result = df[keep].assign(
+            **{col: values[keep] for col, values in columns.items()}
+        )
+        print(f"共 {result['证件号'].nunique()} 人、{len(result)} 条记录")
 
-                    # 统计变更操作
-                    operation_counts = flight_df["变更操作"].value_counts()
-                    print("航班数据变更操作统计：")
-                    for op, count in operation_counts.items():
-                        print(f"  {op}: {count} 条")
-                else:
-                    flight_df["变更操作"] = "未知"
-                    flight_df["状态类型"] = "其他"
-
-                # 数据清理
-                critical_cols = ["姓名", "证件号"]
-                for col in critical_cols:
-                    if col in flight_df.columns:
-                        before_count = len(flight_df)
-                        flight_df = flight_df[
-                            flight_df[col].notna()
-                            & (flight_df[col].astype(str).str.strip() != "")
-                        ]
-                        after_count = len(flight_df)
-                        if before_count > after_count:
-                            print(
-                                f"航班数据：删除{col}为空的记录：{before_count - after_count}条"
-                            )
+        # 同行群体编号：在全量数据的同行关系图上做社区发现
+        if self.detect_communities and getattr(self, "all_data", None) is not None:
+            start = time.perf_counter()
+            graph = self.dataset.co_travel_graph(self.all_data)
+            result[COMMUNITY_ID] = graph.community_of(result["证件号"])
+            print(
+                f"同行群体：结果涉及 {result.loc[result[COMMUNITY_ID] > 0, COMMUNITY_ID].nunique()} 个群体，"
+                f"耗时 {time.perf_counter() - start:.2f} 秒"
+            )
 
-                # 处理字段
-                if "姓名" in flight_df.columns:
-                    flight_df["姓名"] = (
-                        flight_df["姓名"].fillna("").astype(str).str.strip()
-                    )
-                if "证件号" in flight_df.columns:
-                    flight_df["证件号"] = (
-                        flight_df["证件号"].fillna("").astype(str).str.strip()
-                    )
-                if "航班车次" in flight_df.columns:
-                    flight_df["航班车次"] = (
-                        flight_df["航班车次"].fillna("").astype(str).str.strip()
-                    )
+        # 确保姓名列是字符串类型
+        if "姓名" in result.columns:
+            result["姓名"] = result["姓名"].astype(str)
 
-                # 处理日期时间
-                if "起飞时间" in flight_df.columns:
-                    flight_df["起飞时间_dt"] = pd.to_datetime(
-                        flight_df["起飞时间"], errors="coerce"
-                    )
-                    flight_df["出发日期"] = flight_df["起飞时间_dt"].dt.normalize()
-                    flight_df["出发时间"] = flight_df["起飞时间_dt"].dt.strftime(
-                        "%H:%M"
-                    )
-                elif "出发日期" not in flight_df.columns:
-                    flight_df["出发日期"] = pd.NaT
+        # 排序 - 按分组编号（只属于到达聚集的排在最后）、出发日期和姓名排序
+        sort_columns = [col for col in (GROUP_ID, CLUSTER_ID) if col in columns]
+        result = result.sort_values(
+            sort_columns + ["出发日期", "出发分钟", "姓名"],
+            key=lambda values: (
+                values.replace(0, np.iinfo(np.int32).max)
+                if values.name in sort_columns
+                else values
+            ),
+        )
 
-                # 按优先级去重
-                if "变更操作" in flight_df.columns:
-                    flight_df["优先级"] = (
-                        flight_df["变更操作"].map(self.status_priority).fillna(99)
-                    )
-                else:
-                    flight_df["优先级"] = 99
-
-                dedup_columns = ["姓名", "证件号", "航班车次", "出发日期"]
-                dedup_cols_exist = [
-                    col for col in dedup_columns if col in flight_df.columns
-                ]
-
-                if dedup_cols_exist and "优先级" in flight_df.columns:
-                    original_count = len(flight_df)
-                    flight_df = flight_df.sort_values(by=dedup_cols_exist + ["优先级"])
-                    flight_df = flight_df.drop_duplicates(
-                        subset=dedup_cols_exist, keep="first"
-                    )
-                    flight_df = flight_df.drop(columns=["优先级"])
-                    print(
-                        f"航班数据按优先级去重：{original_count} -> {len(flight_df)} 条"
-                    )
+        return result
 
-                # 统计人员类型
-                if "人员类型" in flight_df.columns:
-                    type_counts = flight_df["人员类型"].value_counts()
-                    print("航班数据人员类型分布：")
-                    for ptype, count in type_counts.items():
-                        if ptype and str(ptype).strip():
-                            print(f"  {ptype}: {count} 条")
 
-                all_transport_data.append(flight_df)
-                print(f"航班数据处理完成：{len(flight_df)} 条记录")
+class CoTravelAnalyzer(QThread):
+    """在全量数据上查找重复同行人员对（及同行团伙）的后台线程"""
 
-            # 合并所有交通数据
-            if not all_transport_data:
-                return pd.DataFrame()
+    message = Signal(str)
+    finished = Signal(object)
+    error = Signal(str)
 
-            combined_df = pd.concat(all_transport_data, ignore_index=True, sort=False)
+    def __init__(self, dataset):
+        super().__init__()
+        self.dataset = dataset
+        self.data = None
+        self.min_shared = 2
+        self.find_cliques = False
+        self.cliques_truncated = False  # 同行团伙是否因数量上限提前停止
 
-            # 确保人员类型字段存在
-            if "人员类型" not in combined_df.columns:
-                combined_df["人员类型"] = "未知"
-            else:
-                combined_df["人员类型"] = combined_df["人员类型"].fillna("未知")
-                combined_df["人员类型"] = combined_df["人员类型"].replace("", "未知")
-
-            # 最终统计
-            print(f"\n=== 混合交通数据处理完成 ===")
-            print(f"总记录数: {len(combined_df)}")
-            if "交通方式" in combined_df.columns:
-                transport_counts = combined_df["交通方式"].value_counts()
-                print("交通方式分布：")
-                for transport, count in transport_counts.items():
-                    print(f"  {transport}: {count} 条")
-
-            if "状态类型" in combined_df.columns:
-                status_counts = combined_df["状态类型"].value_counts()
-                print("状态类型分布：")
-                for status, count in status_counts.items():
-                    print(f"  {status}: {count} 条")
+    def set_params(self, data, min_shared, find_cliques=False):
+        self.data = data
+        self.min_shared = min_shared
+        self.find_cliques = find_cliques
 
-            return combined_df
+    def run(self):
+        try:
+            start = time.perf_counter()
+            self.message.emit("正在建立同行关系图...")
+            graph = self.dataset.co_travel_graph(self.data)
+
+            self.message.emit("正在统计重复同行人员...")
+            result = {"重复同行": graph.repeat_pairs(self.min_shared)}
+            self.cliques_truncated = False
+            if self.find_cliques and not self.isInterruptionRequested():
+                self.message.emit("正在识别同行团伙...")
+                result["同行团伙"] = graph.repeat_cliques(
+                    self.min_shared, should_stop=self.isInterruptionRequested
+                )
+                self.cliques_truncated = graph.cliques_truncated
+            if self.isInterruptionRequested():
+                # 对话框已关闭，不再发送结果
+                return
 
+            print(
+                f"重复同行分析：{graph.n_persons} 人、{graph.n_trips} 个行程，"
+                f"共同行程{self.min_shared}次及以上的人员对 {len(result['重复同行'])} 对，"
+                f"耗时 {time.perf_counter() - start:.2f} 秒"
+            )
+            self.finished.emit(result)
         except Exception as e:
-            raise Exception(f"读取混合交通数据失败：{str(e)}")
+            self.error.emit(f"重复同行分析出错：{str(e)}")
 
 
 class GroupTravelChecker(QMainWindow):
@@ -2132,8 +4620,10 @@ class GroupTravelChecker(QMainWindow):
         self.file1_path = ""
         self.file2_path = ""
         self.result_data = None
-        self.processor = DataProcessor()
-        self.preview_loader = DataPreviewLoader()
+        self.dataset = LoadedDataset()  # 预加载与筛查共享的已加载数据
+        self.processor = DataProcessor(self.dataset)
+        self.preview_loader = DataPreviewLoader(self.dataset)
+        self.bulk_loader = BulkImportLoader(self.dataset)
 
         self.merged_data = None
         self.append_mode = False
@@ -2377,8 +4867,37 @@ class GroupTravelChecker(QMainWindow):
         file2_layout.addWidget(self.file2_edit, 1)  # 让文件路径占据剩余空间
         file2_layout.addWidget(self.file2_btn)
 
+        # 批量导入：一次导入文件夹或多个工作簿，自动识别文件类型
+        bulk_layout = QHBoxLayout()
+        bulk_label = QLabel("批量导入：")
+        bulk_label.setFixedWidth(150)
+        bulk_label.setToolTip("一次导入多天的票务导出文件，自动识别票务全库/群体票务")
+        self.bulk_edit = QLabel("未导入")
+        self.bulk_edit.setStyleSheet(
+            """
+            QLabel {
+                background-color: white;
+                border: 1px solid #cccccc;
+                border-radius: 5px;
+                padding: 6px;
+                font-size: 14px;
+            }
+        """
+        )
+        self.bulk_folder_btn = QPushButton("导入文件夹")
+        self.bulk_folder_btn.setFixedWidth(120)
+        self.bulk_folder_btn.setToolTip("导入文件夹中的所有Excel文件")
+        self.bulk_files_btn = QPushButton("导入多个文件")
+        self.bulk_files_btn.setFixedWidth(120)
+        self.bulk_files_btn.setToolTip("选择多个Excel文件一起导入")
+        bulk_layout.addWidget(bulk_label)
+        bulk_layout.addWidget(self.bulk_edit, 1)
+        bulk_layout.addWidget(self.bulk_folder_btn)
+        bulk_layout.addWidget(self.bulk_files_btn)
+
         file_layout.addLayout(file1_layout)
         file_layout.addLayout(file2_layout)
+        file_layout.addLayout(bulk_layout)
 
         # 添加文件历史记录区域
         file_layout.addSpacing(8)
@@ -2657,7 +5176,7 @@ class GroupTravelChecker(QMainWindow):
         city_label = QLabel("目标城市：")
         city_label.setFixedWidth(100)
         self.city_combo = QComboBox()
-        self.city_combo.addItems(["北京", "福州"])
+        self.city_combo.addItems(STATION_DIRECTORY.cities)
         self.city_combo.setFixedWidth(150)
 
         # 最少人数选择
@@ -2668,11 +5187,50 @@ class GroupTravelChecker(QMainWindow):
         self.people_combo.setCurrentIndex(2)  # 默认选择"3人及以上"
         self.people_combo.setFixedWidth(150)
 
+        # 群体识别是否区分发站（同一航班车次从不同车站出发的人分为不同群体）
+        self.group_by_departure_cb = QCheckBox("区分发站")
+        self.group_by_departure_cb.setToolTip(
+            "勾选后，同一航班车次、同一天但发站不同的人员分为不同群体"
+        )
+
+        # 到达聚集：时间窗口内乘坐不同航班车次到达目标城市的人数
+        cluster_label = QLabel("到达聚集：")
+        cluster_label.setFixedWidth(100)
+        self.cluster_window_combo = QComboBox()
+        for hours in (0, 1, 2, 3, 6, 12):
+            self.cluster_window_combo.addItem(
+                f"{hours}小时内" if hours else "不检测", hours
+            )
+        self.cluster_window_combo.setFixedWidth(100)
+        self.cluster_window_combo.setToolTip(
+            "检测在该时间窗口内分别乘坐不同航班车次到达目标城市的人员"
+        )
+        self.cluster_people_combo = QComboBox()
+        for count in (3, 5, 10, 20):
+            self.cluster_people_combo.addItem(f"{count}人及以上", count)
+        self.cluster_people_combo.setCurrentIndex(1)  # 默认5人及以上
+
+        # 同行群体：在全部导入数据的同行关系图上做社区发现，结果带群体编号
+        self.community_cb = QCheckBox("标注同行群体")
+        self.community_cb.setChecked(False)
+        self.community_cb.setToolTip(
+            "根据全部导入数据中的同行关系划分群体，结果中增加群体编号列（数据量大时较慢）"
+        )
+        self.cluster_people_combo.setFixedWidth(110)
+
         second_row.addWidget(city_label)
         second_row.addWidget(self.city_combo)
         second_row.addSpacing(40)
         second_row.addWidget(people_label)
         second_row.addWidget(self.people_combo)
+        second_row.addSpacing(20)
+        second_row.addWidget(self.group_by_departure_cb)
+        second_row.addSpacing(40)
+        second_row.addWidget(cluster_label)
+        second_row.addWidget(self.cluster_window_combo)
+        second_row.addWidget(self.cluster_people_combo)
+        second_row.addSpacing(20)
+        second_row.addWidget(self.community_cb)
         second_row.addStretch()
 
         person_type_row = QHBoxLayout()
@@ -2752,9 +5310,31 @@ class GroupTravelChecker(QMainWindow):
         )
         self.clear_btn.setEnabled(False)  # 初始禁用，有数据后启用
 
+        # 清除本地缓存按钮
+        self.clear_cache_btn = QPushButton("清除缓存")
+        self.clear_cache_btn.setFixedWidth(150)
+        self.clear_cache_btn.setFixedHeight(40)
+        self.clear_cache_btn.setToolTip(
+            "删除本地保存的已解析数据，下次导入时重新解析Excel"
+        )
+        self.clear_cache_btn.setStyleSheet(
+            """
+            QPushButton {
+                background-color: #607D8B;
+                font-size: 18px;
+                padding: 10px;
+            }
+            QPushButton:hover {
+                background-color: #455A64;
+            }
+        """
+        )
+
         third_row.addWidget(self.search_btn)
         third_row.addSpacing(15)
         third_row.addWidget(self.clear_btn)
+        third_row.addSpacing(15)
+        third_row.addWidget(self.clear_cache_btn)
         third_row.addStretch()
 
         filter_layout.addLayout(first_row)
@@ -2802,6 +5382,16 @@ class GroupTravelChecker(QMainWindow):
         self.export_btn.setFixedWidth(150)
         self.export_btn.setFixedHeight(40)
         export_layout.addWidget(self.export_btn)
+
+        # 重复同行分析（基于全部导入数据）
+        self.co_travel_btn = QPushButton("重复同行分析")
+        self.co_travel_btn.setEnabled(False)
+        self.co_travel_btn.setFixedWidth(150)
+        self.co_travel_btn.setFixedHeight(40)
+        self.co_travel_btn.setToolTip(
+            "在全部导入数据中查找多次共同乘坐同一航班车次的人员"
+        )
+        export_layout.addWidget(self.co_travel_btn)
         result_layout.addLayout(export_layout)
 
         result_group.setLayout(result_layout)
@@ -2811,8 +5401,11 @@ class GroupTravelChecker(QMainWindow):
         """设置信号连接"""
         self.file1_btn.clicked.connect(self.select_file1)
         self.file2_btn.clicked.connect(self.select_file2)
+        self.bulk_folder_btn.clicked.connect(self.select_bulk_folder)
+        self.bulk_files_btn.clicked.connect(self.select_bulk_files)
         self.search_btn.clicked.connect(self.start_search)
         self.clear_btn.clicked.connect(self.clear_data)
+        self.clear_cache_btn.clicked.connect(self.clear_disk_cache)
 
         # 时间模式切换
         self.time_mode_combo.currentTextChanged.connect(self.on_time_mode_changed)
@@ -2833,6 +5426,12 @@ class GroupTravelChecker(QMainWindow):
         self.preview_loader.finished.connect(self.on_data_preview_loaded)
         self.preview_loader.error.connect(self.show_preview_error)
 
+        # 批量导入信号
+        self.bulk_loader.progress.connect(self.update_progress)
+        self.bulk_loader.message.connect(self.update_message)
+        self.bulk_loader.finished.connect(self.on_bulk_import_loaded)
+        self.bulk_loader.error.connect(self.show_bulk_import_error)
+
         self.search_input.textChanged.connect(self.on_search_text_changed)
         self.search_data_btn.clicked.connect(self.search_data)
         self.clear_search_btn.clicked.connect(self.clear_search)
@@ -2847,6 +5446,7 @@ class GroupTravelChecker(QMainWindow):
 
         # 导出按钮连接
         self.export_btn.clicked.connect(self.export_results)
+        self.co_travel_btn.clicked.connect(self.show_co_travel_analysis)
 
     def discover_person_types(self, data_df):
         """发现数据中的人员类型"""
@@ -3003,6 +5603,124 @@ class GroupTravelChecker(QMainWindow):
             # 新增：触发数据预加载
             self.trigger_data_preview()
 
+    def select_bulk_folder(self):
+        """选择文件夹批量导入"""
+        folder = QFileDialog.getExistingDirectory(self, "选择票务导出文件夹", "")
+        if folder:
+            file_paths = list_excel_files(folder)
+            if not file_paths:
+                QMessageBox.warning(self, "警告", "所选文件夹中没有Excel文件！")
+                return
+            self.start_bulk_import(file_paths)
+
+    def select_bulk_files(self):
+        """选择多个文件批量导入"""
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "选择票务导出文件", "", "Excel文件 (*.xlsx *.xls)"
+        )
+        if file_paths:
+            self.start_bulk_import(file_paths)
+
+    def start_bulk_import(self, file_paths):
+        """启动批量导入"""
+        if self.bulk_loader.isRunning() or self.preview_loader.isRunning():
+            QMessageBox.warning(self, "提示", "正在加载数据，请稍候再导入")
+            return
+
+        self.bulk_edit.setText(f"正在导入 {len(file_paths)} 个文件...")
+
+        # 显示进度提示
+        self.progress_bar.setVisible(True)
+        self.progress_label.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.progress_label.setText("正在批量导入数据，请稍候...")
+
+        # 临时禁用按钮
+        self.search_btn.setEnabled(False)
+        self.clear_btn.setEnabled(False)
+        self.bulk_folder_btn.setEnabled(False)
+        self.bulk_files_btn.setEnabled(False)
+
+        # 与已有数据合并后统一去重
+        self.bulk_loader.set_params(file_paths, self.merged_data)
+        self.bulk_loader.start()
+
+    def on_bulk_import_loaded(self, imported_data):
+        """批量导入完成的处理"""
+        self.progress_bar.setVisible(False)
+        self.progress_label.setVisible(False)
+        self.bulk_folder_btn.setEnabled(True)
+        self.bulk_files_btn.setEnabled(True)
+
+        self.merged_data = imported_data
+        stats = self.bulk_loader.import_stats
+        file_types = stats.get("文件类型", {})
+        skipped = stats.get("跳过文件", [])
+
+        self.bulk_edit.setText(f"已导入 {len(file_types)} 个文件")
+
+        if self.merged_data is not None and not self.merged_data.empty:
+            self.discover_person_types(self.merged_data)
+            self.enable_search_features(True)
+            self.update_data_status()
+
+            summary = (
+                f"导入文件：{len(file_types)} 个\n"
+                f"读取记录：{stats.get('读取记录数', 0)} 条\n"
+                f"去重后数据总量：{len(self.merged_data)} 条\n"
+                f"耗时：{stats.get('耗时', 0):.2f} 秒"
+                f"（{stats.get('每秒记录数', 0):.0f} 条/秒）"
+            )
+            delta = stats.get("增量")
+            if delta:
+                summary += (
+                    f"\n\n增量导入：新增 {delta['新增']} 条，变化 {delta['变化']} 条，"
+                    f"未变化 {delta['未变化']} 条"
+                )
+                if delta["跳过文件"]:
+                    unchanged_names = "、".join(
+                        os.path.basename(path) for path in delta["跳过文件"]
+                    )
+                    summary += f"\n内容未变化的文件：{unchanged_names}"
+            if skipped:
+                skipped_names = "、".join(os.path.basename(path) for path in skipped)
+                summary += f"\n\n未识别并跳过：{skipped_names}"
+            QMessageBox.information(self, "批量导入完成", summary)
+
+            # 更新文件历史
+            ticket_names = [
+                os.path.basename(path)
+                for path, file_type in file_types.items()
+                if file_type == "票务全库"
+            ]
+            group_names = [
+                os.path.basename(path)
+                for path, file_type in file_types.items()
+                if file_type == "群体票务"
+            ]
+            self.add_file_history(
+                "、".join(ticket_names) or "无",
+                "、".join(group_names) or "无",
+                "批量导入",
+                len(self.merged_data),
+            )
+
+        self.update_button_states()
+
+    def show_bulk_import_error(self, error_msg):
+        """显示批量导入错误信息"""
+        self.progress_bar.setVisible(False)
+        self.progress_label.setVisible(False)
+        self.bulk_folder_btn.setEnabled(True)
+        self.bulk_files_btn.setEnabled(True)
+        self.bulk_edit.setText("导入失败")
+
+        self.update_button_states()
+
+        QMessageBox.warning(
+            self, "批量导入失败", f"批量导入过程中发生错误：\n{error_msg}"
+        )
+
     def on_time_mode_changed(self, mode):
         """时间模式切换处理"""
         if mode == "单日期":
@@ -3042,8 +5760,9 @@ class GroupTravelChecker(QMainWindow):
 
     def start_search(self):
         """开始筛查"""
-        # 检查文件是否已选择 - 至少要有一个文件
-        if not self.file1_path and not self.file2_path:
+        # 检查文件是否已选择 - 至少要有一个文件，或已批量导入数据
+        has_data = self.merged_data is not None and not self.merged_data.empty
+        if not self.file1_path and not self.file2_path and not has_data:
             QMessageBox.warning(self, "警告", "请至少选择一份数据文件！")
             return
 
@@ -3088,6 +5807,8 @@ class GroupTravelChecker(QMainWindow):
 
         # 设置参数并启动处理线程
         # 注意：现在不再需要特别的append_mode，因为文件选择时已经自动合并了数据
+        # 文件未变化时处理线程直接复用预加载的全量数据；文件有变化时才重新读取，
+        # 并与已有数据合并
         self.processor.set_params(
             self.file1_path,
             self.file2_path,
@@ -3095,9 +5816,13 @@ class GroupTravelChecker(QMainWindow):
             end_date,  # 传递结束日期
             self.city_combo.currentText(),
             min_people_count,
-            None,  # 不再通过这里传递existing_data，而是通过文件选择的预加载机制
+            self.merged_data,
             False,  # 简化：不再需要append_mode
             selected_person_types,  # 传递人员类型筛选参数
+            self.group_by_departure_cb.isChecked(),
+            self.cluster_window_combo.currentData(),
+            self.cluster_people_combo.currentData(),
+            self.community_cb.isChecked(),
         )
         self.processor.start()
 
@@ -3116,9 +5841,13 @@ class GroupTravelChecker(QMainWindow):
             if self.preview_loader.isRunning():
                 self.preview_loader.terminate()
                 self.preview_loader.wait()
+            if self.bulk_loader.isRunning():
+                self.bulk_loader.terminate()
+                self.bulk_loader.wait()
 
             # 清空所有数据
             self.merged_data = None
+            self.dataset.clear()
             self.result_data = None
             self.original_data_count = 0
             self.append_mode = False
@@ -3145,6 +5874,7 @@ class GroupTravelChecker(QMainWindow):
             # 清空文件路径显示
             self.file1_edit.setText("未选择文件")
             self.file2_edit.setText("未选择文件")
+            self.bulk_edit.setText("未导入")
             self.file1_path = ""
             self.file2_path = ""
             self.has_file1_selected = False
@@ -3170,6 +5900,23 @@ class GroupTravelChecker(QMainWindow):
 
             QMessageBox.information(self, "提示", "数据已清空")
 
+    def clear_disk_cache(self):
+        """清除本地列式缓存"""
+        reply = QMessageBox.question(
+            self,
+            "确认清除",
+            "确定要清除本地缓存吗？\n清除后再次导入相同文件需要重新解析Excel。",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No,
+        )
+
+        if reply == QMessageBox.Yes:
+            try:
+                removed = self.dataset.disk_cache.clear()
+                QMessageBox.information(self, "提示", f"已清除 {removed} 个缓存文件")
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"清除缓存失败：{str(e)}")
+
     def update_progress(self, value):
         """更新进度条"""
         self.progress_bar.setValue(value)
@@ -3213,9 +5960,23 @@ class GroupTravelChecker(QMainWindow):
         print(f"前5行数据:\n{result_df.head()}")
 
         # 更新统计信息
-        total_people = len(result_df)
-        # 移除群体统计，因为新逻辑不再分组
-        # total_groups = result_df["分组键"].nunique()
+        total_people = result_df["证件号"].nunique()
+        total_groups = (
+            result_df.loc[result_df[GROUP_ID] > 0, GROUP_ID].nunique()
+            if GROUP_ID in result_df.columns
+            else 0
+        )
+        cluster_info = ""
+        if CLUSTER_ID in result_df.columns:
+            total_clusters = result_df.loc[
+                result_df[CLUSTER_ID] > 0, CLUSTER_ID
+            ].nunique()
+            cluster_info = f"、{total_clusters} 个到达聚集"
+        if COMMUNITY_ID in result_df.columns:
+            total_communities = result_df.loc[
+                result_df[COMMUNITY_ID] > 0, COMMUNITY_ID
+            ].nunique()
+            cluster_info += f"（涉及 {total_communities} 个同行群体）"
 
         # 获取当前的人数阈值
         min_people = int(self.people_combo.currentText()[0])
@@ -3229,7 +5990,7 @@ class GroupTravelChecker(QMainWindow):
         # 统计状态分布
         status_info = ""
         if "状态类型" in result_df.columns:
-            status_counts = result_df["状态类型"].value_counts()
+            status_counts = count_values(result_df["状态类型"])
             status_parts = []
             for status, count in status_counts.items():
                 status_parts.append(f"{status} {count} 人")
@@ -3297,11 +6058,16 @@ class GroupTravelChecker(QMainWindow):
         detail_tip = "\n💡 提示：点击证件号可查看该人员的详细出行记录"
 
         self.stats_label.setText(
-            f"共发现 {total_people} 人符合筛选条件（{threshold_desc}阈值）{status_info}{data_info}{detail_tip}"
+            f"共发现 {total_groups} 个群体{cluster_info}、{total_people} 人符合筛选条件（{threshold_desc}阈值）{status_info}{data_info}{detail_tip}"
         )
 
         # 设置表格
         columns = [
+            GROUP_ID,
+            GROUP_SIZE,
+            CLUSTER_ID,
+            CLUSTER_SIZE,
+            COMMUNITY_ID,
             "姓名",
             "证件号",
             "航班车次",
@@ -3345,7 +6111,7 @@ class GroupTravelChecker(QMainWindow):
                 if col == "出发日期":
                     # 为日期列设置正确的排序数据
                     try:
-                        date_value = pd.to_datetime(result_df.iloc[row_idx][col])
+                        date_value = result_df.iloc[row_idx][col]
                         # 使用时间戳作为排序依据
                         item.setData(Qt.UserRole, date_value.timestamp())
                     except:
@@ -3353,6 +6119,16 @@ class GroupTravelChecker(QMainWindow):
                 elif col == "姓名":
                     # 为姓名设置排序数据（使用原始值）
                     item.setData(Qt.UserRole, str(value))
+                elif col in (
+                    GROUP_ID,
+                    GROUP_SIZE,
+                    CLUSTER_ID,
+                    CLUSTER_SIZE,
+                    COMMUNITY_ID,
+                ):
+                    # 编号和人数按数值排序，0（不属于群体或聚集）显示为空
+                    number = int(result_df.iloc[row_idx][col])
+                    item.setData(Qt.DisplayRole, number if number else "")
 
                 # 根据状态类型设置文字颜色
                 if col == "状态类型":
@@ -3470,34 +6246,71 @@ class GroupTravelChecker(QMainWindow):
                 # 创建Excel写入器
                 with pd.ExcelWriter(file_path, engine="openpyxl") as writer:
                     # 写入详细数据
-                    self.result_data.to_excel(
-                        writer, sheet_name="筛查结果", index=False
+                    self.result_data.drop(
+                        columns=INTERNAL_COLUMNS, errors="ignore"
+                    ).to_excel(writer, sheet_name="筛查结果", index=False)
+
+                    # 创建汇总表（每个群体一行）
+                    grouped = self.result_data[self.result_data[GROUP_ID] > 0]
+                    summary = grouped.groupby([GROUP_ID], observed=True).agg(
+                        {
+                            "群体人数": "first",
+                            "航班车次": "first",
+                            "出发日期": "first",
+                            "到站": lambda x: ", ".join(map(str, x.unique())),
+                            "状态类型": lambda x: (
+                                ", ".join(count_values(x).index.tolist())
+                                if "状态类型" in self.result_data.columns
+                                else ""
+                            ),
+                        }
                     )
 
-                    # 创建汇总表
-                    summary = (
-                        self.result_data.groupby(["到站"])
-                        .agg(
+                    summary.to_excel(writer, sheet_name="群体汇总")
+
+                    # 到达聚集汇总（每个聚集一行）
+                    if CLUSTER_ID in self.result_data.columns:
+                        clustered = self.result_data[self.result_data[CLUSTER_ID] > 0]
+                        cluster_summary = clustered.groupby(
+                            [CLUSTER_ID], observed=True
+                        ).agg(
                             {
-                                "姓名": "count",
-                                "航班车次": lambda x: ", ".join(x.unique()),
-                                "出发日期": "first",
-                                "状态类型": lambda x: (
-                                    ", ".join(x.value_counts().index.tolist())
-                                    if "状态类型" in self.result_data.columns
-                                    else ""
-                                ),
+                                "聚集人数": "first",
+                                "到站": lambda x: ", ".join(map(str, x.unique())),
+                                "出发日期": "min",
+                                "出发时间": "min",
+                                "航班车次": lambda x: ", ".join(map(str, x.unique())),
                             }
                         )
-                        .rename(columns={"姓名": "人数"})
-                    )
-
-                    summary.to_excel(writer, sheet_name="群体汇总")
+                        cluster_summary.to_excel(writer, sheet_name="到达聚集")
+
+                    # 同行群体汇总（每个群体一行）
+                    if COMMUNITY_ID in self.result_data.columns:
+                        members = self.result_data[self.result_data[COMMUNITY_ID] > 0]
+                        community_summary = (
+                            members.groupby([COMMUNITY_ID], observed=True)
+                            .agg(
+                                人数=("证件号", "nunique"),
+                                记录数=("证件号", "size"),
+                                最早出发=("出发日期", "min"),
+                                最晚出发=("出发日期", "max"),
+                                航班车次=(
+                                    "航班车次",
+                                    lambda x: ", ".join(map(str, x.unique())),
+                                ),
+                                到站=(
+                                    "到站",
+                                    lambda x: ", ".join(map(str, x.unique())),
+                                ),
+                            )
+                            .sort_values("人数", ascending=False)
+                        )
+                        community_summary.to_excel(writer, sheet_name="同行群体")
 
                     # 创建状态统计表
                     if "状态类型" in self.result_data.columns:
                         # 按状态类型统计
-                        status_summary = self.result_data["状态类型"].value_counts()
+                        status_summary = count_values(self.result_data["状态类型"])
                         status_df = pd.DataFrame(
                             {
                                 "状态类型": status_summary.index,
@@ -3511,9 +6324,7 @@ class GroupTravelChecker(QMainWindow):
 
                         # 变更操作统计
                         if "变更操作" in self.result_data.columns:
-                            operation_stats = self.result_data[
-                                "变更操作"
-                            ].value_counts()
+                            operation_stats = count_values(self.result_data["变更操作"])
                             operation_df = pd.DataFrame(
                                 {
                                     "变更操作": operation_stats.index,
@@ -3619,25 +6430,13 @@ class GroupTravelChecker(QMainWindow):
         """执行搜索逻辑"""
         search_text_lower = search_text.lower()
 
+        # 各字段按唯一值匹配后广播回各行
         if search_type == "姓名":
-            mask = (
-                data_df["姓名"]
-                .astype(str)
-                .str.lower()
-                .str.contains(search_text_lower, case=False, na=False)
-            )
+            mask = contains_text(data_df["姓名"], search_text_lower)
         elif search_type == "证件号":
-            mask = (
-                data_df["证件号"]
-                .astype(str)
-                .str.contains(search_text, case=False, na=False)
-            )
+            mask = contains_text(data_df["证件号"], search_text)
         elif search_type == "航班车次":
-            mask = (
-                data_df["航班车次"]
-                .astype(str)
-                .str.contains(search_text, case=False, na=False)
-            )
+            mask = contains_text(data_df["航班车次"], search_text)
         elif search_type == "全字段":
             # 在所有主要字段中搜索
             main_fields = ["姓名", "证件号", "航班车次", "发站", "到站"]
@@ -3647,13 +6446,7 @@ class GroupTravelChecker(QMainWindow):
 
             mask = pd.Series([False] * len(data_df), index=data_df.index)
             for field in available_fields:
-                field_mask = (
-                    data_df[field]
-                    .astype(str)
-                    .str.lower()
-                    .str.contains(search_text_lower, case=False, na=False)
-                )
-                mask = mask | field_mask
+                mask = mask | contains_text(data_df[field], search_text_lower)
 
         return data_df[mask].reset_index(drop=True)
 
@@ -3704,7 +6497,7 @@ class GroupTravelChecker(QMainWindow):
                 # 为排序设置正确的数据类型
                 if col == "出发日期":
                     try:
-                        date_value = pd.to_datetime(search_results.iloc[row_idx][col])
+                        date_value = search_results.iloc[row_idx][col]
                         item.setData(Qt.UserRole, date_value.timestamp())
                     except:
                         item.setData(Qt.UserRole, 0)
@@ -3892,8 +6685,12 @@ class GroupTravelChecker(QMainWindow):
 
     def update_button_states(self):
         """根据当前状态更新按钮可用性"""
-        # 至少需要一个文件就可以筛查
-        can_search = self.has_file1_selected or self.has_file2_selected
+        # 至少需要一个文件（或已批量导入数据）就可以筛查
+        can_search = (
+            self.has_file1_selected
+            or self.has_file2_selected
+            or (self.merged_data is not None and not self.merged_data.empty)
+        )
         self.search_btn.setEnabled(can_search)
 
         # 只有有数据后才能清空
@@ -3905,6 +6702,15 @@ class GroupTravelChecker(QMainWindow):
             self.merged_data is not None and not self.merged_data.empty
         )
         self.enable_search_features(has_searchable_data)
+        self.co_travel_btn.setEnabled(has_searchable_data)
+
+    def show_co_travel_analysis(self):
+        """打开重复同行分析对话框"""
+        if self.merged_data is None or self.merged_data.empty:
+            QMessageBox.warning(self, "警告", "请先导入数据")
+            return
+        dialog = CoTravelDialog(self.dataset, self.merged_data, self)
+        dialog.exec_()
 
     def update_data_status(self):
         """更新数据状态显示"""
@@ -3928,7 +6734,7 @@ class GroupTravelChecker(QMainWindow):
 
             # 添加状态分布信息
             if "状态类型" in self.merged_data.columns:
-                status_counts = self.merged_data["状态类型"].value_counts()
+                status_counts = count_values(self.merged_data["状态类型"])
                 status_parts = []
                 for status, count in status_counts.items():
                     status_parts.append(f"{status} {count} 条")
@@ -4005,7 +6811,12 @@ class GroupTravelChecker(QMainWindow):
 
         try:
             # 创建并显示详情对话框
-            detail_dialog = PersonDetailDialog(person_id, data_source, self)
+            detail_dialog = PersonDetailDialog(
+                person_id,
+                data_source,
+                self,
+                graph_factory=lambda: self.dataset.co_travel_graph(data_source),
+            )
             detail_dialog.exec_()
 
         except Exception as e:
@@ -4145,15 +6956,217 @@ class GroupTravelChecker(QMainWindow):
         )
 
 
+def reference_merge(df1, df2):
+    """DataProcessor.merge_data的逐行参考实现，供benchmark_merge核对结果
+
+    保留改为哈希连接之前的规则：合并键为去除首尾空格的姓名、证件号、航班车次
+    与出发日期（按天）拼接的字符串，交集键两表各取首次出现的行，逐行决定保留
+    哪一条；之后填充人员类型、按优先级去重。逐行处理，只适合小数据量。
+    """
+
+    def text(value):
+        return "" if pd.isna(value) else str(value).strip()
+
+    def blank(value):
+        return pd.isna(value) or value == ""
+
+    def merge_keys(df):
+        dates = parse_datetime(df["出发日期"]).dt.strftime("%Y-%m-%d").fillna("")
+        return [
+            f"{text(name)}_{text(id_number)}_{text(train)}_{day}"
+            for name, id_number, train, day in zip(
+                df["姓名"], df["证件号"], df["航班车次"], dates
+            )
+        ]
+
+    if "变更操作" not in df1.columns:
+        df1 = df1.assign(变更操作="票务记录")
+    if "状态类型" not in df1.columns:
+        df1 = df1.assign(状态类型="待确认")
+    cols = [
+        "姓名",
+        "证件号",
+        "航班车次",
+        "发站",
+        "到站",
+        "出发日期",
+        "出发时间",
+        "数据源",
+        "变更操作",
+        "状态类型",
+        "人员类型",
+    ]
+    records1 = df1[[col for col in cols if col in df1.columns]].to_dict("records")
+    records2 = df2[[col for col in cols if col in df2.columns]].to_dict("records")
+    keys1, keys2 = merge_keys(df1), merge_keys(df2)
+    first1, first2 = {}, {}
+    for i, key in enumerate(keys1):
+        first1.setdefault(key, i)
+    for i, key in enumerate(keys2):
+        first2.setdefault(key, i)
+    intersection_keys = first1.keys() & first2.keys()
+
+    rows = []
+    for key in intersection_keys:
+        record1 = dict(records1[first1[key]])
+        record2 = dict(records2[first2[key]])
+        if record2.get("状态类型") == "已确认":
+            if blank(record2.get("人员类型")) and not blank(record1.get("人员类型")):
+                record2["人员类型"] = record1.get("人员类型")
+            rows.append(record2)
+        else:
+            for col in ["变更操作", "状态类型"]:
+                record1[col] = record2.get(col, record1.get(col))
+            if blank(record1.get("人员类型")) and not blank(record2.get("人员类型")):
+                record1["人员类型"] = record2.get("人员类型")
+            rows.append(record1)
+    rows += [r for r, key in zip(records1, keys1) if key not in intersection_keys]
+    rows += [r for r, key in zip(records2, keys2) if key not in intersection_keys]
+
+    result = pd.DataFrame(rows)
+    if "人员类型" not in result.columns:
+        result["人员类型"] = "未知"
+    else:
+        result["人员类型"] = result["人员类型"].fillna("未知").replace("", "未知")
+    result["优先级"] = STATUS_TABLE.lookup(result["变更操作"])[1]
+    result = result.sort_values(DEDUP_COLUMNS + ["优先级"])
+    result = result.drop_duplicates(subset=DEDUP_COLUMNS, keep="first")
+    return result.drop(columns=["优先级"])
+
+
+def benchmark_merge(sizes=(100_000, 300_000), cases=20, repeat=3):
+    """核对并测量DataProcessor.merge_data
+
+    先在cases组随机小数据（含重复键、首尾空格、空日期、空人员类型）上与
+    reference_merge的结果逐行比较（排序后比较，忽略内部列），再在键全部重叠
+    的sizes条数据上测量merge_data的耗时（取repeat次中最快的一次）。
+    """
+
+    def random_sources(seed, n=300):
+        rng = np.random.default_rng(seed)
+        names = np.array(
+            [f"人员{i}" for i in range(15)] + [" 人员1 ", None], dtype=object
+        )
+        days = pd.DatetimeIndex(
+            ["2024-01-01", "2024-01-02", "2024-01-02 08:00", pd.NaT]
+        )
+
+        def side(types):
+            return pd.DataFrame(
+                {
+                    "姓名": names[rng.integers(0, len(names), n)],
+                    "证件号": np.array(["A1", "B2", " A1"], dtype=object)[
+                        rng.integers(0, 3, n)
+                    ],
+                    "航班车次": np.array(["CA1", "G2"], dtype=object)[
+                        rng.integers(0, 2, n)
+                    ],
+                    "发站": "发站",
+                    "到站": np.array(["北京", "上海"], dtype=object)[
+                        rng.integers(0, 2, n)
+                    ],
+                    "出发日期": days[rng.integers(0, len(days), n)],
+                    "出发时间": "09:10",
+                    "数据源": "来源",
+                    "人员类型": np.array(types, dtype=object)[
+                        rng.integers(0, len(types), n)
+                    ],
+                }
+            )
+
+        tickets = side(["甲", "", None])
+        flights = side(["乙", "", None])
+        flights["变更操作"] = np.array(["登机", "出票", "段消"], dtype=object)[
+            rng.integers(0, 3, n)
+        ]
+        flights["状态类型"] = (
+            flights["变更操作"].map({"登机": "已确认", "出票": "待确认"}).fillna("其他")
+        )
+        return tickets, flights
+
+    def overlapping_sources(n):
+        rng = np.random.default_rng(0)
+        ids = np.array([f"ID{i:07d}" for i in range(n)], dtype=object)
+        tickets = pd.DataFrame(
+            {
+                "姓名": ids,
+                "证件号": ids,
+                "航班车次": "CA1",
+                "发站": "发站",
+                "到站": "北京",
+                "出发日期": pd.Timestamp("2024-01-01"),
+                "出发时间": "09:10",
+                "数据源": "票务全库",
+                "人员类型": "",
+            }
+        )
+        flights = tickets.assign(
+            数据源="航班更新",
+            变更操作=np.array(["登机", "出票"], dtype=object)[rng.integers(0, 2, n)],
+            人员类型="乙",
+        )
+        flights["状态类型"] = np.where(
+            flights["变更操作"] == "登机", "已确认", "待确认"
+        )
+        return tickets, flights
+
+    def canonical(df):
+        df = df.drop(columns=[col for col in INTERNAL_COLUMNS if col in df.columns])
+        df = df.astype(object).where(df.notna(), None).astype(str)
+        columns = sorted(df.columns)
+        return df[columns].sort_values(columns).reset_index(drop=True)
+
+    processor = DataProcessor()
+    mismatched = []
+    for seed in range(cases):
+        tickets, flights = random_sources(seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = processor.merge_data(tickets.copy(), flights.copy())
+        expected = reference_merge(tickets, flights)
+        if not canonical(result).equals(canonical(expected)):
+            mismatched.append(seed)
+    if mismatched:
+        print(f"合并结果与参考实现不一致：第 {mismatched} 组随机数据")
+    else:
+        print(f"合并结果与参考实现一致：{cases} 组随机数据")
+
+    results = {}
+    for n in sizes:
+        tickets, flights = overlapping_sources(n)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                merged = processor.merge_data(tickets, flights)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[n] = best
+        print(f"  {n} 个重叠键：{best:.2f} 秒（合并后 {len(merged)} 条）")
+    return not mismatched, results
+
+
 def main():
+    # 命令行：python group_travel_checker.py --benchmark-engines 工作簿.xlsx
+    if len(sys.argv) >= 3 and sys.argv[1] == "--benchmark-engines":
+        benchmark_excel_engines(sys.argv[2])
+        return
+    # 命令行：python group_travel_checker.py --benchmark-merge [重叠键数 ...]
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark-merge":
+        sizes = [int(value) for value in sys.argv[2:]]
+        benchmark_merge(*([sizes] if sizes else []))
+        return
+
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
 
     window = GroupTravelChecker()
     window.show()
 
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    shutdown_process_pool()
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包为exe后进程池需要
     main()